@@ -0,0 +1,110 @@
+"""
+Table status encode/decode throughput and size: JSON (current path) vs compact binary encoding.
+
+Usage:
+    python benchmarks/bench_binary_encoding.py --players 6 --iterations 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from poker_game.poker import binary_protocol  # noqa: E402
+
+try:
+    from rest_framework.renderers import JSONRenderer
+except ImportError:
+    JSONRenderer = None
+
+
+def table_status_payload(players: int) -> dict:
+    """
+    Payload shaped as TableGameSerializer output in the middle of a hand
+    """
+    return {
+        'g_tk': 'a1b2c3d4e5f6',
+        'g_mb': 10,
+        'g_mp': 6,
+        'g_r': {
+            'rg_c': ['SA', 'H10', 'D7'],
+            'rg_ri': 3,
+            'rg_rt': 'flop',
+            'rg_lb': {'bt_a': 40, 'bt_ui': 1002, 'bt_ua': 'player_1002'},
+            'rg_mb': 40,
+            'rg_bc': False,
+        },
+        'g_b': 245,
+        'g_lt': {
+            'ut_ui': 1002,
+            'ut_un': 'player_1002',
+            'ut_t': 'rise',
+            'ut_cui': 1003,
+            'ut_cun': 'player_1003',
+            'ut_cut': {'cc': 0, 'cb': 1, 'cf': 1, 'caf': False},
+        },
+        'g_pl': [
+            {
+                'u_id': 1000 + index,
+                'u_n': f'player_{1000 + index}',
+                'u_bl': 12500 - index * 350,
+                'u_h': ['CK', 'C9'] if index == 0 else None,
+                'u_p': index,
+                'u_r': ['player'],
+                'u_bt': 40 if index % 2 else 20,
+                'u_a': 1,
+                'u_f': index == 4,
+            }
+            for index in range(players)
+        ],
+        'g_w': [],
+        'g_v': 57,
+    }
+
+
+def throughput(method, argument, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        method(argument)
+    return iterations / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=6)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    payload = table_status_payload(args.players)
+    if JSONRenderer:
+        renderer = JSONRenderer()
+        renderer.compact = True
+        json_encode = renderer.render
+        json_name = 'json (DRF renderer)'
+    else:
+        def json_encode(data):
+            return json.dumps(data, separators=(',', ':')).encode('utf-8')
+        json_name = 'json (stdlib)'
+
+    json_data = json_encode(payload)
+    binary_data = binary_protocol.encode(payload)
+    assert binary_protocol.decode(binary_data) == payload
+
+    rows = [
+        (json_name, len(json_data),
+         throughput(json_encode, payload, args.iterations),
+         throughput(json.loads, json_data, args.iterations)),
+        ('binary', len(binary_data),
+         throughput(binary_protocol.encode, payload, args.iterations),
+         throughput(binary_protocol.decode, binary_data, args.iterations)),
+    ]
+    print(f'table status with {args.players} players')
+    print(f"{'encoding':<22}{'bytes':>8}{'encode/s':>12}{'decode/s':>12}")
+    for name, size, encode_rate, decode_rate in rows:
+        print(f'{name:<22}{size:>8}{encode_rate:>12.0f}{decode_rate:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+End-to-end load of a running TCP server by headless bot players.
+
+Bot users and tables are created in the local database through Django ORM (`--setup`),
+every bot connects over real TCP, authenticates with its socket token, joins its table
+and plays legal moves from the table status it receives: check when possible, otherwise bet the round
+min bet or fold. Table status is received in binary encoding (`AU|<token>|nl,bin`).
+
+Reported:
+- actions per second and hands per second (hands with winners seen by the first bot of every table)
+- p50/p95/p99 latency from sending an action to receiving the next table status
+
+Usage:
+    python tcp_server.py &
+    python benchmarks/bench_bot_load.py --setup --clients 60 --tables 10 --duration 60
+    python benchmarks/bench_bot_load.py --clients 60 --tables 10 --duration 60 --output results.jsonl
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from poker_game.poker import binary_protocol  # noqa: E402
+from tcp_server.enums import commands  # noqa: E402
+
+BOT_PREFIX = 'bot'
+TOKENS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.bot_tokens.json')
+
+
+def setup_database(clients: int, tables: int, cash: int) -> Tuple[List[str], List[str]]:
+    """
+    Bot users with socket tokens and balance, tables for them
+    :param clients:
+    :param tables:
+    :param cash: balance of every bot
+    :return: tokens, table keys
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+    import django
+    django.setup()
+    from poker_game.models import Table, UserTransaction
+    from poker_game.textchoices import TransactionTypeChoice
+    from user.models import User
+
+    table_keys = []
+    for index in range(tables):
+        table, _ = Table.objects.get_or_create(
+            key=f'{BOT_PREFIX}-table-{index}',
+            defaults={'name': f'Bot table {index}'}
+        )
+        table_keys.append(table.key)
+
+    tokens = []
+    for index in range(clients):
+        user, _ = User.objects.get_or_create(
+            username=f'{BOT_PREFIX}_{index}',
+            defaults={'email': f'{BOT_PREFIX}_{index}@example.com'}
+        )
+        user.socket_access_token = uuid.uuid4().hex
+        user.save(update_fields=['socket_access_token'])
+        balance = user.get_balance()
+        if balance < cash:
+            UserTransaction.objects.create(user=user, amount=cash - balance, type=TransactionTypeChoice.WIN_GAME)
+        tokens.append(user.socket_access_token)
+    return tokens, table_keys
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    header = await reader.readexactly(binary_protocol.FRAME_HEADER.size)
+    size, kind = binary_protocol.FRAME_HEADER.unpack(header)
+    return kind, await reader.readexactly(size - 1)
+
+
+class BotStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.actions = 0
+        self.hands = 0
+        self.errors = 0
+        self.connected = 0
+
+
+class Bot:
+    """
+    One player: acts when table status says it is its turn, one action per status
+    """
+
+    def __init__(self, token: str, table_key: str, counts_hands: bool, stats: BotStats, seed: int):
+        self.token = token
+        self.table_key = table_key
+        self.counts_hands = counts_hands
+        self.stats = stats
+        self.random = random.Random(seed)
+        self.user_id: Optional[int] = None
+        self.action_sent_at: Optional[float] = None
+        self.had_winners = False
+
+    async def run(self, host: str, port: int, deadline: float):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f'{commands.AUTH_REQUEST}|{self.token}|nl,bin\n'.encode())
+        writer.write(f'{commands.JOIN_GAME}|{self.table_key}\n'.encode())
+        await writer.drain()
+        self.stats.connected += 1
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    kind, payload = await asyncio.wait_for(read_frame(reader), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+                if kind == binary_protocol.FRAME_TABLE_STATUS:
+                    action = self.on_table_status(binary_protocol.decode(payload))
+                elif payload.strip().startswith(f'<PokerGame>{commands.ERROR}|'.encode()):
+                    self.stats.errors += 1
+                    self.action_sent_at = None
+                    continue
+                else:
+                    continue
+                if action:
+                    writer.write(action.encode())
+                    await writer.drain()
+        except asyncio.IncompleteReadError:
+            self.stats.errors += 1
+        finally:
+            writer.write(f'{commands.LEAVE_GAME}|{self.table_key}\n'.encode())
+            writer.close()
+
+    def on_table_status(self, status: dict) -> Optional[str]:
+        """
+        :param status: TableGameSerializer payload
+        :return: command to send
+        """
+        now = time.perf_counter()
+        if self.action_sent_at is not None:
+            self.stats.latencies.append(now - self.action_sent_at)
+            self.action_sent_at = None
+        if self.user_id is None:
+            self.user_id = self.find_user_id(status)
+
+        winners = bool(status.get('g_w'))
+        if self.counts_hands and winners and not self.had_winners:
+            self.stats.hands += 1
+        self.had_winners = winners
+
+        last_turn = status.get('g_lt') or {}
+        possibilities = last_turn.get('ut_cut')
+        if self.user_id is None or last_turn.get('ut_cui') != self.user_id or not possibilities:
+            return None
+        self.action_sent_at = now
+        self.stats.actions += 1
+        return self.choose_action(status, possibilities)
+
+    def find_user_id(self, status: dict) -> Optional[int]:
+        """
+        Only own hand cards are sent to the player
+        :param status:
+        :return:
+        """
+        for player in status.get('g_pl') or []:
+            if player.get('u_h'):
+                return player['u_id']
+        return None
+
+    def choose_action(self, status: dict, possibilities: dict) -> str:
+        if possibilities.get('cc') and self.random.random() < 0.7:
+            return f'{commands.CHECK}\n'
+        if possibilities.get('cb') and self.random.random() < 0.9:
+            round_status = status.get('g_r') or {}
+            amount = round_status.get('rg_mb') or status.get('g_mb') or 1
+            return f'{commands.BET}|{amount}\n'
+        return f'{commands.FOLD}\n'
+
+
+def percentile(values: List[float], rank: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * rank))]
+
+
+async def run_load(host: str, port: int, tokens: List[str], table_keys: List[str], duration: float) -> dict:
+    stats = BotStats()
+    deadline = time.monotonic() + duration
+    bots = [
+        Bot(
+            token=token,
+            table_key=table_keys[index % len(table_keys)],
+            counts_hands=index < len(table_keys),
+            stats=stats,
+            seed=index
+        )
+        for index, token in enumerate(tokens)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*(bot.run(host, port, deadline) for bot in bots), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'clients': len(tokens),
+        'connected': stats.connected,
+        'tables': len(table_keys),
+        'duration': round(elapsed, 2),
+        'actions': stats.actions,
+        'actions_per_second': round(stats.actions / elapsed, 2),
+        'hands': stats.hands,
+        'hands_per_second': round(stats.hands / elapsed, 3),
+        'errors': stats.errors,
+        'latency_p50_ms': round(percentile(stats.latencies, 0.50) * 1000, 2),
+        'latency_p95_ms': round(percentile(stats.latencies, 0.95) * 1000, 2),
+        'latency_p99_ms': round(percentile(stats.latencies, 0.99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('TCP_PORT', 9999)))
+    parser.add_argument('--clients', type=int, default=12)
+    parser.add_argument('--tables', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--cash', type=int, default=100000, help='balance of every bot after --setup')
+    parser.add_argument('--setup', action='store_true', help='create bots and tables in the local database')
+    parser.add_argument('--output', help='append result as JSON line, to track releases')
+    args = parser.parse_args()
+
+    if args.clients < args.tables * 2:
+        parser.error('at least 2 clients per table are needed to play')
+    if args.setup:
+        tokens, table_keys = setup_database(args.clients, args.tables, args.cash)
+        with open(TOKENS_FILE, 'w') as file:
+            json.dump({'tokens': tokens, 'tables': table_keys}, file)
+    else:
+        with open(TOKENS_FILE) as file:
+            saved = json.load(file)
+        tokens, table_keys = saved['tokens'][:args.clients], saved['tables'][:args.tables]
+
+    result = asyncio.run(run_load(args.host, args.port, tokens, table_keys, args.duration))
+    for key, value in result.items():
+        print(f'{key:>20}: {value}')
+    if args.output:
+        with open(args.output, 'a') as file:
+            file.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Inbound command decoding: frame decoded and split by every protocol object (before)
+vs ParsedCommand built once per frame and passed to handlers (after).
+
+A command is parsed three times before: command and routing in handle_command, then args in the handler.
+
+Usage:
+    python benchmarks/bench_command_parsing.py --iterations 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcp_server.tcp_game_connection_protocol import GameConnectionProtocol, ParsedCommand  # noqa: E402
+
+FRAMES = {
+    'auth': b'AU|3f2c9a1b7e6d4c0a|nl,delta',
+    'auth_jwt': b'AU|' + b'eyJhbGciOiJIUzI1NiJ9.' * 12 + b'|nl,delta,bin,hb',
+    'join': b'JG|a1b2c3d4e5f6',
+    'bet': b'BT|250',
+    'leave': b'LG|a1b2c3d4e5f6',
+}
+KEYS = {
+    'auth': ('command_type', 'short_live_token', 'options'),
+    'auth_jwt': ('command_type', 'short_live_token', 'options'),
+    'join': ('command_type', 'table_key'),
+    'bet': ('command_type', 'amount'),
+    'leave': ('command_type', 'table_key'),
+}
+
+
+class LegacyProtocol:
+    """
+    Parsing of GameConnectionProtocol before ParsedCommand: every call decodes and splits the frame
+    """
+    DM = '|'
+
+    def __init__(self, data=None):
+        self.data = data
+        self.messages = None
+
+    def parse_command(self):
+        return self.data.decode('utf-8').split(self.DM)[0]
+
+    def _parse_data(self, keys_list: tuple) -> dict:
+        data = self.data.decode('utf-8').split(self.DM)
+        return dict(zip(keys_list, data))
+
+
+def before(frame: bytes, keys: tuple) -> dict:
+    # handle_command: command and table key for routing
+    protocol = LegacyProtocol(frame)
+    protocol.parse_command()
+    protocol._parse_data(keys)
+    # handler protocol and its args
+    return LegacyProtocol(frame)._parse_data(keys)
+
+
+def after(frame: bytes, keys: tuple) -> dict:
+    protocol = GameConnectionProtocol(frame)
+    protocol.parse_command()
+    protocol._parse_data(keys)
+    return GameConnectionProtocol(protocol.parsed)._parse_data(keys)
+
+
+def throughput(method, frame: bytes, keys: tuple, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        method(frame, keys)
+    return iterations / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'command':>9}{'before/s':>12}{'after/s':>12}{'speedup':>9}")
+    for name, frame in FRAMES.items():
+        keys = KEYS[name]
+        assert before(frame, keys) == after(frame, keys)
+        before_rate = throughput(before, frame, keys, args.iterations)
+        after_rate = throughput(after, frame, keys, args.iterations)
+        print(f'{name:>9}{before_rate:>12.0f}{after_rate:>12.0f}{after_rate / before_rate:>8.2f}x')
+    parse_rate = throughput(lambda frame, keys: ParsedCommand.parse(frame), FRAMES['bet'], (), args.iterations)
+    print(f'ParsedCommand.parse of BET: {parse_rate:.0f}/s')
+
+
+if __name__ == '__main__':
+    main()
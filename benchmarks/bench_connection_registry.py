@@ -0,0 +1,126 @@
+"""
+Connection lookups at N connected users: previous list scans vs ConnectionRegistry.
+
+Usage:
+    python benchmarks/bench_connection_registry.py --connections 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcp_server.connection_registry import ConnectionRegistry  # noqa: E402
+
+TABLE_SIZE = 6
+
+
+class BenchUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class BenchConnection:
+    def __init__(self, user_id: int):
+        self.user = BenchUser(user_id)
+        self.connection = None
+
+
+class ListConnections:
+    """
+    Previous TCPGameHandler lists: connections and table_connections
+    """
+
+    def __init__(self):
+        self.connections = []
+        self.table_connections = []
+
+    def add(self, connection):
+        self.connections.append(connection)
+
+    def get(self, user_id):
+        try:
+            return next(connection for connection in self.connections if connection.user.id == user_id)
+        except StopIteration:
+            return None
+
+    def get_table(self, table_key):
+        try:
+            return next(table for table in self.table_connections if table['table_key'] == table_key)
+        except StopIteration:
+            return None
+
+    def join_table(self, connection, table_key):
+        table = self.get_table(table_key)
+        if not table:
+            table = {'connections': [connection], 'table_key': table_key}
+            self.table_connections.append(table)
+        if connection not in table['connections']:
+            table['connections'].append(connection)
+
+    def leave_table(self, user_id, table_key):
+        table = self.get_table(table_key)
+        [table['connections'].remove(c) for c in table['connections'] if c.user.id == user_id]
+
+    def remove(self, user_id):
+        [self.connections.remove(c) for c in self.connections if c.user.id == user_id]
+        for table in self.table_connections:
+            [table['connections'].remove(c) for c in table['connections'] if c.user and c.user.id == user_id]
+
+    def table_connections_list(self, table_key):
+        return self.get_table(table_key)['connections']
+
+
+class RegistryConnections(ConnectionRegistry):
+    def table_connections_list(self, table_key):
+        return self.table_connections(table_key)
+
+
+def fill(storage, count: int):
+    connections = [BenchConnection(user_id) for user_id in range(count)]
+    for connection in connections:
+        storage.add(connection)
+        storage.join_table(connection, f'table-{connection.user.id // TABLE_SIZE}')
+    return connections
+
+
+def per_op(method, args_list) -> float:
+    started = time.perf_counter()
+    for args in args_list:
+        method(*args)
+    return (time.perf_counter() - started) / len(args_list) * 1e9
+
+
+def bench(storage_class, count: int, operations: int) -> dict:
+    storage = storage_class()
+    connections = fill(storage, count)
+    step = max(1, count // operations)
+    sample = connections[::step][:operations]
+    tables = [f'table-{c.user.id // TABLE_SIZE}' for c in sample]
+    results = {
+        'send (get by user)': per_op(storage.get, [(c.user.id,) for c in sample]),
+        'broadcast (table list)': per_op(storage.table_connections_list, [(t,) for t in tables]),
+        'leave': per_op(storage.leave_table, [(c.user.id, t) for c, t in zip(sample, tables)]),
+        'join': per_op(storage.join_table, [(c, t) for c, t in zip(sample, tables)]),
+        'disconnect': per_op(storage.remove, [(c.user.id,) for c in sample]),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--operations', type=int, default=500)
+    args = parser.parse_args()
+
+    lists = bench(ListConnections, args.connections, args.operations)
+    registry = bench(RegistryConnections, args.connections, args.operations)
+    print(f'{args.connections} connections, ns per operation')
+    print(f"{'operation':<24}{'lists':>14}{'registry':>12}{'speedup':>10}")
+    for name in lists:
+        print(f"{name:<24}{lists[name]:>14.0f}{registry[name]:>12.0f}{lists[name] / registry[name]:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
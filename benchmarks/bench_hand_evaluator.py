@@ -0,0 +1,100 @@
+"""
+Showdown evaluation: treys Evaluator created per showdown and called per hand (before),
+the same with one treys Evaluator of the process (shared)
+vs HandEvaluator of the process, all hands of the showdown in one call (after).
+
+Hands are random 5 card boards with 2 to 9 players, rates are in evaluated hands per second.
+
+Usage:
+    python benchmarks/bench_hand_evaluator.py --showdowns 2000 --players 6
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from treys import Card, Evaluator  # noqa: E402
+
+from poker_game.poker import hand_evaluator  # noqa: E402
+from poker_game.poker.cards import index_card  # noqa: E402
+
+
+def make_showdowns(count: int, players: int) -> list:
+    showdowns = []
+    for _ in range(count):
+        deck = random.sample(range(52), 5 + players * 2)
+        showdowns.append((deck[:5], [deck[5 + i * 2:7 + i * 2] for i in range(players)]))
+    return showdowns
+
+
+def treys_card(index: int) -> int:
+    suit, value = index_card(index)
+    return Card.new(f"{'T' if value == 10 else value}{suit.lower()}")
+
+
+def before(board: list, hands: list, evaluator: Evaluator = None) -> list:
+    evaluator = evaluator or Evaluator()
+    board = [treys_card(card) for card in board]
+    ranks = []
+    for hand in hands:
+        rank = evaluator.evaluate([treys_card(card) for card in hand], board)
+        evaluator.class_to_string(evaluator.get_rank_class(rank))
+        ranks.append(rank)
+    return ranks
+
+
+def after(board: list, hands: list) -> list:
+    ranks, _ = hand_evaluator.get_hand_evaluator().evaluate(board, hands)
+    return ranks
+
+
+def throughput(method, showdowns: list) -> float:
+    hands = sum(len(showdown[1]) for showdown in showdowns)
+    started = time.perf_counter()
+    for board, showdown_hands in showdowns:
+        method(board, showdown_hands)
+    return hands / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--showdowns', type=int, default=2000)
+    parser.add_argument('--players', type=int, default=0, help='players per showdown, 0 runs 2, 6 and 9')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    evaluator = hand_evaluator.get_hand_evaluator()
+    print(f'tables built once in {time.perf_counter() - started:.3f}s, numpy: {hand_evaluator.numpy is not None}')
+
+    shared_evaluator = Evaluator()
+
+    def shared(board: list, hands: list) -> list:
+        return before(board, hands, shared_evaluator)
+
+    print(f"{'players':>8}{'before/s':>12}{'shared/s':>12}{'after/s':>12}{'speedup':>9}")
+    for players in ([args.players] if args.players else [2, 6, 9]):
+        showdowns = make_showdowns(args.showdowns, players)
+        for board, hands in showdowns[:100]:
+            assert before(board, hands) == after(board, hands)
+        before_rate = throughput(before, showdowns)
+        shared_rate = throughput(shared, showdowns)
+        after_rate = throughput(after, showdowns)
+        print(
+            f'{players:>8}{before_rate:>12.0f}{shared_rate:>12.0f}{after_rate:>12.0f}'
+            f'{after_rate / before_rate:>8.2f}x'
+        )
+
+    if hand_evaluator.numpy is not None:
+        # one large batch shows the per hand cost of vectorized lookups without per call overhead
+        board, _ = make_showdowns(1, 0)[0]
+        hands = [random.sample([card for card in range(52) if card not in board], 2) for _ in range(100000)]
+        started = time.perf_counter()
+        evaluator.evaluate(board, hands)
+        print(f'one batch of {len(hands)} hands: {len(hands) / (time.perf_counter() - started):.0f}/s')
+
+
+if __name__ == '__main__':
+    main()
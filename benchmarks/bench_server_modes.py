@@ -0,0 +1,197 @@
+"""
+Compare threaded and asyncio server modes on idle connections.
+
+Servers are started in a subprocess and run the real connection path of both modes:
+threaded `TCPBrokerConnections.connect_user` / `listen_messages` and asyncio
+`AsyncTCPBrokerConnections.handle_client` / `listen_messages`, with TCPGameConnection,
+OutboundQueue and its writer, registry and heartbeat. Only `authenticate_connection`
+is replaced: it registers a fake user instead of looking up the token and running AUTH,
+so memory per connection is measured without the database (Django settings are still loaded).
+
+Usage:
+    python benchmarks/bench_server_modes.py --connections 2000
+    python benchmarks/bench_server_modes.py --mode asyncio --connections 10000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import resource
+import socket
+import socketserver
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+AUTH_MESSAGE = b'AU|bench-token|nl\n'
+
+
+def raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def process_status(pid: int) -> dict:
+    status = {}
+    with open(f'/proc/{pid}/status') as file:
+        for line in file:
+            key, _, value = line.partition(':')
+            status[key] = value.strip()
+    return {
+        'rss_kb': int(status['VmRSS'].split()[0]),
+        'threads': int(status['Threads']),
+    }
+
+
+def process_cpu_seconds(pid: int) -> float:
+    with open(f'/proc/{pid}/stat') as file:
+        fields = file.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    return (int(fields[11]) + int(fields[12])) / ticks
+
+
+class BenchUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+def bench_broker():
+    """
+    Real broker with auth replaced by a fake user, imported in server subprocess only
+    :return:
+    """
+    import django
+
+    # models are imported by the broker, no query is made
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+    django.setup()
+    from tcp_server.tcp_broker import TCPBrokerConnections
+    from tcp_server.tcp_message_framing import parse_connection_options
+
+    user_ids = itertools.count(1)
+
+    class BenchBroker(TCPBrokerConnections):
+        @classmethod
+        def authenticate_connection(cls, connection, data: bytes):
+            options = parse_connection_options(cls.game_handler.protocol(data).auth_args().get('options'))
+            return cls._connect(user=BenchUser(next(user_ids)), connection=connection, options=options)
+
+        @classmethod
+        def disconnect_user(cls, user_id: int, game_connection=None):
+            if game_connection and game_connection.outbound:
+                game_connection.outbound.close()
+            cls.game_handler.remove_connection_from_list(user_id, connection=game_connection)
+
+    return BenchBroker
+
+
+def serve_threaded(port: int):
+    broker = bench_broker()
+
+    class BenchThreadedHandler(socketserver.BaseRequestHandler):
+        # the same as ThreadedTCPRequestHandler of tcp_server.py
+        def handle(self):
+            broker.connect_user(self, self.request.recv(1024))
+
+    class BenchThreadedServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+        request_queue_size = 1024
+
+    with BenchThreadedServer(('127.0.0.1', port), BenchThreadedHandler) as server:
+        print('ready', flush=True)
+        server.serve_forever()
+
+
+def serve_asyncio(port: int):
+    from tcp_server.tcp_async_broker import AsyncTCPBrokerConnections
+
+    class BenchAsyncBroker(AsyncTCPBrokerConnections):
+        broker = bench_broker()
+
+    # serve() prints the listening address when it is ready
+    asyncio.run(BenchAsyncBroker().serve('127.0.0.1', port))
+
+
+def open_connections(port: int, count: int) -> list:
+    sockets = []
+    for _ in range(count):
+        try:
+            sock = socket.create_connection(('127.0.0.1', port))
+            sock.sendall(AUTH_MESSAGE)
+        except OSError as e:
+            print(f'  stopped at {len(sockets)} connections: {e}')
+            break
+        sockets.append(sock)
+    return sockets
+
+
+def bench_mode(mode: str, port: int, connections: int, idle_seconds: float) -> dict:
+    process = subprocess.Popen(
+        [sys.executable, __file__, '--serve', mode, '--port', str(port)],
+        stdout=subprocess.PIPE,
+        text=True,
+        env={**os.environ, 'PYTHONUNBUFFERED': '1'},
+    )
+    try:
+        process.stdout.readline()
+        time.sleep(0.2)
+        before = process_status(process.pid)
+        started = time.perf_counter()
+        sockets = open_connections(port, connections)
+        connect_time = time.perf_counter() - started
+        time.sleep(0.5)
+        after = process_status(process.pid)
+        cpu_before = process_cpu_seconds(process.pid)
+        time.sleep(idle_seconds)
+        idle_cpu = process_cpu_seconds(process.pid) - cpu_before
+        opened = len(sockets)
+        for sock in sockets:
+            sock.close()
+    finally:
+        process.kill()
+        process.wait()
+
+    rss_delta = after['rss_kb'] - before['rss_kb']
+    return {
+        'mode': mode,
+        'connections': opened,
+        'connect_per_sec': opened / connect_time if connect_time else 0,
+        'threads': after['threads'],
+        'rss_mb': after['rss_kb'] / 1024,
+        'kb_per_connection': rss_delta / opened if opened else 0,
+        'idle_cpu_percent': idle_cpu / idle_seconds * 100,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['threaded', 'asyncio', 'both'], default='both')
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--idle-seconds', type=float, default=2.0)
+    parser.add_argument('--port', type=int, default=17800)
+    parser.add_argument('--serve', choices=['threaded', 'asyncio'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    raise_open_files_limit()
+
+    if args.serve == 'threaded':
+        return serve_threaded(args.port)
+    if args.serve == 'asyncio':
+        return serve_asyncio(args.port)
+
+    modes = ['threaded', 'asyncio'] if args.mode == 'both' else [args.mode]
+    print(f"{'mode':<10}{'conns':>8}{'conn/s':>10}{'threads':>9}{'rss MB':>9}{'KB/conn':>9}{'idle CPU%':>11}")
+    for index, mode in enumerate(modes):
+        result = bench_mode(mode, args.port + index, args.connections, args.idle_seconds)
+        print(
+            f"{result['mode']:<10}{result['connections']:>8}{result['connect_per_sec']:>10.0f}"
+            f"{result['threads']:>9}{result['rss_mb']:>9.1f}{result['kb_per_connection']:>9.1f}"
+            f"{result['idle_cpu_percent']:>11.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Table throughput of sharded server mode by count of worker processes.
+
+Master and workers are the real TableShardMaster / TableShardWorker with connection handoff after JOIN_GAME,
+the table handler is synthetic: every command burns --work-us of CPU under the table lock,
+as engine and serialization do, so the benchmark does not need Django or the database.
+Scaling is limited by CPU cores of the machine.
+
+Usage:
+    python benchmarks/bench_table_sharding.py --workers 1,2,4,8 --tables 64 --commands 100
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcp_server.table_sharding import ConnectionHandoff, TableShardMaster, TableShardWorker  # noqa: E402
+from tcp_server.tcp_message_framing import NewlineFramer, split_auth_message  # noqa: E402
+
+PLAYERS_PER_TABLE = 6
+
+
+def burn(work_us: int):
+    deadline = time.perf_counter() + work_us / 1e6
+    while time.perf_counter() < deadline:
+        pass
+
+
+def bench_worker_main(work_us: int):
+    def main(worker: TableShardWorker):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        table_locks = {}
+        locks_lock = threading.Lock()
+
+        def table_lock(table_key: str) -> threading.Lock:
+            with locks_lock:
+                return table_locks.setdefault(table_key, threading.Lock())
+
+        def handle(sock, handoff: ConnectionHandoff):
+            framer = NewlineFramer()
+            frames = list(handoff.frames)
+            if handoff.is_new_connection:
+                auth_data, pending = split_auth_message(sock.recv(1024))
+                sock.sendall(b'OK\n')
+                frames = framer.feed(pending)
+            else:
+                framer.feed(handoff.pending)
+            table_key = handoff.table_key
+            while True:
+                for index, frame in enumerate(frames):
+                    command, _, argument = frame.decode().partition('|')
+                    if command == 'JG':
+                        if not worker.owns(argument):
+                            worker.hand_off(sock, ConnectionHandoff(
+                                user_id=0, table_key=argument, frames=frames[index:], pending=bytes(framer.buffer)
+                            ))
+                            return
+                        table_key = argument
+                    with table_lock(table_key):
+                        burn(work_us)
+                    sock.sendall(b'S|' + frame + b'\n')
+                frames = framer.recv_frames(sock)
+                if frames is None:
+                    sock.close()
+                    return
+
+        worker.serve(handle)
+    return main
+
+
+def serve(port: int, workers: int, work_us: int):
+    master = TableShardMaster(host='127.0.0.1', port=port, workers=workers)
+    master.start(bench_worker_main(work_us))
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    print('ready', flush=True)
+    try:
+        master.serve_forever()
+    finally:
+        master.stop()
+
+
+async def player(port: int, table_key: str, commands: int, started: asyncio.Event) -> int:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'AU|bench-token|nl\n')
+    await reader.readline()
+    writer.write(f'JG|{table_key}\n'.encode())
+    await reader.readline()
+    await started.wait()
+    for index in range(commands):
+        writer.write(f'BT|{index}\n'.encode())
+        await reader.readline()
+    writer.close()
+    return commands
+
+
+async def run_load(port: int, tables: int, commands: int) -> float:
+    started = asyncio.Event()
+    tasks = [
+        asyncio.create_task(player(port, f'table-{table}', commands, started))
+        for table in range(tables)
+        for _ in range(PLAYERS_PER_TABLE)
+    ]
+    await asyncio.sleep(1)
+    begin = time.perf_counter()
+    started.set()
+    total = sum(await asyncio.gather(*tasks))
+    return total / (time.perf_counter() - begin)
+
+
+def bench(port: int, workers: int, tables: int, commands: int, work_us: int) -> float:
+    process = subprocess.Popen(
+        [sys.executable, __file__, '--serve', str(workers), '--port', str(port), '--work-us', str(work_us)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        process.stdout.readline()
+        return asyncio.run(run_load(port, tables, commands))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--tables', type=int, default=32)
+    parser.add_argument('--commands', type=int, default=50)
+    parser.add_argument('--work-us', type=int, default=300)
+    parser.add_argument('--port', type=int, default=17900)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.port, args.serve, args.work_us)
+
+    print(f'{args.tables} tables x {PLAYERS_PER_TABLE} players, {args.commands} commands each, '
+          f'{args.work_us} us per command, {os.cpu_count()} cpu')
+    print(f"{'workers':>8}{'commands/s':>12}{'scaling':>9}")
+    base = None
+    for index, workers in enumerate(int(value) for value in args.workers.split(',')):
+        rate = bench(args.port + index, workers, args.tables, args.commands, args.work_us)
+        base = base or rate
+        print(f'{workers:>8}{rate:>12.0f}{rate / base:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
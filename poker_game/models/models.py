@@ -110,6 +110,9 @@ class Game(models.Model):
     active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     winners = JSONField(default=None, null=True, blank=True)
+    # shuffled deck of the hand, card indexes in dealing order (CardDealer.deck_bytes) and seed of the shuffle
+    deck = models.BinaryField(max_length=52, null=True, blank=True)
+    deck_seed = models.BigIntegerField(null=True, blank=True)
 
     @property
     def bank(self):
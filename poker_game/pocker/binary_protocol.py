@@ -0,0 +1,210 @@
+import struct
+from decimal import Decimal
+from typing import Any, List, Optional, Tuple
+
+# value types
+T_NULL = 0
+T_FALSE = 1
+T_TRUE = 2
+T_INT = 3
+T_STR = 4
+T_LIST = 5
+T_MAP = 6
+T_CARDS = 7
+T_FLOAT = 8
+
+# outbound frame: 4 bytes big-endian length, 1 byte kind, payload
+FRAME_HEADER = struct.Struct('!IB')
+FRAME_TEXT = 0
+FRAME_TABLE_STATUS = 1
+
+FLOAT = struct.Struct('!d')
+
+# integer tags of known payload keys (one byte), unknown keys are sent as strings with tag 0
+FIELD_TAGS = {
+    name: tag for tag, name in enumerate([
+        'g_tk', 'g_mb', 'g_mp', 'g_r', 'g_b', 'g_lt', 'g_pl', 'g_w', 'g_v',
+        'rg_c', 'rg_ri', 'rg_rt', 'rg_lb', 'rg_mb', 'rg_bc',
+        'bt_a', 'bt_ui', 'bt_ua',
+        'u_id', 'u_n', 'u_bl', 'u_h', 'u_p', 'u_r', 'u_bt', 'u_a', 'u_f',
+        'ut_ui', 'ut_un', 'ut_t', 'ut_cui', 'ut_cun', 'ut_cut',
+        'cc', 'cb', 'cf', 'caf',
+        'u', 'a', 'c',
+        'd_v', 'd_bv', 'd', 'g_pl_r',
+        'a_u',
+    ], start=1)
+}
+FIELD_NAMES = {tag: name for name, tag in FIELD_TAGS.items()}
+# fields with cards lists, every card is one byte
+CARDS_FIELDS = {'u_h', 'rg_c'}
+
+CARD_SUITS = ['S', 'H', 'D', 'C']
+CARD_RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+CARD_BYTES = {
+    f'{suit}{rank}': suit_index * len(CARD_RANKS) + rank_index
+    for suit_index, suit in enumerate(CARD_SUITS)
+    for rank_index, rank in enumerate(CARD_RANKS)
+}
+CARD_NAMES = {value: name for name, value in CARD_BYTES.items()}
+
+
+def write_varint(buffer: bytearray, value: int):
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def encode_cards(cards: List[str]) -> Optional[bytes]:
+    """
+    One byte per card, None if value is not a cards list
+    :param cards:
+    :return:
+    """
+    try:
+        return bytes(CARD_BYTES[card] for card in cards)
+    except (KeyError, TypeError):
+        return None
+
+
+def encode_value(buffer: bytearray, value: Any, cards: bool = False):
+    """
+    Append tagged value into buffer
+    :param buffer:
+    :param value:
+    :param cards: value is expected to be a cards list
+    :return:
+    """
+    value_type = type(value)
+    if value_type is int:
+        buffer.append(T_INT)
+        # zigzag without fixed width, python ints are not limited to 64 bits
+        raw = value << 1 if value >= 0 else (~value << 1) | 1
+        if raw < 0x80:
+            buffer.append(raw)
+        else:
+            write_varint(buffer, raw)
+    elif value_type is str:
+        data = value.encode('utf-8')
+        buffer.append(T_STR)
+        write_varint(buffer, len(data))
+        buffer += data
+    elif value is None:
+        buffer.append(T_NULL)
+    elif value_type is bool:
+        buffer.append(T_TRUE if value else T_FALSE)
+    elif isinstance(value, dict):
+        buffer.append(T_MAP)
+        write_varint(buffer, len(value))
+        for key, item in value.items():
+            tag = FIELD_TAGS.get(key, 0)
+            buffer.append(tag)
+            if not tag:
+                encode_value(buffer, str(key))
+            encode_value(buffer, item, cards=key in CARDS_FIELDS)
+    elif isinstance(value, (list, tuple)):
+        card_bytes = encode_cards(value) if cards else None
+        if card_bytes is not None:
+            buffer.append(T_CARDS)
+            write_varint(buffer, len(card_bytes))
+            buffer += card_bytes
+            return
+        buffer.append(T_LIST)
+        write_varint(buffer, len(value))
+        for item in value:
+            encode_value(buffer, item)
+    elif isinstance(value, int):
+        encode_value(buffer, int(value))
+    elif isinstance(value, (float, Decimal)):
+        if value == int(value):
+            return encode_value(buffer, int(value))
+        buffer.append(T_FLOAT)
+        buffer += FLOAT.pack(float(value))
+    else:
+        encode_value(buffer, str(value))
+
+
+def decode_value(data: bytes, offset: int = 0) -> Tuple[Any, int]:
+    """
+    Read tagged value from data
+    :param data:
+    :param offset:
+    :return: value, next offset
+    """
+    value_type = data[offset]
+    offset += 1
+    if value_type == T_NULL:
+        return None, offset
+    if value_type == T_TRUE:
+        return True, offset
+    if value_type == T_FALSE:
+        return False, offset
+    if value_type == T_INT:
+        raw = data[offset]
+        if raw < 0x80:
+            offset += 1
+        else:
+            raw, offset = read_varint(data, offset)
+        return (raw >> 1) ^ -(raw & 1), offset
+    if value_type == T_STR:
+        size, offset = read_varint(data, offset)
+        return bytes(data[offset:offset + size]).decode('utf-8'), offset + size
+    if value_type == T_CARDS:
+        size, offset = read_varint(data, offset)
+        return [CARD_NAMES[card] for card in data[offset:offset + size]], offset + size
+    if value_type == T_LIST:
+        size, offset = read_varint(data, offset)
+        items = []
+        for _ in range(size):
+            item, offset = decode_value(data, offset)
+            items.append(item)
+        return items, offset
+    if value_type == T_MAP:
+        size, offset = read_varint(data, offset)
+        result = {}
+        for _ in range(size):
+            tag = data[offset]
+            offset += 1
+            if tag:
+                key = FIELD_NAMES.get(tag)
+                if key is None:
+                    raise ValueError(f'Unknown field tag {tag}')
+            else:
+                key, offset = decode_value(data, offset)
+            result[key], offset = decode_value(data, offset)
+        return result, offset
+    if value_type == T_FLOAT:
+        return FLOAT.unpack_from(data, offset)[0], offset + FLOAT.size
+    raise ValueError(f'Unknown value type {value_type}')
+
+
+def encode(data: Any) -> bytes:
+    buffer = bytearray()
+    encode_value(buffer, data)
+    return bytes(buffer)
+
+
+def decode(data: bytes) -> Any:
+    return decode_value(data, 0)[0]
+
+
+def frame(kind: int, payload: bytes) -> bytes:
+    """
+    Outbound frame for binary connections
+    :param kind: FRAME_TEXT or FRAME_TABLE_STATUS
+    :param payload:
+    :return:
+    """
+    return FRAME_HEADER.pack(len(payload) + 1, kind) + payload
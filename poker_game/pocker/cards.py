@@ -1,11 +1,39 @@
 import random
-from typing import List
+from typing import List, Optional
+
+# card is [suit, value] on wire and in DB, index 0..51 is rank_index * 4 + suit_index
+CARD_SUITS = ['S', 'H', 'D', 'C']
+CARD_RANKS = [2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K', 'A']
+_RANK_INDEX = {str(rank): index for index, rank in enumerate(CARD_RANKS)}
+_RANK_INDEX['T'] = _RANK_INDEX['10']
+_SUIT_INDEX = {suit: index for index, suit in enumerate(CARD_SUITS)}
+
+
+def card_index(card: List) -> int:
+    """
+    :param card: [suit, value], value is int or str
+    :return: 0..51
+    """
+    return _RANK_INDEX[str(card[1])] * 4 + _SUIT_INDEX[card[0]]
+
+
+def index_card(index: int) -> List:
+    """
+    :param index: 0..51
+    :return: [suit, value]
+    """
+    return [CARD_SUITS[index & 3], CARD_RANKS[index >> 2]]
+
+
+# [suit, value] of every card index, copied on dealing so stored cards never share lists
+_INDEX_CARDS = [index_card(index) for index in range(52)]
 
 
 class CardDealer:
-    _cards_values = ['S', 'H', 'D', 'C']
-    _cards_suits = ['A', 'J', 'Q', 'K', 2, 3, 4, 5, 6, 7, 8, 9, 10]
-    deck = []
+    """
+    Deck of card indexes 0..51 shuffled once, cards are dealt from a cursor over the array
+    and marked in the bitmask of dealt cards. Cards are converted to [suit, value] only when they leave the dealer
+    """
 
     def __init__(
             self,
@@ -13,76 +41,118 @@ class CardDealer:
     ):
         """
         Init dealer. Pass cards on hand.
-        :param cards_on_hand:
+        :param cards_on_hand: [[suit, value], ...] of every owner, these cards are not in the deck
+        """
+        self.dealt = 0
+        for item in cards_on_hand or []:
+            for single in item:
+                self.dealt |= 1 << card_index(single)
+        self.deck: List[int] = []
+        self.cursor = 0
+        self.shuffled = False
+        # seed of the shuffle of decks generated for a whole hand
+        self.seed: Optional[int] = None
+
+    @classmethod
+    def from_seed(cls, seed: Optional[int] = None) -> "CardDealer":
         """
-        self.cards_on_hand = cards_on_hand if cards_on_hand else []
-        if self.cards_on_hand:
-            tmp = []
-            for item in self.cards_on_hand:
-                for single in item:
-                    tmp.append(single)
-            self.cards_on_hand = tmp
+        Full deck shuffled once for a hand, the same seed gives the same deck to replay the hand
+        :param seed: new random seed if not passed
+        :return:
+        """
+        dealer = cls()
+        dealer.seed = random.SystemRandom().getrandbits(63) if seed is None else seed
+        dealer.deck = list(range(52))
+        random.Random(dealer.seed).shuffle(dealer.deck)
+        dealer.shuffled = True
+        return dealer
+
+    @classmethod
+    def from_deck(cls, deck: bytes, cursor: int) -> "CardDealer":
+        """
+        Deck of a running hand, cards before cursor are dealt
+        :param deck: deck_bytes of the hand
+        :param cursor: count of dealt cards
+        :return:
+        """
+        dealer = cls()
+        dealer.deck = list(bytes(deck))
+        dealer.cursor = cursor
+        dealer.shuffled = True
+        for index in dealer.deck[:cursor]:
+            dealer.dealt |= 1 << index
+        return dealer
+
+    @property
+    def deck_bytes(self) -> bytes:
+        """
+        Deck order in 52 bytes, one card index per byte
+        :return:
+        """
+        return bytes(self.deck)
 
     def cards_generator(self):
         """
-        Generates 52 cards and append them into deck,
-        check duplicates
+        Deck of cards which are not dealt yet
         """
-        self.deck = []
-        [
-            self.deck.append([value, suit])
-            for value in self._cards_values for suit in self._cards_suits
-            if [value, suit] not in self.cards_on_hand
-        ]
+        dealt = self.dealt
+        self.deck = [index for index in range(52) if not dealt >> index & 1]
+        self.cursor = 0
+        self.shuffled = False
         return self.deck
 
     def cards_shuffle(self):
-        """random deck shuffle"""
-        for i in range(3):
-            random.shuffle(self.deck)
+        """random shuffle of not dealt cards"""
+        rest = self.deck[self.cursor:]
+        random.shuffle(rest)
+        self.deck[self.cursor:] = rest
+        self.shuffled = True
 
     def cards_list(self):
-        """return cards List"""
-        return self.deck
+        """return not dealt cards List"""
+        return [list(_INDEX_CARDS[index]) for index in self.deck[self.cursor:]]
+
+    def deal(self, count: int) -> List[int]:
+        """
+        :param count:
+        :return: card indexes from the cursor
+        """
+        if not self.shuffled:
+            self.cards_shuffle()
+        cursor = self.cursor
+        cards = self.deck[cursor:cursor + count]
+        if len(cards) < count:
+            raise ValueError("Not enough cards in the deck")
+        self.cursor = cursor + count
+        for index in cards:
+            self.dealt |= 1 << index
+        return cards
 
     def add_two_to_player_hand(self, players):
         """
-        takes 2 cards from deck list, removes this two cards from deck and put in active_players_cards
+        takes 2 cards from deck for every player
         :param: players - active_players list from python PokerGame class
         """
-        active_players_cards = {}
-        for player in players:
-            cards = [self.deck[0], self.deck[1]]
-            [self.deck.remove(card) for card in cards]
-            active_players_cards[player.id] = cards
-        return active_players_cards
+        cards = self.deal(len(players) * 2)
+        return {
+            player.id: [list(_INDEX_CARDS[cards[i * 2]]), list(_INDEX_CARDS[cards[i * 2 + 1]])]
+            for i, player in enumerate(players)
+        }
 
     def add_three_on_table(self):
         """
-        takes three cards from  and remove them from deck
+        takes three cards from deck
         :return:
         """
-        cards_on_table = {}
-        cards = self.deck[0:3]
-        [self.deck.remove(card) for card in cards]
-        cards_on_table['table'] = cards
-        return cards_on_table
+        return {'table': [list(_INDEX_CARDS[index]) for index in self.deal(3)]}
 
     def add_one_on_table(self):
         """
-        takes three cards from  and remove them from deck
+        takes one card from deck
         :return:
         """
-        cards_on_table = {}
-        card = self.deck[0]
-        self.deck.remove(card)
-        cards_on_table['table'] = card
-        return cards_on_table
+        return {'table': list(_INDEX_CARDS[self.deal(1)[0]])}
 
     def add_to_table(self, is_flop=False):
         counts = 3 if is_flop else 1
-        cards_on_table = {}
-        cards = random.sample(self.deck, counts)
-        [self.deck.remove(card) for card in cards]
-        cards_on_table['table'] = cards
-        return cards_on_table
+        return {'table': [list(_INDEX_CARDS[index]) for index in self.deal(counts)]}
@@ -1,10 +1,16 @@
-from typing import Optional, List, Tuple, TYPE_CHECKING
+from typing import Optional, List, Tuple, Dict, TYPE_CHECKING
 
+import contextlib
 import math
+import threading
+
+from django.db import transaction
 
 from tcp_server.enums.errors import GameErrorsCode
 from .cards import CardDealer
 from .game_table import GameTable
+from .hand_state import HandState, HandWriteBehind, SeatState
+from .unit_of_work import GameUnitOfWork
 from poker_game.models import Table, Game, Round, PlayerGame, UserRole, PlayerTurn, Bet, UserTransaction
 from .player import Player
 from ..textchoices import RoundTypeChoice, UserRoleTypeChoice, TransactionTypeChoice, PlayerTurnChoice
@@ -23,8 +29,18 @@ class PokerGame:
         RoundTypeChoice.END_GAME: 'end_game'
     }
 
-    def __init__(self):
+    def __init__(self, in_memory_hands: bool = False):
+        """
+        :param in_memory_hands: running hands live in GameTable.hand, actions are validated and applied
+            without DB reads and written behind at the end of table command
+        """
         self.tables = []
+        self.in_memory_hands = in_memory_hands
+        # user_id -> hand where user plays
+        self.hand_users: Dict[int, HandState] = {}
+        self.hand_writes = HandWriteBehind(invalidate=self.drop_hand)
+        # unit of work of the running game transition by thread
+        self.local = threading.local()
 
     def create_table(self, table_key: str):
         """
@@ -56,6 +72,155 @@ class PokerGame:
     def tables_list(self) -> List[GameTable]:
         return self.tables
 
+    def dump_tables(self) -> List[dict]:
+        """
+        Local tables state for hot restart, hands themselves are stored in DB
+        :return:
+        """
+        return [table.dump_state() for table in self.tables]
+
+    def restore_tables(self, states: List[dict]):
+        """
+        Local tables from dump_tables() of previous process
+        :param states:
+        :return:
+        """
+        self.tables = [GameTable.from_state(state) for state in states]
+
+    @contextlib.contextmanager
+    def unit_of_work(self):
+        """
+        One game transition: collected rows are written with bulk_create at the end,
+        everything runs in one atomic block, so transition is never half applied.
+        Nested transition is part of the outer one
+        :return:
+        """
+        current = getattr(self.local, 'unit_of_work', None)
+        if current is not None:
+            yield current
+            return
+        unit_of_work = self.local.unit_of_work = GameUnitOfWork()
+        try:
+            with transaction.atomic():
+                yield unit_of_work
+                unit_of_work.flush()
+        finally:
+            self.local.unit_of_work = None
+
+    def hand_context(self):
+        """
+        Context of table command, writes of in-memory hands are flushed at its end
+        :return:
+        """
+        if not self.in_memory_hands:
+            return contextlib.nullcontext()
+        return self.hand_writes.context()
+
+    def sync_hands(self, table_key: Optional[str] = None):
+        """
+        Write pending changes of in-memory hands before DB driven code,
+        hand of the table is dropped and loaded again on the next action
+        :param table_key:
+        :return:
+        """
+        if not self.in_memory_hands:
+            return
+        self.hand_writes.flush()
+        if table_key:
+            self.drop_hand(table_key)
+
+    def sync_user_hand(self, user_id: int):
+        """
+        sync_hands() for the hand where user plays
+        :param user_id:
+        :return:
+        """
+        if not self.in_memory_hands:
+            return
+        hand = self.hand_users.get(user_id)
+        self.sync_hands(hand.table_key if hand else None)
+
+    def drop_hand(self, table_key: str):
+        table = self.get_table(table_key)
+        hand = table.hand if table else None
+        if hand is None:
+            return
+        table.hand = None
+        for user_id in hand.users:
+            if self.hand_users.get(user_id) is hand:
+                del self.hand_users[user_id]
+
+    def get_user_hand(self, user_id: int) -> Optional[HandState]:
+        """
+        In-memory hand of user, loaded from DB once per round
+        :param user_id:
+        :return:
+        """
+        hand = self.hand_users.get(user_id)
+        if hand is not None:
+            return hand
+        self.hand_writes.flush()
+        player = PlayerGame.objects.filter(user_id=user_id).first()
+        if not player or not player.game_id:
+            return None
+        round_model = Round.objects.select_related('game__table').filter(game_id=player.game_id).last()
+        if not round_model:
+            return None
+        hand = HandState.load(round_model)
+        self.drop_hand(hand.table_key)
+        table = self.get_table(hand.table_key)
+        if not table:
+            self.create_table(hand.table_key)
+            table = self.get_table(hand.table_key)
+        table.hand = hand
+        for hand_user_id in hand.users:
+            self.hand_users[hand_user_id] = hand
+        return hand
+
+    def get_round_hand(self, round_model: Optional[Round]) -> Optional[HandState]:
+        """
+        In-memory hand of the round if it is loaded
+        :param round_model:
+        :return:
+        """
+        if not self.in_memory_hands or round_model is None:
+            return None
+        table = self.get_table(round_model.game.table.key)
+        hand = table.hand if table else None
+        return hand if hand is not None and hand.round.id == round_model.id else None
+
+    def bidding_closed(self, round_model: Round) -> bool:
+        """
+        Round.bidding_closed(True) after user turn
+        :param round_model:
+        :return:
+        """
+        hand = self.get_round_hand(round_model)
+        if hand is None:
+            return round_model.bidding_closed(True)
+        closed, changed = hand.bidding_closed(in_main=True)
+        if changed:
+            self.hand_writes.update_round(hand)
+            self.hand_writes.flush_if_idle()
+        return closed
+
+    def get_current_player(self, round_model: Round):
+        """
+        Player on turn: PlayerGame or SeatState of in-memory hand, both have user_id and is_fold
+        :param round_model:
+        :return:
+        """
+        hand = self.get_round_hand(round_model)
+        if hand is None:
+            return round_model.get_current_player()
+        return hand.current_seat
+
+    def active_players_count(self, round_model: Round) -> int:
+        hand = self.get_round_hand(round_model)
+        if hand is None:
+            return round_model.game.get_active_players().count()
+        return hand.active_players_count
+
     def connect_player_to_table(self, table_key: str, user: "User") -> Tuple[int, bool]:
         """
         Connect player to table and return count players on table
@@ -112,6 +277,7 @@ class PokerGame:
 
     def leave_game(self, table_key: str, user_id: int):
         print('leave_game')
+        self.sync_hands(table_key)
         table = self.get_table_from_db(table_key)
         game = Game.objects.filter(
             table_id=table.id,
@@ -139,6 +305,7 @@ class PokerGame:
         else:
 
             folded, error, round_model, is_last_turn = self.fold(user_id)
+            self.sync_hands(table_key)
             print(f'fold round_model: {round_model}')
 
             if not round_model:
@@ -179,12 +346,14 @@ class PokerGame:
                     round_model.save()
 
             try:
-                PlayerTurn.objects.create(
-                    user_id=user_id,
-                    game_id=round_model.game_id,
-                    round_id=round_model.id,
-                    action_choice=PlayerTurnChoice.LEAVE
-                )
+                # savepoint, failed insert must not break transaction of the table command
+                with transaction.atomic():
+                    PlayerTurn.objects.create(
+                        user_id=user_id,
+                        game_id=round_model.game_id,
+                        round_id=round_model.id,
+                        action_choice=PlayerTurnChoice.LEAVE
+                    )
                 print('added leave game turn')
             except:
                 print('not able to add leave game turn')
@@ -213,29 +382,31 @@ class PokerGame:
                 game.delete()
 
         try:
-            print(f'--- actual player count: {table.players.count()}')
-            if table.players.count() == 1:
-                player = table.players.first()
-                print(f'--- only player: {player}')
-                print(f'--- only player game_id: {player.game_id}')
-                if player.game_id is None:
-                    game = table.get_last_game()
-                    print(f'remove game 2: {game}')
-                    if game:
-                        PlayerGame.objects.filter(game=game).all().delete()
-                        game.delete()
-                    player_last_turn = PlayerTurn.objects.filter(user_id=user_id).order_by('-id').first()
-                    print(f'--- player_last_turn: {player_last_turn}')
-                    if player_last_turn:
-                        print(f'--- player_last_turn action_choice: {player_last_turn.action_choice}')
-                        if player_last_turn.action_choice == PlayerTurnChoice.LEAVE:
-                            player.delete()
-                            print(f'--- player deleted')
+            with transaction.atomic():
+                print(f'--- actual player count: {table.players.count()}')
+                if table.players.count() == 1:
+                    player = table.players.first()
+                    print(f'--- only player: {player}')
+                    print(f'--- only player game_id: {player.game_id}')
+                    if player.game_id is None:
+                        game = table.get_last_game()
+                        print(f'remove game 2: {game}')
+                        if game:
+                            PlayerGame.objects.filter(game=game).all().delete()
+                            game.delete()
+                        player_last_turn = PlayerTurn.objects.filter(user_id=user_id).order_by('-id').first()
+                        print(f'--- player_last_turn: {player_last_turn}')
+                        if player_last_turn:
+                            print(f'--- player_last_turn action_choice: {player_last_turn.action_choice}')
+                            if player_last_turn.action_choice == PlayerTurnChoice.LEAVE:
+                                player.delete()
+                                print(f'--- player deleted')
         except:
             pass
         
 
     def stop_game(self, game: Game, round: Round):
+        self.sync_hands(game.table.key)
         game.type = RoundTypeChoice.END_GAME
         last_player = game.get_active_players().last()
         bank = game.bank
@@ -262,13 +433,15 @@ class PokerGame:
         :param table_key: key table
         :return:
         """
-        Game.objects.filter(
-            table__key=table_key
-        ).update(
-            active=False,
-        )
-        table_db = self.get_table_from_db(table_key)
-        return self.pre_flop(table_db=table_db)
+        self.sync_hands(table_key)
+        with self.unit_of_work():
+            Game.objects.filter(
+                table__key=table_key
+            ).update(
+                active=False,
+            )
+            table_db = self.get_table_from_db(table_key)
+            return self.pre_flop(table_db=table_db)
 
     def pre_flop(self, table_db: Table) -> Round:
         """
@@ -279,28 +452,34 @@ class PokerGame:
         param table_db:
         :return:
         """
-        game = Game.objects.create(table_id=table_db.id)
-        game_id = game.id
-        table = self.get_table(table_db.key)
-        table.active_players = []
-        [table.active_players.append(player) for player in table.players()]
-        table_db.in_wait = False
-        table_db.save()
-        card_dealer = CardDealer()
-        card_dealer.cards_generator()
-        card_dealer.cards_shuffle()
-        round_model = Round.objects.create(
-            game_id=game_id,
-            type=RoundTypeChoice.PRE_FLOP,
-            cards=card_dealer.add_two_to_player_hand(players=table.active_players),
-            order=0,
-            highest_bet=0,
-        )
-        self.add_players(game=game)
-        self.add_user_roles(round_model=round_model)
+        with self.unit_of_work() as unit_of_work:
+            table = self.get_table(table_db.key)
+            table.active_players = []
+            [table.active_players.append(player) for player in table.players()]
+            # deck of the whole hand is shuffled once, later streets are dealt from it
+            card_dealer = CardDealer.from_seed()
+            players_cards = card_dealer.add_two_to_player_hand(players=table.active_players)
+            game = Game.objects.create(
+                table_id=table_db.id,
+                deck=card_dealer.deck_bytes,
+                deck_seed=card_dealer.seed
+            )
+            game_id = game.id
+            table_db.in_wait = False
+            table_db.save()
+            round_model = Round.objects.create(
+                game_id=game_id,
+                type=RoundTypeChoice.PRE_FLOP,
+                cards=players_cards,
+                order=0,
+                highest_bet=0,
+            )
+            self.add_players(game=game)
+            self.add_user_roles(round_model=round_model, unit_of_work=unit_of_work)
         return round_model
 
     def end_game(self, game_round: Round):
+        self.sync_hands(game_round.game.table.key)
         evaluates = check_the_winner(game_round.filtered_cards)
         winners = [i[0] for i in evaluates]
         game_bank = game_round.game.bank
@@ -353,7 +532,7 @@ class PokerGame:
         return PlayerGame.objects.filter(user_id=user_id, is_fold=True).count() > 0
 
     @staticmethod
-    def add_user_roles(round_model: Round):
+    def add_user_roles(round_model: Round, unit_of_work: Optional[GameUnitOfWork] = None):
         user_role = UserRoleTypeChoice
         game = round_model.game
         table = game.table
@@ -394,12 +573,19 @@ class PokerGame:
                 )
                 for player in active_players if player.get('seat_index') not in roles_config.keys()
             ]
-        for player in active_players:
-            UserRole.objects.create(
+        roles = [
+            UserRole(
                 **player,
                 role=roles_config.get(player.get('seat_index')),
                 game_id=game.id,
             )
+            for player in active_players
+        ]
+        if unit_of_work is None:
+            UserRole.objects.bulk_create(roles)
+            return
+        for role in roles:
+            unit_of_work.add(role)
 
     def is_valid_bet(self, user_id: int, amount: int) -> Tuple[
         bool,
@@ -463,13 +649,15 @@ class PokerGame:
         valid_turn, error, player, round_model = PokerGame._is_valid_turn(user_id=user_id)
         if not valid_turn:
             return valid_turn, error, player, round_model
+        if round_model is None:
+            return False, GameErrorsCode.NOT_ACTIVE_PLAYER, player, round_model
 
         role = UserRole.objects.filter(
             user_id=player.user_id,
             game_id=round_model.game_id,
         ).first()
 
-        if not role.can_auto_fold():
+        if not role or not role.can_auto_fold():
             return False, GameErrorsCode.NOT_YOUR_TURN, player, round_model
 
         return True, None, player, round_model
@@ -497,6 +685,8 @@ class PokerGame:
         :param amount:
         :return:
         """
+        if self.in_memory_hands:
+            return self._bet_in_memory(user_id=user_id, amount=amount)
         valid, error, player, round_model = self.is_valid_bet(
             user_id=user_id,
             amount=amount
@@ -504,20 +694,20 @@ class PokerGame:
         if not valid:
             return valid, error, round_model, False
 
-
         amount = int(amount)
-        max_bet = round_model.highest_total_bet
-
-        PokerGame.register_bet(user_id=user_id, amount=amount, round_model=round_model)
-        
-        user_bet = round_model.get_user_total_bet(user_id)
-        if user_bet > max_bet:
-            round_model.highest_bet_seat_index = player.seat_index
-            round_model.highest_bet_at_this_round = True
-            round_model.highest_bet = user_bet
-            round_model.save()
-
-        round_model, is_last_turn = self._on_after_turn(game_round=round_model)
+        with self.unit_of_work() as unit_of_work:
+            max_bet = round_model.highest_total_bet
+            # bet rows are written with the transition, total is counted before them
+            user_bet = round_model.get_user_total_bet(user_id) + amount
+            PokerGame.register_bet(user_id=user_id, amount=amount, round_model=round_model, unit_of_work=unit_of_work)
+
+            if user_bet > max_bet:
+                round_model.highest_bet_seat_index = player.seat_index
+                round_model.highest_bet_at_this_round = True
+                round_model.highest_bet = user_bet
+                round_model.save()
+
+            round_model, is_last_turn = self._on_after_turn(game_round=round_model)
         return True, None, round_model, is_last_turn
 
     def check(self, user_id: int) -> Tuple[
@@ -526,6 +716,8 @@ class PokerGame:
         Round,
         bool
     ]:
+        if self.in_memory_hands:
+            return self._check_in_memory(user_id=user_id)
         valid, error, player, round_model = self.is_valid_check(
             user_id=user_id,
         )
@@ -533,13 +725,14 @@ class PokerGame:
         if not valid:
             return valid, error, round_model, False
 
-        PlayerTurn.objects.create(
-            user_id=user_id,
-            game_id=round_model.game_id,
-            round_id=round_model.id,
-            action_choice=PlayerTurnChoice.CHECK
-        )
-        round_model, is_last_turn = self._on_after_turn(game_round=round_model)
+        with self.unit_of_work() as unit_of_work:
+            unit_of_work.add(PlayerTurn(
+                user_id=user_id,
+                game_id=round_model.game_id,
+                round_id=round_model.id,
+                action_choice=PlayerTurnChoice.CHECK
+            ))
+            round_model, is_last_turn = self._on_after_turn(game_round=round_model)
         return True, None, round_model, is_last_turn
 
     def auto_fold(self, user_id: int) -> Tuple[
@@ -548,42 +741,142 @@ class PokerGame:
         Round,
         bool
     ]:
+        if self.in_memory_hands:
+            return self._auto_fold_in_memory(user_id=user_id)
         valid, error, player, round_model = self.is_valid_auto_fold(
             user_id=user_id,
         )
+        if not valid:
+            return valid, error, round_model, False
 
-        PlayerTurn.objects.create(
-            user_id=user_id,
-            game_id=round_model.game_id,
-            round_id=round_model.id,
-            action_choice=PlayerTurnChoice.AUTO_FOLD
-        )
-        round_model, is_last_turn = self._on_after_turn(game_round=round_model)
+        with self.unit_of_work() as unit_of_work:
+            unit_of_work.add(PlayerTurn(
+                user_id=user_id,
+                game_id=round_model.game_id,
+                round_id=round_model.id,
+                action_choice=PlayerTurnChoice.AUTO_FOLD
+            ))
+            round_model, is_last_turn = self._on_after_turn(game_round=round_model)
         return True, None, round_model, is_last_turn
 
     def fold(self, user_id: int) -> Tuple:
+        if self.in_memory_hands:
+            return self._fold_in_memory(user_id=user_id)
         valid, error, player, round_model = self.is_valid_fold(
             user_id=user_id,
         )
         if not valid:
             return valid, error, round_model, False
 
-        if round_model:
-            PlayerTurn.objects.create(
-                user_id=user_id,
-                game_id=round_model.game_id,
-                round_id=round_model.id,
-                action_choice=PlayerTurnChoice.FOLD
-            )
-
-            PlayerGame.objects.filter(
-                user_id=user_id,
-                game_id=round_model.game_id,
-            ).update(is_fold=True)
+        with self.unit_of_work() as unit_of_work:
+            if round_model:
+                unit_of_work.add(PlayerTurn(
+                    user_id=user_id,
+                    game_id=round_model.game_id,
+                    round_id=round_model.id,
+                    action_choice=PlayerTurnChoice.FOLD
+                ))
+                unit_of_work.update_where(
+                    PlayerGame,
+                    {'user_id': user_id, 'game_id': round_model.game_id},
+                    is_fold=True
+                )
+                # next player is looked up among not folded players
+                unit_of_work.flush()
 
-        round_model, is_last_turn = self._on_after_turn(game_round=round_model)
+            round_model, is_last_turn = self._on_after_turn(game_round=round_model)
         return True, None, round_model, is_last_turn
 
+    def _is_valid_hand_turn(self, user_id: int) -> Tuple[
+        bool,
+        Optional[str],
+        Optional[HandState],
+        Optional[SeatState]
+    ]:
+        """
+        _is_valid_turn on in-memory hand
+        :param user_id:
+        :return:
+        """
+        hand = self.get_user_hand(user_id)
+        seat = hand.users.get(user_id) if hand else None
+        if seat is None:
+            return False, GameErrorsCode.NOT_ACTIVE_PLAYER, hand, seat
+        if hand.round.turn_index != seat.seat_index:
+            return False, GameErrorsCode.NOT_YOUR_TURN, hand, seat
+        return True, None, hand, seat
+
+    def _bet_in_memory(self, user_id: int, amount: int) -> Tuple[bool, Optional[str], Optional[Round], bool]:
+        valid, error, hand, seat = self._is_valid_hand_turn(user_id=user_id)
+        if valid and amount < hand.min_bet_amount():
+            valid, error = False, GameErrorsCode.MIN_BET_AMOUNT
+        if valid and not hand.can_bet(seat):
+            valid, error = False, GameErrorsCode.NOT_YOUR_TURN
+        if not valid:
+            return valid, error, hand.round if hand else None, False
+
+        amount = int(amount)
+        max_bet = hand.highest_total_bet()
+        self.hand_writes.register_bet(hand, user_id=user_id, amount=amount, action_choice=hand.bet_type(amount))
+        seat.round_bet += amount
+        hand.last_bet_amount = amount
+        if seat.round_bet > max_bet:
+            round_model = hand.round
+            round_model.highest_bet_seat_index = seat.seat_index
+            round_model.highest_bet_at_this_round = True
+            round_model.highest_bet = seat.round_bet
+            self.hand_writes.update_round(hand)
+        return self._on_after_hand_turn(hand)
+
+    def _check_in_memory(self, user_id: int) -> Tuple[bool, Optional[str], Optional[Round], bool]:
+        valid, error, hand, seat = self._is_valid_hand_turn(user_id=user_id)
+        if valid and not hand.can_check(seat):
+            valid, error = False, GameErrorsCode.NOT_YOUR_TURN
+        if not valid:
+            return valid, error, hand.round if hand else None, False
+
+        self.hand_writes.turn(hand, user_id=user_id, action_choice=PlayerTurnChoice.CHECK)
+        return self._on_after_hand_turn(hand)
+
+    def _auto_fold_in_memory(self, user_id: int) -> Tuple[bool, Optional[str], Optional[Round], bool]:
+        """
+        auto_fold() on in-memory hand: player must have the turn and a role in the game
+        :param user_id:
+        :return:
+        """
+        valid, error, hand, seat = self._is_valid_hand_turn(user_id=user_id)
+        if valid and not seat.has_role:
+            valid, error = False, GameErrorsCode.NOT_YOUR_TURN
+        if not valid:
+            return valid, error, hand.round if hand else None, False
+
+        self.hand_writes.turn(hand, user_id=user_id, action_choice=PlayerTurnChoice.AUTO_FOLD)
+        return self._on_after_hand_turn(hand)
+
+    def _fold_in_memory(self, user_id: int) -> Tuple[bool, Optional[str], Optional[Round], bool]:
+        valid, error, hand, seat = self._is_valid_hand_turn(user_id=user_id)
+        if not valid:
+            return valid, error, hand.round if hand else None, False
+
+        self.hand_writes.turn(hand, user_id=user_id, action_choice=PlayerTurnChoice.FOLD)
+        self.hand_writes.fold(hand, user_id=user_id)
+        seat.is_fold = True
+        return self._on_after_hand_turn(hand)
+
+    def _on_after_hand_turn(self, hand: HandState) -> Tuple[bool, Optional[str], Round, bool]:
+        """
+        _on_after_turn on in-memory hand
+        :param hand:
+        :return:
+        """
+        last_turn, next_player_index = hand.next_player_index()
+        if next_player_index is not None:
+            hand.round.order = next_player_index
+            hand.round.turn_index = next_player_index
+            self.hand_writes.update_round(hand)
+        self.hand_writes.flush_if_idle()
+        return True, None, hand.round, last_turn
+
     @staticmethod
     def users_round_turn_info(game_round: Round) -> List[UserRoundTurnInfo]:
         """
@@ -656,56 +949,76 @@ class PokerGame:
         )
 
     def setup_start_game_bets(self, round_model: Round):
+        self.sync_hands(round_model.game.table.key)
         small_blind = round_model.game.get_small_blind_role()
         big_blind = round_model.game.get_big_blind_role()
         if not small_blind or not big_blind:
             return
         min_bet_amount = round_model.game.table.min_bet
-        PokerGame.register_bet(
-            user_id=small_blind.user_id,
-            amount=round(min_bet_amount / 2, 0),
-            round_model=round_model
-        )
-        PokerGame.register_bet(
-            user_id=big_blind.user_id,
-            amount=min_bet_amount,
-            round_model=round_model
-        )
-        dealer = UserRole.objects.filter(game_id=round_model.game_id,
-                                         role__contains=[UserRoleTypeChoice.DEALER]).first()
-        next_player = self._get_next_player_by_seat(round_model, dealer.seat_index)
+        small_blind_amount = round(min_bet_amount / 2, 0)
+        with self.unit_of_work() as unit_of_work:
+            # blinds are written together, big blind turn type is chosen by the not written small blind
+            PokerGame.register_bet(
+                user_id=small_blind.user_id,
+                amount=small_blind_amount,
+                round_model=round_model,
+                unit_of_work=unit_of_work
+            )
+            PokerGame.register_bet(
+                user_id=big_blind.user_id,
+                amount=min_bet_amount,
+                round_model=round_model,
+                action_choice=PokerGame._bet_type_after(last_bet_amount=small_blind_amount, bet_amount=min_bet_amount),
+                unit_of_work=unit_of_work
+            )
+            dealer = UserRole.objects.filter(game_id=round_model.game_id,
+                                             role__contains=[UserRoleTypeChoice.DEALER]).first()
+            next_player = self._get_next_player_by_seat(round_model, dealer.seat_index)
 
-        round_model.turn_index = next_player.seat_index
-        round_model.highest_bet = min_bet_amount
-        round_model.save()
+            round_model.turn_index = next_player.seat_index
+            round_model.highest_bet = min_bet_amount
+            round_model.save()
 
     @staticmethod
-    def register_bet(user_id: int, amount: int, round_model: Round) -> Tuple[UserTransaction, PlayerTurn, Bet]:
+    def register_bet(
+            user_id: int,
+            amount: int,
+            round_model: Round,
+            action_choice: Optional[str] = None,
+            unit_of_work: Optional[GameUnitOfWork] = None
+    ) -> Tuple[Bet, PlayerTurn, UserTransaction]:
         """
-        Register bet
+        Register bet: transaction, turn and bet rows written together
         :param user_id:
         :param amount:
         :param round_model:
+        :param action_choice: turn type, by the last written bet of the round by default
+        :param unit_of_work: rows are written with the transition, at once without it
         :return:
         """
-        transaction = UserTransaction.objects.create(
+        if action_choice is None:
+            action_choice = PokerGame._get_bet_type(round_model=round_model, bet_amount=amount)
+        rows = GameUnitOfWork() if unit_of_work is None else unit_of_work
+        user_transaction = rows.add(UserTransaction(
             user_id=user_id,
             amount=-amount,
             type=TransactionTypeChoice.BET
-        )
-        turn = PlayerTurn.objects.create(
+        ))
+        turn = rows.add(PlayerTurn(
             user_id=user_id,
             game_id=round_model.game_id,
             round_id=round_model.id,
-            action_choice=PokerGame._get_bet_type(round_model=round_model, bet_amount=amount)
-        )
-        bet = Bet.objects.create(
+            action_choice=action_choice
+        ))
+        bet = rows.add(Bet(
             game_id=round_model.game_id,
             user_id=user_id,
             amount=amount,
             round_id=round_model.id
-        )
-        return bet, turn, transaction
+        ))
+        if unit_of_work is None:
+            rows.flush()
+        return bet, turn, user_transaction
 
     @staticmethod
     def _is_valid_turn(user_id: int) -> Tuple[
@@ -755,6 +1068,7 @@ class PokerGame:
         :param game_round:
         :return:
         """
+        self.sync_hands(game_round.game.table.key)
         next_round = PokerGame._get_next_round_type(game_round)
 
         if next_round == RoundTypeChoice.END_GAME:
@@ -811,16 +1125,29 @@ class PokerGame:
         next_index = next_player.seat_index
         return is_last, next_index
 
+    @staticmethod
+    def _get_card_dealer(round_model: Round) -> CardDealer:
+        """
+        Deck of the hand with cursor after cards of the round, every dealt card is in Round.cards.
+        Games started without stored deck rebuild it from not dealt cards
+        :param round_model:
+        :return:
+        """
+        deck = round_model.game.deck
+        if deck is None:
+            card_dealer = CardDealer(cards_on_hand=round_model.cards_round)
+            card_dealer.cards_generator()
+            return card_dealer
+        cursor = sum(len(cards) for cards in (round_model.cards or {}).values())
+        return CardDealer.from_deck(deck, cursor)
+
     def _next_table_round(self, prev_round_model: Round) -> Round:
         """
         Switch to next round the game
         :param prev_round_model:
         :return:
         """
-        card_dealer = CardDealer(
-            cards_on_hand=prev_round_model.cards_round
-        )
-        card_dealer.cards_generator()
+        card_dealer = self._get_card_dealer(prev_round_model)
         next_round_type = PokerGame._get_next_round_type(
             game_round=prev_round_model
         )
@@ -860,12 +1187,25 @@ class PokerGame:
         last_bet = Bet.objects.filter(
             round_id=round_model.id
         ).order_by('-id').first()
-        if not last_bet:
+        return PokerGame._bet_type_after(
+            last_bet_amount=last_bet.amount if last_bet else None,
+            bet_amount=bet_amount
+        )
+
+    @staticmethod
+    def _bet_type_after(last_bet_amount: Optional[int], bet_amount) -> str:
+        """
+        Bet type by the previous bet amount of the round
+        :param last_bet_amount: None if it is the first bet
+        :param bet_amount:
+        :return:
+        """
+        if last_bet_amount is None:
             return PlayerTurnChoice.BET
 
         params = {
-            bet_amount == last_bet.amount: PlayerTurnChoice.CALL,
-            bet_amount > last_bet.amount: PlayerTurnChoice.RISE,
+            bet_amount == last_bet_amount: PlayerTurnChoice.CALL,
+            bet_amount > last_bet_amount: PlayerTurnChoice.RISE,
         }
         return params.get(True, PlayerTurnChoice.BET)
 
@@ -1,14 +1,164 @@
 import json
-from typing import List
+import re
+from typing import List, Dict, Optional
 
 from rest_framework.renderers import JSONRenderer
 
 from poker_game.models import Table, Game, Round
-from poker_game.serializers.protocol_game_serializers import AuthSerializer, TableGameSerializer
+from poker_game.serializers.protocol_game_serializers import (
+    AuthSerializer,
+    TableGameSerializer,
+    format_cards_response,
+)
 from user.models import User
+from . import binary_protocol
+from .table_status_delta import TableStateVersions
+
+
+class MessageEncoding:
+    """
+    Default JSON encoding of outbound payloads
+    """
+    name = 'json'
+    PLACEHOLDER_PATTERN = re.compile(rb'"@@u_h:(\d+)@@"')
+    HIDDEN_CARDS = b'null'
+
+    def render(self, data) -> bytes:
+        return GameMessagesProtocol.format_response(data)
+
+    def render_cards(self, cards: List[str]) -> bytes:
+        return GameMessagesProtocol.format_response(cards)
+
+
+class BinaryMessageEncoding(MessageEncoding):
+    """
+    Compact binary encoding: integer field tags, varints, one byte per card
+    """
+    name = 'bin'
+    # T_STR, one byte length, placeholder
+    PLACEHOLDER_PATTERN = re.compile(rb'\x04[\x00-\x7f]@@u_h:(\d+)@@')
+    HIDDEN_CARDS = bytes([binary_protocol.T_NULL])
+
+    def render(self, data) -> bytes:
+        return binary_protocol.encode(data)
+
+    def render_cards(self, cards: List[str]) -> bytes:
+        buffer = bytearray()
+        binary_protocol.encode_value(buffer, cards, cards=True)
+        return bytes(buffer)
+
+
+JSON_ENCODING = MessageEncoding()
+BINARY_ENCODING = BinaryMessageEncoding()
+
+
+class RenderedTableStatus:
+    """
+    Table status rendered in one encoding, split by private cards placeholders into shared segments
+    """
+
+    def __init__(self, rendered: bytes, private_cards: Dict[int, bytes], encoding: MessageEncoding):
+        parts = encoding.PLACEHOLDER_PATTERN.split(rendered)
+        self.segments: List[bytes] = parts[0::2]
+        self.placeholders: List[int] = [int(user_id) for user_id in parts[1::2]]
+        self.private_cards = private_cards
+        self.hidden_cards = encoding.HIDDEN_CARDS
+        self._public: Optional[bytes] = None
+
+    def public(self) -> bytes:
+        if self._public is None:
+            self._public = self.hidden_cards.join(self.segments)
+        return self._public
+
+    def for_user(self, user_id: int) -> bytes:
+        if user_id not in self.placeholders:
+            return self.public()
+        chunks = [self.segments[0]]
+        for placeholder, segment in zip(self.placeholders, self.segments[1:]):
+            chunks.append(self.private_cards[placeholder] if placeholder == user_id else self.hidden_cards)
+            chunks.append(segment)
+        return b''.join(chunks)
+
+
+class TableStatusBroadcast:
+    """
+    Table status serialized once per state change.
+    Shared payload is rendered once per used encoding,
+    message for a recipient is joined from the shared segments and his own cards only
+    """
+
+    def __init__(
+            self,
+            data: dict,
+            private_cards: Dict[int, List[str]],
+            version: Optional[int] = None,
+            delta: Optional["TableStatusBroadcast"] = None
+    ):
+        self.data = data
+        self.private_cards = private_cards
+        self.version = version
+        # patch from previous version, None when only snapshot is possible
+        self.delta = delta
+        self._rendered: Dict[str, RenderedTableStatus] = {}
+
+    def rendered(self, encoding: MessageEncoding = JSON_ENCODING) -> RenderedTableStatus:
+        rendered = self._rendered.get(encoding.name)
+        if rendered is None:
+            rendered = RenderedTableStatus(
+                rendered=encoding.render(self.data),
+                private_cards={
+                    user_id: encoding.render_cards(cards) for user_id, cards in self.private_cards.items()
+                },
+                encoding=encoding
+            )
+            self._rendered[encoding.name] = rendered
+        return rendered
+
+    def has_private_cards(self, user_id: int, encoding: MessageEncoding = JSON_ENCODING) -> bool:
+        return user_id in self.rendered(encoding).placeholders
+
+    def public(self, encoding: MessageEncoding = JSON_ENCODING) -> bytes:
+        """
+        Payload without hidden hand cards, the same object for every recipient
+        :param encoding:
+        :return:
+        """
+        return self.rendered(encoding).public()
+
+    def for_user(self, user_id: int, encoding: MessageEncoding = JSON_ENCODING) -> bytes:
+        """
+        Payload for recipient with his hand cards
+        :param user_id:
+        :param encoding:
+        :return:
+        """
+        return self.rendered(encoding).for_user(user_id)
+
+    def dumps(self) -> bytes:
+        """
+        Broadcast state for another broker node, rendered payloads are not included
+        :return:
+        """
+        return GameMessagesProtocol.format_response({
+            'data': self.data,
+            'private_cards': self.private_cards,
+            'version': self.version,
+            'delta': self.delta.data if self.delta is not None else None,
+        })
+
+    @classmethod
+    def loads(cls, data: bytes) -> "TableStatusBroadcast":
+        state = json.loads(data)
+        private_cards = {int(user_id): cards for user_id, cards in state['private_cards'].items()}
+        delta = None
+        if state['delta'] is not None:
+            delta = cls(data=state['delta'], private_cards=private_cards, version=state['version'])
+        return cls(data=state['data'], private_cards=private_cards, version=state['version'], delta=delta)
 
 
 class GameMessagesProtocol:
+    renderer = JSONRenderer()
+    renderer.compact = True
 
     @staticmethod
     def user_auth_message(auth_success: bool = True):
@@ -44,15 +194,74 @@ class GameMessagesProtocol:
         return GameMessagesProtocol.format_response(serializer.data)
 
     @staticmethod
-    def format_response(data: dict):
+    def table_status_broadcast(
+            table_model: Table,
+            state_versions: Optional[TableStateVersions] = None
+    ) -> TableStatusBroadcast:
+        """
+        Table status for all players of the table, serialized once.
+        With state versions snapshot has `g_v` version
+        and broadcast has delta message `{"d_v": version, "d_bv": base version, "d": changed fields}`
+        :param table_model:
+        :param state_versions:
+        :return:
+        """
+        data, private_cards = GameMessagesProtocol.table_status_payload(table_model=table_model)
+        if state_versions is None:
+            return TableStatusBroadcast(data=data, private_cards=private_cards)
+
+        version, delta = state_versions.update(table_key=table_model.key, payload=data, private_cards=private_cards)
+        delta_broadcast = None
+        if delta is not None:
+            delta_broadcast = TableStatusBroadcast(
+                data={
+                    'd_v': version,
+                    'd_bv': version - 1,
+                    'd': delta,
+                },
+                private_cards=private_cards,
+                version=version
+            )
+        return TableStatusBroadcast(
+            data={**data, 'g_v': version},
+            private_cards=private_cards,
+            version=version,
+            delta=delta_broadcast
+        )
+
+    @staticmethod
+    def table_status_payload(table_model: Table):
+        """
+        Shared table status payload with private cards placeholders and rendered private cards
+        :param table_model:
+        :return: payload, formatted private cards by user id
+        """
+        game: Game = table_model.get_last_game()
+        round_model: Round = game.current_round() if game else None
+
+        serializer = TableGameSerializer(
+            game_model=game,
+            round_model=round_model,
+            instance=table_model,
+            context={"current_user": None, "private_cards_placeholder": True},
+            with_label_representation=False
+        )
+        cards = round_model.cards if round_model and round_model.cards else {}
+        private_cards = {
+            int(owner): format_cards_response(owner_cards)
+            for owner, owner_cards in cards.items()
+            if owner != 'table' and owner_cards
+        }
+        return serializer.data, private_cards
+
+    @staticmethod
+    def format_response(data):
         """
         Base format response
         :param data:
         :return:
         """
-        renderer = JSONRenderer()
-        renderer.compact = True
-        return renderer.render(data=data)
+        return GameMessagesProtocol.renderer.render(data=data)
 
 
 out_game_protocol = GameMessagesProtocol()
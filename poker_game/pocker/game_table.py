@@ -1,7 +1,8 @@
-from typing import List
+from typing import List, Optional
 
 from poker_game.models import UserTable, PlayerGame
 from poker_game.poker.cards import CardDealer
+from poker_game.poker.hand_state import HandState
 from poker_game.poker.player import Player
 
 
@@ -26,6 +27,30 @@ class GameTable:
         self.table_key = table_key
         self.card_dealer = CardDealer()
         self.active_players: List[Player] = []
+        # running hand of in-memory mode, not part of the hot restart state, it is loaded from DB again
+        self.hand: Optional[HandState] = None
+
+    def dump_state(self) -> dict:
+        """
+        Seats, players and active players of the table for hot restart
+        :return:
+        """
+        return {
+            "table_key": self.table_key,
+            "seats": list(self._seats),
+            "players": [player.user_info() for player in self._players.values()],
+            "active_players": [player.id for player in self.active_players],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "GameTable":
+        table = cls(state["table_key"])
+        table._seats = list(state["seats"])
+        table._players = {info["id"]: Player.from_info(info) for info in state["players"]}
+        table.active_players = [
+            table._players[player_id] for player_id in state["active_players"] if player_id in table._players
+        ]
+        return table
 
     def get_card_dealer(self):
         return self.card_dealer
@@ -0,0 +1,176 @@
+import itertools
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from treys.lookup import LookupTable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .cards import CARD_RANKS
+
+# prime of every rank in CARD_RANKS order, product of primes identifies a multiset of ranks
+RANK_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+# ranks are 1 (royal flush) .. 7462 (worst high card), lower is better
+WORST_RANK = LookupTable.MAX_HIGH_CARD
+NO_FLUSH = WORST_RANK + 1
+# the worst rank of every category, category is the index of the first max not below rank
+CATEGORY_MAX_RANKS = tuple(sorted(LookupTable.MAX_TO_RANK_CLASS))
+CATEGORY_NAMES = tuple(
+    LookupTable.RANK_CLASS_TO_STRING[LookupTable.MAX_TO_RANK_CLASS[max_rank]] for max_rank in CATEGORY_MAX_RANKS
+)
+
+
+class HandEvaluator:
+    """
+    Best 5 of 5-7 cards in treys ranks, for all hands of a showdown in one call.
+    Lookup tables are built once from the treys 5 card tables:
+    - flushes: best flush of every 13 bit mask of ranks of one suit
+    - other hands: best hand of every multiset of 5-7 ranks, keyed by product of rank primes
+      (7 ranks contain a straight or pair regardless of suits, flushes are looked up separately)
+    Hand rank is the lower of both, as in treys min over all 5 card subsets.
+    Cards are indexes 0..51 (cards.card_index), with NumPy all hands are evaluated as arrays
+    against the shared board, without it in a loop over the same tables
+    """
+
+    def __init__(self):
+        treys_tables = LookupTable()
+        self.flush_ranks: List[int] = self._build_flush_ranks(treys_tables.flush_lookup)
+        self.unsuited_ranks: Dict[int, int] = self._build_unsuited_ranks(treys_tables.unsuited_lookup)
+        if numpy is not None:
+            self.flush_array = numpy.array(self.flush_ranks, dtype=numpy.int16)
+            keys = sorted(self.unsuited_ranks)
+            self.unsuited_keys = numpy.array(keys, dtype=numpy.int64)
+            self.unsuited_values = numpy.array([self.unsuited_ranks[key] for key in keys], dtype=numpy.int16)
+            self.rank_primes = numpy.array(RANK_PRIMES, dtype=numpy.int64)
+            self.category_max_ranks = numpy.array(CATEGORY_MAX_RANKS, dtype=numpy.int16)
+
+    @staticmethod
+    def _build_flush_ranks(flush_lookup: Dict[int, int]) -> List[int]:
+        """
+        13 bit mask of ranks -> best flush rank, NO_FLUSH for masks with less than 5 ranks
+        :param flush_lookup: treys prime product of 5 ranks -> flush rank
+        :return:
+        """
+        ranks = [NO_FLUSH] * (1 << len(CARD_RANKS))
+        for count in range(5, len(CARD_RANKS) + 1):
+            for combination in itertools.combinations(range(len(CARD_RANKS)), count):
+                mask = 0
+                for rank in combination:
+                    mask |= 1 << rank
+                if count == 5:
+                    product = 1
+                    for rank in combination:
+                        product *= RANK_PRIMES[rank]
+                    ranks[mask] = flush_lookup[product]
+                else:
+                    ranks[mask] = min(ranks[mask & ~(1 << rank)] for rank in combination)
+        return ranks
+
+    @staticmethod
+    def _build_unsuited_ranks(unsuited_lookup: Dict[int, int]) -> Dict[int, int]:
+        """
+        Product of 5-7 rank primes -> best not flush rank, a bigger multiset is the best of its multisets
+        without one card
+        :param unsuited_lookup: treys prime product of 5 ranks -> rank
+        :return:
+        """
+        ranks = dict(unsuited_lookup)
+        previous = unsuited_lookup
+        for _ in range(2):
+            current = {}
+            for product, rank in previous.items():
+                for prime in RANK_PRIMES:
+                    # every rank is 4 times in the deck
+                    if product % (prime ** 4) == 0:
+                        continue
+                    bigger = product * prime
+                    if rank < current.get(bigger, NO_FLUSH):
+                        current[bigger] = rank
+            ranks.update(current)
+            previous = current
+        return ranks
+
+    def evaluate(self, board: Sequence[int], hands: Sequence[Sequence[int]]) -> Tuple[List[int], List[int]]:
+        """
+        :param board: card indexes on table, 3-5 cards
+        :param hands: card indexes of every hand
+        :return: rank and category index of every hand, see CATEGORY_NAMES
+        """
+        if not hands:
+            return [], []
+        if numpy is None:
+            return self._evaluate_loop(board, hands)
+        return self._evaluate_arrays(board, hands)
+
+    def _evaluate_arrays(self, board: Sequence[int], hands: Sequence[Sequence[int]]) -> Tuple[List[int], List[int]]:
+        board_product = 1
+        board_masks = [0, 0, 0, 0]
+        for card in board:
+            board_product *= RANK_PRIMES[card >> 2]
+            board_masks[card & 3] |= 1 << (card >> 2)
+
+        cards = numpy.array(hands, dtype=numpy.int64)
+        card_ranks = cards >> 2
+        card_suits = cards & 3
+        products = self.rank_primes[card_ranks].prod(axis=1) * board_product
+        ranks = self.unsuited_values[numpy.searchsorted(self.unsuited_keys, products)]
+
+        rank_bits = numpy.left_shift(1, card_ranks)
+        for suit, board_mask in enumerate(board_masks):
+            # hand cards are distinct, so sum of bits is their OR
+            masks = numpy.where(card_suits == suit, rank_bits, 0).sum(axis=1) | board_mask
+            numpy.minimum(ranks, self.flush_array[masks], out=ranks)
+
+        categories = numpy.searchsorted(self.category_max_ranks, ranks)
+        return ranks.tolist(), categories.tolist()
+
+    def _evaluate_loop(self, board: Sequence[int], hands: Sequence[Sequence[int]]) -> Tuple[List[int], List[int]]:
+        board_product = 1
+        board_masks = [0, 0, 0, 0]
+        for card in board:
+            board_product *= RANK_PRIMES[card >> 2]
+            board_masks[card & 3] |= 1 << (card >> 2)
+
+        ranks = []
+        categories = []
+        for hand in hands:
+            product = board_product
+            masks = list(board_masks)
+            for card in hand:
+                product *= RANK_PRIMES[card >> 2]
+                masks[card & 3] |= 1 << (card >> 2)
+            rank = min(self.unsuited_ranks[product], min(self.flush_ranks[mask] for mask in masks))
+            ranks.append(rank)
+            categories.append(self.category(rank))
+        return ranks, categories
+
+    @staticmethod
+    def category(rank: int) -> int:
+        for category, max_rank in enumerate(CATEGORY_MAX_RANKS):
+            if rank <= max_rank:
+                return category
+        raise ValueError(f"Invalid hand rank: {rank}")
+
+    @staticmethod
+    def category_name(category: int) -> str:
+        return CATEGORY_NAMES[category]
+
+
+_evaluator: Optional[HandEvaluator] = None
+_evaluator_lock = threading.Lock()
+
+
+def get_hand_evaluator() -> HandEvaluator:
+    """
+    Evaluator of the process, tables are built on the first showdown
+    :return:
+    """
+    global _evaluator
+    if _evaluator is None:
+        with _evaluator_lock:
+            if _evaluator is None:
+                _evaluator = HandEvaluator()
+    return _evaluator
@@ -0,0 +1,249 @@
+import contextlib
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.db.models import Sum
+
+from poker_game.models import Round, PlayerGame, PlayerTurn, Bet, UserRole, UserTransaction
+from ..textchoices import TransactionTypeChoice, PlayerTurnChoice
+from .unit_of_work import GameUnitOfWork
+
+
+class SeatState:
+    """
+    Player of the running hand
+    """
+    __slots__ = ('user_id', 'seat_index', 'is_fold', 'round_bet', 'all_in', 'has_role')
+
+    def __init__(self, user_id: int, seat_index: int, is_fold: bool, round_bet: int, all_in: bool, has_role: bool):
+        self.user_id = user_id
+        self.seat_index = seat_index
+        self.is_fold = is_fold
+        # sum of bets in the current round
+        self.round_bet = round_bet
+        self.all_in = all_in
+        self.has_role = has_role
+
+
+class HandState:
+    """
+    Live round of a table: seats, bets of the round, turn and highest bet.
+    Loaded from DB once per round, then actions are validated and applied in memory
+    with the same rules as the DB driven path, rows are written by HandWriteBehind.
+    `round` is the Round instance of the hand, its turn and bet fields are kept current.
+    Stacks and board are not kept: actions do not read them, table status reads them from DB
+    """
+
+    def __init__(self, table_key: str, round_model: Round, seats: List[SeatState], last_bet_amount: Optional[int]):
+        self.table_key = table_key
+        self.round = round_model
+        # seat_index -> seat, ordered by seat index
+        self.seats: Dict[int, SeatState] = {seat.seat_index: seat for seat in sorted(seats, key=lambda s: s.seat_index)}
+        self.users: Dict[int, SeatState] = {seat.user_id: seat for seat in seats}
+        self.last_bet_amount = last_bet_amount
+
+    @classmethod
+    def load(cls, round_model: Round) -> "HandState":
+        """
+        :param round_model: Round with game and table
+        :return:
+        """
+        game_id = round_model.game_id
+        round_bets = dict(
+            Bet.objects.filter(round_id=round_model.id).values('user_id').annotate(
+                total=Sum('amount')
+            ).values_list('user_id', 'total')
+        )
+        last_bet_amount = Bet.objects.filter(round_id=round_model.id).order_by('-id').values_list(
+            'amount', flat=True
+        ).first()
+        all_in = set(PlayerTurn.objects.filter(
+            game_id=game_id,
+            action_choice=PlayerTurnChoice.ALL_IN
+        ).values_list('user_id', flat=True))
+        with_role = set(UserRole.objects.filter(game_id=game_id).values_list('user_id', flat=True))
+        seats = [
+            SeatState(
+                user_id=user_id,
+                seat_index=seat_index,
+                is_fold=is_fold,
+                round_bet=round_bets.get(user_id) or 0,
+                all_in=user_id in all_in,
+                has_role=user_id in with_role
+            )
+            for user_id, seat_index, is_fold in PlayerGame.objects.filter(game_id=game_id).values_list(
+                'user_id', 'seat_index', 'is_fold'
+            )
+        ]
+        return cls(
+            table_key=round_model.game.table.key,
+            round_model=round_model,
+            seats=seats,
+            last_bet_amount=last_bet_amount
+        )
+
+    @property
+    def current_seat(self) -> Optional[SeatState]:
+        return self.seats.get(self.round.turn_index)
+
+    @property
+    def active_players_count(self) -> int:
+        return sum(1 for seat in self.seats.values() if not seat.is_fold)
+
+    def highest_total_bet(self) -> int:
+        return max((seat.round_bet for seat in self.seats.values()), default=0)
+
+    def min_bet_amount(self) -> int:
+        seat = self.current_seat
+        if not seat:
+            return 0
+        return self.round.highest_bet - seat.round_bet
+
+    def can_bet(self, seat: SeatState) -> bool:
+        return seat.has_role and not seat.all_in and seat.seat_index == self.round.turn_index
+
+    def can_check(self, seat: SeatState) -> bool:
+        if not seat.has_role or seat.seat_index != self.round.turn_index or seat.all_in:
+            return False
+        return self.round.highest_bet == seat.round_bet
+
+    def bet_type(self, amount: int) -> str:
+        """
+        PokerGame._get_bet_type by the last bet of the round
+        :param amount:
+        :return:
+        """
+        if self.last_bet_amount is None:
+            return PlayerTurnChoice.BET
+        if amount == self.last_bet_amount:
+            return PlayerTurnChoice.CALL
+        if amount > self.last_bet_amount:
+            return PlayerTurnChoice.RISE
+        return PlayerTurnChoice.BET
+
+    def next_player_index(self) -> Tuple[bool, Optional[int]]:
+        """
+        Next not folded seat after the current one
+        :return: next seat is behind the wrap around, next seat index or None
+        """
+        current_seat = self.round.turn_index
+        not_folded = [seat.seat_index for seat in self.seats.values() if not seat.is_fold]
+        if not not_folded:
+            return False, None
+        for seat_index in not_folded:
+            if seat_index > current_seat:
+                return False, seat_index
+        return True, not_folded[0]
+
+    def bidding_closed(self, in_main: bool = False) -> Tuple[bool, bool]:
+        """
+        Round.bidding_closed on memory state
+        :param in_main:
+        :return: bidding is closed, round fields changed
+        """
+        if in_main and self.round.highest_bet_at_this_round:
+            self.round.highest_bet_at_this_round = False
+            return False, True
+        return self.round.turn_index == self.round.highest_bet_seat_index, False
+
+
+class WriteBehindState(threading.local):
+    def __init__(self):
+        # rows and updates of actions in order
+        self.unit_of_work = GameUnitOfWork()
+        # table keys of hands changed in the running context
+        self.touched: List[str] = []
+        self.depth = 0
+
+
+class HandWriteBehind:
+    """
+    Writes of in-memory hands of the table actor thread.
+    Rows and updates are collected during the table command into one GameUnitOfWork and written at its end:
+    one bulk INSERT per model and one UPDATE per round, or earlier when DB state of the hand is read.
+    Failed command discards its writes and drops its hands from memory, they are loaded again from DB
+    """
+    ROUND_FIELDS = ('order', 'turn_index', 'highest_bet', 'highest_bet_at_this_round', 'highest_bet_seat_index')
+
+    def __init__(self, invalidate: Callable[[str], None]):
+        """
+        :param invalidate: drop hand of the table from memory
+        """
+        self.invalidate = invalidate
+        self.state = WriteBehindState()
+
+    @contextlib.contextmanager
+    def context(self):
+        """
+        Table command: writes are flushed on success, discarded with hands on error
+        :return:
+        """
+        state = self.state
+        mark = len(state.touched)
+        state.depth += 1
+        try:
+            yield
+            self.flush()
+        except BaseException:
+            self.discard()
+            for table_key in set(state.touched[mark:]):
+                self.invalidate(table_key)
+            raise
+        finally:
+            state.depth -= 1
+            if not state.depth:
+                state.touched.clear()
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.state.unit_of_work)
+
+    def register_bet(self, hand: HandState, user_id: int, amount: int, action_choice: str):
+        round_model = hand.round
+        self.add(hand, UserTransaction(user_id=user_id, amount=-amount, type=TransactionTypeChoice.BET))
+        self.turn(hand, user_id, action_choice)
+        self.add(hand, Bet(game_id=round_model.game_id, user_id=user_id, amount=amount, round_id=round_model.id))
+
+    def turn(self, hand: HandState, user_id: int, action_choice: str):
+        round_model = hand.round
+        self.add(hand, PlayerTurn(
+            user_id=user_id,
+            game_id=round_model.game_id,
+            round_id=round_model.id,
+            action_choice=action_choice
+        ))
+
+    def add(self, hand: HandState, row):
+        self.state.unit_of_work.add(row)
+        self.state.touched.append(hand.table_key)
+
+    def update_round(self, hand: HandState):
+        round_model = hand.round
+        self.state.unit_of_work.update(
+            Round,
+            round_model.pk,
+            **{field: getattr(round_model, field) for field in self.ROUND_FIELDS}
+        )
+        self.state.touched.append(hand.table_key)
+
+    def fold(self, hand: HandState, user_id: int):
+        self.state.unit_of_work.update_where(
+            PlayerGame,
+            {'game_id': hand.round.game_id, 'user_id': user_id},
+            is_fold=True
+        )
+        self.state.touched.append(hand.table_key)
+
+    def flush_if_idle(self):
+        """
+        Action outside of table command is written at once
+        :return:
+        """
+        if not self.state.depth:
+            self.flush()
+
+    def flush(self):
+        self.state.unit_of_work.flush()
+
+    def discard(self):
+        self.state.unit_of_work.clear()
@@ -35,6 +35,15 @@ class Player:
             "seat_index": self._seat_index
         }
 
+    @classmethod
+    def from_info(cls, info: dict) -> "Player":
+        """
+        Player from user_info() snapshot
+        :param info:
+        :return:
+        """
+        return cls(user_id=info["id"], name=info["name"], cash=info["cash"], seat_index=info["seat_index"])
+
     def take_cash(self, cash: int):
         if cash > self._cash:
             raise ValueError("Player does not have enough money")
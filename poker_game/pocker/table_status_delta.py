@@ -0,0 +1,136 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# players list is diffed by player id, other lists are replaced as a whole
+PLAYERS_KEY = 'g_pl'
+PLAYER_ID_KEY = 'u_id'
+REMOVED_PLAYERS_KEY = 'g_pl_r'
+
+
+def players_delta(old: List[dict], new: List[dict]) -> Tuple[List[dict], List[int]]:
+    """
+    Changed players with changed fields only, new players as a whole, removed player ids
+    :param old:
+    :param new:
+    :return: changed, removed
+    """
+    old_players = {player[PLAYER_ID_KEY]: player for player in old or []}
+    changed = []
+    for player in new or []:
+        player_id = player[PLAYER_ID_KEY]
+        old_player = old_players.pop(player_id, None)
+        if old_player is None:
+            changed.append(player)
+            continue
+        fields = {key: value for key, value in player.items() if old_player.get(key) != value}
+        if fields:
+            changed.append({PLAYER_ID_KEY: player_id, **fields})
+    return changed, list(old_players)
+
+
+def table_status_delta(old: dict, new: dict) -> dict:
+    """
+    Only changed fields of table status payload.
+    Nested dicts (g_r, g_lt) are diffed by keys, players by player id
+    :param old:
+    :param new:
+    :return:
+    """
+    delta = {}
+    for key, value in new.items():
+        old_value = old.get(key)
+        if old_value == value:
+            continue
+        if key == PLAYERS_KEY:
+            changed, removed = players_delta(old_value, value)
+            if changed:
+                delta[PLAYERS_KEY] = changed
+            if removed:
+                delta[REMOVED_PLAYERS_KEY] = removed
+        elif isinstance(value, dict) and isinstance(old_value, dict) and value.keys() == old_value.keys():
+            delta[key] = {k: v for k, v in value.items() if old_value.get(k) != v}
+        else:
+            delta[key] = value
+    return delta
+
+
+class TableState:
+    __slots__ = ('version', 'payload', 'private_cards')
+
+    def __init__(self, version: int, payload: dict, private_cards: Dict[int, List[str]]):
+        self.version = version
+        self.payload = payload
+        self.private_cards = private_cards
+
+
+class TableStateVersions:
+    """
+    Monotonically increasing state version per table and last shared payload
+    """
+
+    def __init__(self):
+        self.states: Dict[str, TableState] = {}
+        self.lock = threading.Lock()
+
+    def version(self, table_key: str) -> int:
+        state = self.states.get(table_key)
+        return state.version if state else 0
+
+    def update(self, table_key: str, payload: dict, private_cards: Dict[int, List[str]]) -> Tuple[int, Optional[dict]]:
+        """
+        Register new table payload
+        :param table_key:
+        :param payload: shared table status payload
+        :param private_cards: hand cards of players, new deal means snapshot for everyone
+        :return: version, delta from previous version (None if only snapshot is possible, empty if nothing changed)
+        """
+        with self.lock:
+            state = self.states.get(table_key)
+            if state is None:
+                self.states[table_key] = TableState(version=1, payload=payload, private_cards=private_cards)
+                return 1, None
+            if state.private_cards != private_cards:
+                delta = None
+            else:
+                delta = table_status_delta(state.payload, payload)
+                if not delta:
+                    return state.version, delta
+            state.version += 1
+            state.payload = payload
+            state.private_cards = private_cards
+            return state.version, delta
+
+    def versions(self) -> Dict[str, int]:
+        with self.lock:
+            return {table_key: state.version for table_key, state in self.states.items()}
+
+    def restore(self, versions: Dict[str, int]):
+        """
+        Continue versions of previous process, the first payload of every table is sent as snapshot
+        :param versions: table_key -> version
+        :return:
+        """
+        with self.lock:
+            for table_key, version in versions.items():
+                self.states[table_key] = TableState(version=version, payload={}, private_cards=None)
+
+    def reset_base(self, table_key: str, version: Optional[int] = None):
+        """
+        Table status was changed by another broker node: the next payload is a snapshot
+        with version above the version of that node
+        :param table_key:
+        :param version: version of another node
+        :return:
+        """
+        with self.lock:
+            state = self.states.get(table_key)
+            current = state.version if state else 0
+            self.states[table_key] = TableState(
+                version=max(current, version or 0),
+                payload={},
+                private_cards=None
+            )
+
+    def remove(self, table_key: str):
+        with self.lock:
+            self.states.pop(table_key, None)
@@ -0,0 +1,65 @@
+from typing import Dict, List, Tuple
+
+from django.db import transaction
+
+
+class GameUnitOfWork:
+    """
+    Rows and updates produced by one game transition, written together in one atomic block:
+    one bulk INSERT per model with rows in the order they were added, then updates.
+    Rows get their primary keys on flush
+    """
+
+    def __init__(self):
+        # model -> not saved rows
+        self.rows: Dict[type, list] = {}
+        # (model, pk) -> changed fields, the last value of a field wins
+        self.updates: Dict[Tuple[type, int], dict] = {}
+        # (model, filters, fields) for updates of many rows, in order
+        self.filtered_updates: List[Tuple[type, dict, dict]] = []
+
+    def __bool__(self):
+        return bool(self.rows or self.updates or self.filtered_updates)
+
+    def add(self, row):
+        """
+        :param row: not saved model instance
+        :return: the same row
+        """
+        self.rows.setdefault(type(row), []).append(row)
+        return row
+
+    def update(self, model: type, pk: int, **fields):
+        """
+        Changed fields of one row, many updates of the row are written as one
+        :param model:
+        :param pk:
+        :param fields:
+        :return:
+        """
+        self.updates.setdefault((model, pk), {}).update(fields)
+
+    def update_where(self, model: type, filters: dict, **fields):
+        self.filtered_updates.append((model, filters, fields))
+
+    def flush(self):
+        """
+        Write collected rows and updates, unit of work can be used again after it
+        :return:
+        """
+        if not self:
+            return
+        rows, updates, filtered_updates = self.rows, self.updates, self.filtered_updates
+        self.clear()
+        with transaction.atomic():
+            for model, model_rows in rows.items():
+                model.objects.bulk_create(model_rows)
+            for (model, pk), fields in updates.items():
+                model.objects.filter(pk=pk).update(**fields)
+            for model, filters, fields in filtered_updates:
+                model.objects.filter(**filters).update(**fields)
+
+    def clear(self):
+        self.rows = {}
+        self.updates = {}
+        self.filtered_updates = []
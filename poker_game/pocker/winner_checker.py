@@ -1,35 +1,38 @@
-from treys import Evaluator, Card
+from .cards import card_index
+from .hand_evaluator import get_hand_evaluator
+
 
 def cards_parser(cards: dict):
+    """
+    Cards in treys string format, input is not changed
+    :param cards: owner -> [[suit, value], ...]
+    :return: owner -> ['Ah', 'Ts', ...]
+    """
     new_dict = {}
-    for key in cards.keys():
-        new_dict[key] = []
     for owner, card in cards.items():
-        for values in card:
-            if values[1] == 10:
-                values[1] = 'T'
-            new_card = f'{values[1]}{values[0].lower()}'
-            new_dict[owner].append(new_card)
+        new_dict[owner] = [f"{'T' if values[1] == 10 else values[1]}{values[0].lower()}" for values in card]
     return new_dict
 
 
 def check_the_winner(cards: dict):
-    evaluator = Evaluator()
-    print(cards, "Cards dict")
-    cards = cards_parser(cards)
-    table_cards = [Card.new(card) for card in cards.get('table')]
-
-    cards_list = []
-    for owner, cards in cards.items():
+    """
+    All hands of the showdown are evaluated in one call of the process hand evaluator
+    :param cards: owner -> [[suit, value], ...], 'table' -> board cards
+    :return: [owner, rank, rank class] of every hand with the best rank
+    """
+    evaluator = get_hand_evaluator()
+    table_cards = [card_index(card) for card in cards.get('table')]
+    owners = []
+    hands = []
+    for owner, hand in cards.items():
         if owner != 'table':
-            cards_list.append([int(owner), [Card().new(card) for card in cards]])
-    evaluates = []
-
-    for user_cards in cards_list:
-        ev = evaluator.evaluate(user_cards[1], table_cards)
-        cls = evaluator.get_rank_class(ev)
-        cls_str = evaluator.class_to_string(cls)
-        print(f'cls_str: {cls_str}')
-        evaluates.append([user_cards[0], ev, cls_str])
+            owners.append(int(owner))
+            hands.append([card_index(card) for card in hand])
+    ranks, categories = evaluator.evaluate(table_cards, hands)
 
-    return [i for i in evaluates if i[1] == min([evaluate[1] for evaluate in evaluates])]
\ No newline at end of file
+    best = min(ranks, default=None)
+    return [
+        [owner, rank, evaluator.category_name(category)]
+        for owner, rank, category in zip(owners, ranks, categories)
+        if rank == best
+    ]
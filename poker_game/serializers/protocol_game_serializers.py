@@ -10,6 +10,11 @@ from poker_game.textchoices import RoundTypeChoice
 
 
 
+# Shared table status is rendered once with this placeholder instead of hidden hand cards,
+# every recipient gets his own cards spliced in (see GameMessagesProtocol.table_status_broadcast)
+PRIVATE_CARDS_PLACEHOLDER = '@@u_h:{}@@'
+
+
 def format_cards_response(data: List[List]):
     return ["".join(map(str, item)) for item in data]
 
@@ -143,9 +148,13 @@ class PlayerGameSerializer(BaseGameSerializer):
         """
         cards = self.round_model.cards if self.round_model else None
         user = self.get_user()
-        if not model.is_fold and (user.id == model.user_id or (self.round_model and self.round_model.game and self.round_model.game.winners is not None)):
-            user_cards = cards.get(str(model.user_id)) if self.round_model and user else None
+        if model.is_fold:
+            return None
+        if (user and user.id == model.user_id) or (self.round_model and self.round_model.game and self.round_model.game.winners is not None):
+            user_cards = cards.get(str(model.user_id)) if self.round_model and cards else None
             return format_cards_response(user_cards) if user_cards else None
+        if self.context.get("private_cards_placeholder") and cards and cards.get(str(model.user_id)):
+            return PRIVATE_CARDS_PLACEHOLDER.format(model.user_id)
         return None
 
     def get_u_p(self, model, *args, **kwargs):
@@ -9,6 +9,13 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
 
 from settings import TCP_HOST, TCP_PORT
 
+# threaded: one OS thread per socket (default), asyncio: event loop with stream readers/writers,
+# sharded: pre-forked worker processes, every worker owns tables by hash of table_key
+TCP_SERVER_MODE = os.environ.get("TCP_SERVER_MODE", "threaded")
+# worker processes of sharded mode, cpu count by default
+TCP_SERVER_WORKERS = int(os.environ.get("TCP_SERVER_WORKERS", 0)) or None
+
+
 class ThreadedTCPRequestHandler(socketserver.BaseRequestHandler):
     def handle(self):
         data = self.request.recv(1024)
@@ -21,23 +28,63 @@ class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     pass
 
 
-if __name__ == "__main__":
-    import django
-    django.setup()
-    from tcp_server.tcp_broker import TCPBrokerConnections
-    from tcp_server.helpers.game_storage_helper import GameStorageHelper
-    server = ThreadedTCPServer((TCP_HOST, TCP_PORT), ThreadedTCPRequestHandler)
+def run_threaded_server():
+    from tcp_server.hot_restart import HotRestart, RESUME_FILE_ENV, read_snapshot
+
+    resume_file = os.environ.pop(RESUME_FILE_ENV, None)
+    snapshot = read_snapshot(resume_file) if resume_file else None
+    if snapshot:
+        # listening socket inherited from previous process, connections waited in its backlog
+        server = ThreadedTCPServer((TCP_HOST, TCP_PORT), ThreadedTCPRequestHandler, bind_and_activate=False)
+        server.socket.close()
+        server.socket = socket.socket(fileno=snapshot['listener'])
+        server.socket.set_inheritable(False)
+    else:
+        server = ThreadedTCPServer((TCP_HOST, TCP_PORT), ThreadedTCPRequestHandler)
+    # SIGUSR2: drain, snapshot and exec the new code without disconnecting players
+    hot_restart = HotRestart(server, TCPBrokerConnections, snapshot_file=resume_file)
+    hot_restart.install()
     with server:
-        GameStorageHelper.clear()
+        if snapshot:
+            hot_restart.resume(snapshot)
+        else:
+            GameStorageHelper.clear()
+        TCPBrokerConnections.game_handler.get_event_bus()
+        TCPBrokerConnections.game_handler.start_metrics_admin()
         ip, port = server.server_address
-        server_thread = threading.Thread(target=server.serve_forever)
-        server_thread.start()
-        print("Server loop running in thread:", server_thread.name)
-        print(f'IP: {ip}; port: {port}')
+        print(f'IP: {ip}; port: {port}; pid: {os.getpid()}')
         try:
+            # one accept loop, hot restart stops it before exec
             server.serve_forever()
         except KeyboardInterrupt:
-            server.server_close()
+            pass
+        hot_restart.join()
         server.server_close()
         print('\nThreadedTCPServer close')
 
+
+def run_asyncio_server():
+    from tcp_server.tcp_async_broker import run_async_server
+    GameStorageHelper.clear()
+    TCPBrokerConnections.game_handler.get_event_bus()
+    TCPBrokerConnections.game_handler.start_metrics_admin()
+    run_async_server(TCP_HOST, TCP_PORT)
+
+
+def run_sharded_server():
+    from tcp_server.tcp_sharded_broker import run_sharded_server as run_server
+    GameStorageHelper.clear()
+    run_server(TCP_HOST, TCP_PORT, workers=TCP_SERVER_WORKERS)
+
+
+if __name__ == "__main__":
+    import django
+    django.setup()
+    from tcp_server.tcp_broker import TCPBrokerConnections
+    from tcp_server.helpers.game_storage_helper import GameStorageHelper
+    if TCP_SERVER_MODE == "asyncio":
+        run_asyncio_server()
+    elif TCP_SERVER_MODE == "sharded":
+        run_sharded_server()
+    else:
+        run_threaded_server()
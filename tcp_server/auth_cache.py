@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tcp_server.logger import logger
+
+
+class TokenAuthCache:
+    """
+    Socket token -> user lookups for connection auth.
+    Known tokens are served from memory for TTL seconds,
+    unknown ones are looked up by one batched query for all auths which arrived in the same batch window,
+    the same token requested by many connections is looked up once.
+    When many lookups are pending (reconnect storm) new ones wait a random jitter before joining a batch,
+    so the database gets a few spread batches instead of a burst
+    """
+    TTL = 30.0
+    BATCH_WINDOW = 0.005
+    MAX_BATCH = 500
+    # pending lookups after which admission jitter is applied
+    STORM_THRESHOLD = 50
+    MAX_JITTER = 0.5
+    LOOKUP_TIMEOUT = 10.0
+
+    def __init__(
+            self,
+            load: Callable[[List[str]], Dict[str, Any]],
+            ttl: Optional[float] = None,
+            batch_window: Optional[float] = None,
+            max_batch: Optional[int] = None,
+            storm_threshold: Optional[int] = None,
+            max_jitter: Optional[float] = None
+    ):
+        """
+        :param load: tokens -> {token: user} for found users
+        :param ttl: seconds a found user is cached, 0 disables cache
+        :param batch_window: how long lookups are collected into one batch
+        :param max_batch:
+        :param storm_threshold:
+        :param max_jitter: seconds
+        """
+        self.load = load
+        self.ttl = self.TTL if ttl is None else ttl
+        self.batch_window = self.BATCH_WINDOW if batch_window is None else batch_window
+        self.max_batch = max_batch or self.MAX_BATCH
+        self.storm_threshold = self.STORM_THRESHOLD if storm_threshold is None else storm_threshold
+        self.max_jitter = self.MAX_JITTER if max_jitter is None else max_jitter
+        # token -> (user, expires at)
+        self.cache: Dict[str, Tuple[Any, float]] = {}
+        self.pending: Dict[str, Future] = {}
+        # invalidations are counted, batch loaded before an invalidation of its token or user is not cached
+        self.generation = 0
+        # token or user id -> generation of its last invalidation, kept while a batch is loaded
+        self.invalidated: Dict[Any, int] = {}
+        self.loading = False
+        self.lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.delayed = 0
+
+    def get(self, token: Optional[str]):
+        """
+        User by socket token, blocks while batch is loaded
+        :param token:
+        :return: user or None
+        """
+        if not token:
+            return None
+        cached = self.cache.get(token)
+        if cached is not None and cached[1] > time.monotonic():
+            self.hits += 1
+            return cached[0]
+        self.misses += 1
+        if len(self.pending) >= self.storm_threshold and self.max_jitter:
+            self.delayed += 1
+            time.sleep(random.uniform(0, self.max_jitter))
+        return self._lookup(token).result(timeout=self.LOOKUP_TIMEOUT)
+
+    def invalidate(self, token: Optional[str] = None, user_id: Optional[int] = None):
+        """
+        Drop cached token or all cached tokens of user
+        :param token:
+        :param user_id:
+        :return:
+        """
+        with self.lock:
+            self.generation += 1
+            if token is not None:
+                self.cache.pop(token, None)
+                if self.loading:
+                    self.invalidated[('token', token)] = self.generation
+            if user_id is not None:
+                for cached_token, (user, _) in list(self.cache.items()):
+                    if user.id == user_id:
+                        self.cache.pop(cached_token, None)
+                if self.loading:
+                    self.invalidated[('user', user_id)] = self.generation
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            'cached': len(self.cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'batches': self.batches,
+            'delayed': self.delayed,
+        }
+
+    def _lookup(self, token: str) -> Future:
+        with self.condition:
+            future = self.pending.get(token)
+            if future is None:
+                future = self.pending[token] = Future()
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self._run, name='auth-batch', daemon=True)
+                    self.thread.start()
+                self.condition.notify()
+            return future
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+            # collect lookups which arrive together
+            time.sleep(self.batch_window)
+            with self.condition:
+                tokens = list(self.pending)[:self.max_batch]
+                futures = {token: self.pending.pop(token) for token in tokens}
+            self._load_batch(futures)
+
+    def _load_batch(self, futures: Dict[str, Future]):
+        self.batches += 1
+        with self.lock:
+            self.loading = True
+            generation = self.generation
+        try:
+            users = self.load(list(futures))
+        except Exception as e:
+            logger.exception(f"Auth batch of {len(futures)} tokens failed: {e}")
+            with self.lock:
+                self.loading = False
+                self.invalidated.clear()
+            for future in futures.values():
+                future.set_exception(e)
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self.lock:
+            invalidated = self.invalidated
+            for token in futures:
+                user = users.get(token)
+                if user is None or not self.ttl:
+                    continue
+                # token or user was changed while the batch was loaded, the loaded user may be stale
+                if (
+                        invalidated.get(('token', token), 0) > generation
+                        or invalidated.get(('user', user.id), 0) > generation
+                ):
+                    continue
+                self.cache[token] = (user, expires_at)
+            self.loading = False
+            self.invalidated = {}
+        for token, future in futures.items():
+            future.set_result(users.get(token))
+        self._evict_expired()
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        if len(self.cache) < self.max_batch:
+            return
+        for token, (_, expires_at) in list(self.cache.items()):
+            if expires_at <= now:
+                self.cache.pop(token, None)
@@ -0,0 +1,349 @@
+import contextlib
+import json
+import socket
+import socketserver
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tcp_server.logger import logger
+
+PHASE_PARSE = 'parse'
+PHASE_ENGINE = 'engine'
+PHASE_DB = 'db'
+PHASE_SERIALIZE = 'serialize'
+PHASE_SEND = 'send'
+PHASE_TOTAL = 'total'
+PHASES = (PHASE_PARSE, PHASE_ENGINE, PHASE_DB, PHASE_SERIALIZE, PHASE_SEND, PHASE_TOTAL)
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of microseconds: exact below 32 us,
+    above that 16 buckets per power of two, so any value is stored with error below 6%.
+    Recording is one bit_length() and one list increment, memory is fixed
+    """
+    SUB_BUCKET_BITS = 5
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+    # up to 2^40 us
+    BUCKETS = SUB_BUCKETS + (40 - SUB_BUCKET_BITS) * HALF_SUB_BUCKETS
+
+    def __init__(self):
+        self.counts: List[int] = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def bucket_index(cls, value: int) -> int:
+        if value < cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        index = cls.SUB_BUCKETS + (shift - 1) * cls.HALF_SUB_BUCKETS + (value >> shift) - cls.HALF_SUB_BUCKETS
+        return min(index, cls.BUCKETS - 1)
+
+    @classmethod
+    def bucket_value(cls, index: int) -> int:
+        """
+        Middle of bucket range
+        :param index:
+        :return:
+        """
+        if index < cls.SUB_BUCKETS:
+            return index
+        shift = (index - cls.SUB_BUCKETS) // cls.HALF_SUB_BUCKETS + 1
+        sub_bucket = (index - cls.SUB_BUCKETS) % cls.HALF_SUB_BUCKETS + cls.HALF_SUB_BUCKETS
+        return (sub_bucket << shift) + (1 << (shift - 1))
+
+    def record(self, value: int):
+        """
+        :param value: microseconds
+        :return:
+        """
+        self.counts[self.bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, rank: float) -> int:
+        """
+        :param rank: 0..1
+        :return: microseconds
+        """
+        if not self.count:
+            return 0
+        target = max(1, int(self.count * rank + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count) if self.count else 0,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+
+class CommandSample:
+    """
+    Time of one command split by phases, every moment is charged to exactly one phase:
+    DB query inside serialization is DB time, not serialization time
+    """
+    __slots__ = ('command', 'phase', 'switched_at', 'started_at', 'durations', 'queries')
+
+    def __init__(self):
+        self.command: Optional[str] = None
+        self.phase = PHASE_ENGINE
+        self.started_at = self.switched_at = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.queries = 0
+
+    def switch(self, phase: str) -> str:
+        """
+        Charge time since last switch to the current phase and start new phase
+        :param phase:
+        :return: previous phase
+        """
+        now = time.perf_counter()
+        previous = self.phase
+        self.durations[previous] = self.durations.get(previous, 0.0) + now - self.switched_at
+        self.switched_at = now
+        self.phase = phase
+        return previous
+
+
+class CommandMetrics:
+    """
+    Latency histograms per command and phase:
+    parse (framing and routing), engine (game logic), db (ORM queries), serialize (table status), send (queueing),
+    total (from the start of the command in table actor)
+    """
+
+    def __init__(self, execute_wrapper: Optional[Callable] = None):
+        """
+        :param execute_wrapper: `django.db.connection.execute_wrapper` to time queries of command thread
+        """
+        self.execute_wrapper = execute_wrapper
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.queries: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started_at = time.time()
+
+    @property
+    def current(self) -> Optional[CommandSample]:
+        return getattr(self.local, 'sample', None)
+
+    @contextlib.contextmanager
+    def sample(self, command: Optional[str] = None):
+        """
+        Measure command run in current thread, nested samples are part of the outer one.
+        Sample without command name is not recorded
+        :param command:
+        :return:
+        """
+        if self.current is not None:
+            if command:
+                self.current.command = command
+            yield self.current
+            return
+        sample = CommandSample()
+        sample.command = command
+        self.local.sample = sample
+        try:
+            if self.execute_wrapper is None:
+                yield sample
+            else:
+                with self.execute_wrapper(self._db_wrapper):
+                    yield sample
+        finally:
+            self.local.sample = None
+            sample.switch(PHASE_ENGINE)
+            if sample.command:
+                self._record_sample(sample)
+
+    @contextlib.contextmanager
+    def measure(self, name: str):
+        """
+        Separate sample for work outside of commands, part of the current command inside one
+        :param name:
+        :return:
+        """
+        if self.current is not None:
+            yield self.current
+            return
+        with self.sample(name) as sample:
+            yield sample
+
+    def label(self, command: str, method: Callable, *args):
+        """
+        Run table command under its name, used as actor method
+        :param command:
+        :param method:
+        :param args:
+        :return:
+        """
+        with self.sample(command):
+            return method(*args)
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        sample = self.current
+        if sample is None:
+            yield
+            return
+        previous = sample.switch(name)
+        try:
+            yield
+        finally:
+            sample.switch(previous)
+
+    def record(self, command: str, phase: str, seconds: float):
+        value = int(seconds * 1_000_000)
+        with self.lock:
+            histogram = self.histograms.get((command, phase))
+            if histogram is None:
+                histogram = self.histograms[(command, phase)] = LatencyHistogram()
+            histogram.record(value)
+
+    def snapshot(self) -> dict:
+        """
+        command -> phase -> count, mean, p50, p95, p99, max in microseconds; queries per command
+        :return:
+        """
+        with self.lock:
+            commands = {}
+            for (command, phase), histogram in sorted(self.histograms.items()):
+                commands.setdefault(command, {})[phase] = histogram.summary()
+            for command, queries in self.queries.items():
+                commands.setdefault(command, {})['queries'] = queries
+        return {'uptime': round(time.time() - self.started_at), 'commands': commands}
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.queries.clear()
+            self.started_at = time.time()
+
+    def format(self) -> str:
+        """
+        Human readable table of snapshot()
+        :return:
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"uptime: {snapshot['uptime']}s, times in us",
+            f"{'command':<24}{'phase':<11}{'count':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>10}",
+        ]
+        for command, phases in snapshot['commands'].items():
+            for phase in PHASES:
+                summary = phases.get(phase)
+                if not summary:
+                    continue
+                lines.append(
+                    f"{command:<24}{phase:<11}{summary['count']:>9}{summary['mean']:>9}{summary['p50']:>9}"
+                    f"{summary['p95']:>9}{summary['p99']:>9}{summary['max']:>10}"
+                )
+            if 'queries' in phases:
+                lines.append(f"{command:<24}{'queries':<11}{phases['queries']:>9}")
+        return '\n'.join(lines) + '\n'
+
+    def _record_sample(self, sample: CommandSample):
+        sample.durations[PHASE_TOTAL] = sample.switched_at - sample.started_at
+        with self.lock:
+            for phase, seconds in sample.durations.items():
+                histogram = self.histograms.get((sample.command, phase))
+                if histogram is None:
+                    histogram = self.histograms[(sample.command, phase)] = LatencyHistogram()
+                histogram.record(int(seconds * 1_000_000))
+            if sample.queries:
+                self.queries[sample.command] = self.queries.get(sample.command, 0) + sample.queries
+
+    def _db_wrapper(self, execute, sql, params, many, context):
+        sample = self.current
+        if sample is None:
+            return execute(sql, params, many, context)
+        sample.queries += 1
+        with self.phase(PHASE_DB):
+            return execute(sql, params, many, context)
+
+
+class MetricsAdminServer:
+    """
+    Local admin port: connect and get command metrics as text table.
+    First line `json` returns snapshot as JSON, `reset` clears histograms.
+    Stats of other components (scheduler) are added to both outputs
+    """
+
+    def __init__(
+            self,
+            metrics: CommandMetrics,
+            port: int,
+            host: str = '127.0.0.1',
+            stats: Optional[Dict[str, Callable[[], dict]]] = None
+    ):
+        """
+        :param metrics:
+        :param port:
+        :param host:
+        :param stats: component name -> current stats
+        """
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.stats = stats or {}
+        self.server: Optional[socketserver.TCPServer] = None
+
+    def snapshot(self) -> dict:
+        return {**self.metrics.snapshot(), 'stats': {name: stats() for name, stats in self.stats.items()}}
+
+    def format(self) -> str:
+        lines = [self.metrics.format()]
+        for name, stats in self.stats.items():
+            lines.append(f"{name}: " + ', '.join(
+                f"{key}: {round(value, 6) if isinstance(value, float) else value}" for key, value in stats().items()
+            ) + '\n')
+        return ''.join(lines)
+
+    def start(self):
+        admin = self
+        metrics = self.metrics
+
+        class Handler(socketserver.StreamRequestHandler):
+            timeout = 5
+
+            def handle(self):
+                try:
+                    request = self.rfile.readline(64).strip().decode('ascii', 'replace')
+                except (socket.timeout, OSError):
+                    request = ''
+                if request == 'json':
+                    data = json.dumps(admin.snapshot()).encode('utf-8') + b'\n'
+                elif request == 'reset':
+                    metrics.reset()
+                    data = b'ok\n'
+                else:
+                    data = admin.format().encode('utf-8')
+                self.wfile.write(data)
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self.server = Server((self.host, self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='metrics-admin', daemon=True).start()
+        logger.info(f"Metrics admin port: {self.host}:{self.port}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,122 @@
+import threading
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from tcp_server.tcp_broker import TCPGameConnection
+
+
+class ConnectionRegistry:
+    """
+    Connections indexes:
+    user_id -> connection, table_key -> connections, user_id -> table keys (reverse index for cleanup).
+    Lookup, join, leave and disconnect are O(1), table connections are returned as a copy,
+    so callers may iterate while other threads change the registry
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.by_user: Dict[int, "TCPGameConnection"] = {}
+        # dict is used as insertion ordered set: user_id -> connection
+        self.by_table: Dict[str, Dict[int, "TCPGameConnection"]] = {}
+        self.user_tables: Dict[int, Dict[str, None]] = {}
+
+    def __len__(self):
+        return len(self.by_user)
+
+    def add(self, connection: "TCPGameConnection"):
+        """
+        Register authenticated connection
+        :param connection:
+        :return:
+        """
+        with self.lock:
+            self.by_user[connection.user.id] = connection
+
+    def get(self, user_id: int) -> Optional["TCPGameConnection"]:
+        return self.by_user.get(user_id)
+
+    def remove(self, user_id: int, connection: Optional["TCPGameConnection"] = None) -> Optional["TCPGameConnection"]:
+        """
+        Remove user connection and all its table memberships
+        :param user_id:
+        :param connection: remove only if registered connection is this one
+        :return: removed connection
+        """
+        with self.lock:
+            registered = self.by_user.get(user_id)
+            if registered is None or (connection is not None and registered is not connection):
+                return None
+            del self.by_user[user_id]
+            self.remove_from_tables(user_id=user_id)
+            return registered
+
+    def join_table(self, connection: "TCPGameConnection", table_key: str):
+        """
+        Add connection to table
+        :param connection:
+        :param table_key:
+        :return:
+        """
+        user_id = connection.user.id
+        with self.lock:
+            self.by_table.setdefault(table_key, {})[user_id] = connection
+            self.user_tables.setdefault(user_id, {})[table_key] = None
+
+    def leave_table(self, user_id: int, table_key: str):
+        """
+        Remove user connection from table
+        :param user_id:
+        :param table_key:
+        :return:
+        """
+        with self.lock:
+            table = self.by_table.get(table_key)
+            if table is not None:
+                table.pop(user_id, None)
+                if not table:
+                    del self.by_table[table_key]
+            tables = self.user_tables.get(user_id)
+            if tables is not None:
+                tables.pop(table_key, None)
+                if not tables:
+                    del self.user_tables[user_id]
+
+    def remove_from_tables(self, user_id: int):
+        """
+        Remove user connection from all tables, cost depends only on tables of the user
+        :param user_id:
+        :return:
+        """
+        with self.lock:
+            for table_key in list(self.user_tables.get(user_id, ())):
+                self.leave_table(user_id=user_id, table_key=table_key)
+
+    def connections(self) -> List["TCPGameConnection"]:
+        with self.lock:
+            return list(self.by_user.values())
+
+    def table_connections(self, table_key: str) -> List["TCPGameConnection"]:
+        table = self.by_table.get(table_key)
+        if not table:
+            return []
+        with self.lock:
+            return list(table.values())
+
+    def table_connection(self, table_key: str, user_id: int) -> Optional["TCPGameConnection"]:
+        table = self.by_table.get(table_key)
+        return table.get(user_id) if table else None
+
+    def user_table_key(self, user_id: int) -> Optional[str]:
+        """
+        Last joined table of user
+        :param user_id:
+        :return:
+        """
+        tables = self.user_tables.get(user_id)
+        if not tables:
+            return None
+        with self.lock:
+            return next(reversed(tables), None) if tables else None
+
+    def table_keys(self) -> List[str]:
+        return list(self.by_table)
@@ -0,0 +1,134 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional
+
+from tcp_server.logger import logger
+
+
+class ScheduledJob:
+    __slots__ = ('run_at', 'sequence', 'method', 'args', 'name', 'cancelled')
+
+    def __init__(self, run_at: float, sequence: int, method: Callable, args: tuple, name: Optional[str] = None):
+        self.run_at = run_at
+        self.sequence = sequence
+        self.method = method
+        self.args = args
+        self.name = name or getattr(method, '__name__', str(method))
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Lazy cancel, job is skipped when it comes out of the heap
+        :return:
+        """
+        self.cancelled = True
+
+    def __lt__(self, other: "ScheduledJob"):
+        return (self.run_at, self.sequence) < (other.run_at, other.sequence)
+
+
+class GameScheduler:
+    """
+    Timer heap with one thread for deferred game jobs:
+    "start next hand on table X in 7 seconds", "broadcast status after leave".
+    Jobs must be short, table work is handed over to the table actor,
+    so I/O threads and table actors never sleep.
+    """
+
+    def __init__(self):
+        self.heap: List[ScheduledJob] = []
+        self.condition = threading.Condition()
+        self.counter = itertools.count()
+        self.thread: Optional[threading.Thread] = None
+        self.running = True
+        self.fired = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+        self.last_lateness = 0.0
+
+    def call_later(self, delay: float, method: Callable, *args, name: Optional[str] = None) -> ScheduledJob:
+        """
+        Schedule method call after delay seconds
+        :param delay:
+        :param method:
+        :param args:
+        :param name: job name for logs
+        :return:
+        """
+        job = ScheduledJob(
+            run_at=time.monotonic() + delay,
+            sequence=next(self.counter),
+            method=method,
+            args=args,
+            name=name
+        )
+        with self.condition:
+            self._ensure_thread()
+            heapq.heappush(self.heap, job)
+            if self.heap[0] is job:
+                self.condition.notify()
+        return job
+
+    @property
+    def pending_count(self) -> int:
+        with self.condition:
+            return sum(1 for job in self.heap if not job.cancelled)
+
+    def stats(self) -> dict:
+        """
+        Pending jobs and how late fired jobs were, in seconds
+        :return:
+        """
+        return {
+            'pending': self.pending_count,
+            'fired': self.fired,
+            'last_lateness': self.last_lateness,
+            'max_lateness': self.max_lateness,
+            'avg_lateness': self.total_lateness / self.fired if self.fired else 0.0,
+        }
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name='game-scheduler', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                job = self._next_due_job()
+                if job is None:
+                    return
+            lateness = time.monotonic() - job.run_at
+            self.fired += 1
+            self.last_lateness = lateness
+            self.total_lateness += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+            try:
+                job.method(*job.args)
+            except Exception as e:
+                logger.exception(f"Scheduled job {job.name} failed: {e}")
+
+    def _next_due_job(self) -> Optional[ScheduledJob]:
+        """
+        Wait under condition until first not cancelled job is due
+        :return: job or None when scheduler stopped
+        """
+        while self.running:
+            while self.heap and self.heap[0].cancelled:
+                heapq.heappop(self.heap)
+            if not self.heap:
+                self.condition.wait()
+                continue
+            timeout = self.heap[0].run_at - time.monotonic()
+            if timeout <= 0:
+                return heapq.heappop(self.heap)
+            self.condition.wait(timeout)
+        return None
@@ -0,0 +1,131 @@
+import socket
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from tcp_server.logger import logger
+
+PING_COMMAND = 'PI'
+PONG_COMMAND = 'PO'
+# connection option for application level ping/pong: `AU|token|nl,hb`
+HEARTBEAT_OPTION = 'hb'
+
+# TCP keepalive for connections without ping/pong, half-open socket fails recv() after about 90 seconds
+KEEPALIVE_IDLE = 60
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+
+
+def enable_keepalive(sock: Optional[socket.socket]):
+    """
+    Kernel level dead peer detection for legacy clients which do not answer PING
+    :param sock:
+    :return:
+    """
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+    except OSError as e:
+        logger.debug(f"Keepalive was not enabled: {e}")
+
+
+class HeartbeatSweeper:
+    """
+    One thread for all connections: every sweep interval it pings connections which were idle
+    for ping interval and expires connections which were idle for timeout.
+    Connections only keep `last_seen`/`last_ping` timestamps, so idle sockets cost nothing between sweeps
+    """
+    PING_INTERVAL = 15.0
+    TIMEOUT = 45.0
+    SWEEP_INTERVAL = 5.0
+
+    def __init__(
+            self,
+            ping_interval: Optional[float] = None,
+            timeout: Optional[float] = None,
+            sweep_interval: Optional[float] = None
+    ):
+        self.ping_interval = ping_interval or self.PING_INTERVAL
+        self.timeout = timeout or self.TIMEOUT
+        self.sweep_interval = sweep_interval or self.SWEEP_INTERVAL
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.pinged = 0
+        self.expired = 0
+        self.last_sweep_duration = 0.0
+
+    def start(
+            self,
+            connections: Callable[[], Iterable],
+            ping: Callable[[object], None],
+            expire: Callable[[List], None]
+    ):
+        """
+        Start sweeper thread once
+        :param connections: returns current connections
+        :param ping: send PING to connection
+        :param expire: disconnect stale connections, called once per sweep with all of them
+        :return:
+        """
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(
+                target=self._run,
+                args=(connections, ping, expire),
+                name='heartbeat-sweeper',
+                daemon=True
+            )
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def sweep(self, connections: Iterable, now: float) -> Tuple[List, List]:
+        """
+        :param connections:
+        :param now: monotonic time
+        :return: connections to ping, stale connections
+        """
+        to_ping = []
+        stale = []
+        for connection in connections:
+            if not connection.heartbeat:
+                continue
+            idle = now - connection.last_seen
+            if idle >= self.timeout:
+                stale.append(connection)
+            elif idle >= self.ping_interval and now - connection.last_ping >= self.ping_interval:
+                connection.last_ping = now
+                to_ping.append(connection)
+        return to_ping, stale
+
+    def stats(self) -> dict:
+        return {
+            'pinged': self.pinged,
+            'expired': self.expired,
+            'last_sweep_duration': self.last_sweep_duration,
+        }
+
+    def _run(self, connections: Callable[[], Iterable], ping: Callable, expire: Callable):
+        while not self.stop_event.wait(self.sweep_interval):
+            started = time.monotonic()
+            try:
+                to_ping, stale = self.sweep(connections(), now=started)
+                for connection in to_ping:
+                    ping(connection)
+                if stale:
+                    expire(stale)
+            except Exception as e:
+                logger.exception(f"Heartbeat sweep failed: {e}")
+                continue
+            self.pinged += len(to_ping)
+            self.expired += len(stale)
+            self.last_sweep_duration = time.monotonic() - started
@@ -0,0 +1,228 @@
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from typing import Callable, Optional
+
+from tcp_server.logger import logger
+
+# path of the snapshot file for the new process, set before exec
+RESUME_FILE_ENV = 'TCP_RESUME_FILE'
+SNAPSHOT_VERSION = 1
+
+
+class ReaderGate:
+    """
+    Stops connection readers between messages.
+    While gate is enabled reader waits for data in poll() together with the freeze pipe,
+    frozen reader parks after handled frames instead of recv(), so not read bytes stay in the kernel buffer
+    and the socket can be passed to the next process
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.frozen = False
+        self.wakeup_read: Optional[int] = None
+        self.wakeup_write: Optional[int] = None
+        self.parked = 0
+        self.lock = threading.Lock()
+
+    def enable(self):
+        with self.lock:
+            if self.enabled:
+                return
+            self.wakeup_read, self.wakeup_write = os.pipe()
+            self.enabled = True
+
+    def wait_readable(self, sock: socket.socket) -> bool:
+        """
+        Block until socket has data or is closed
+        :param sock:
+        :return: False if reader has to park
+        """
+        if not self.enabled:
+            return True
+        if self.frozen:
+            return False
+        poller = select.poll()
+        poller.register(sock, select.POLLIN | select.POLLPRI)
+        poller.register(self.wakeup_read, select.POLLIN)
+        poller.poll()
+        return not self.frozen
+
+    def park(self, game_connection):
+        """
+        Block the reader thread until exec
+        :param game_connection: marked as parked, its socket can be passed to the next process
+        :return:
+        """
+        with self.lock:
+            if game_connection is not None:
+                game_connection.parked = True
+            self.parked += 1
+        threading.Event().wait()
+
+    def freeze(self):
+        """
+        Park every reader: pipe stays readable, so all waiting readers wake up
+        :return:
+        """
+        self.frozen = True
+        if self.wakeup_write is not None:
+            os.write(self.wakeup_write, b'\0')
+
+
+def write_snapshot(path: str, state: dict):
+    """
+    Compressed JSON snapshot, written atomically
+    :param path:
+    :param state:
+    :return:
+    """
+    data = zlib.compress(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tcp-resume-')
+    with os.fdopen(fd, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Optional[dict]:
+    try:
+        with open(path, 'rb') as file:
+            state = json.loads(zlib.decompress(file.read()))
+    except (OSError, ValueError, zlib.error) as e:
+        logger.exception(f"Resume snapshot was not read: {e}")
+        return None
+    if state.get('v') != SNAPSHOT_VERSION:
+        logger.info(f"Resume snapshot version is not supported: {state.get('v')}")
+        return None
+    return state
+
+
+class HotRestart:
+    """
+    Threaded server mode deploy without disconnecting players:
+    1. drain - new joins are rejected and new hands are not started, running hands are finished
+    2. accept loop is stopped, new connections wait in the listen backlog
+    3. readers are parked between messages, running table commands and queued messages are finished
+    4. tables, table versions and connections are written to the snapshot file
+    5. process is replaced by exec, listening and client sockets are inherited by the new one,
+       which restores the snapshot instead of clearing the game storage
+    Hands are stored in DB, so hands which did not finish before DRAIN_TIMEOUT continue in the new process
+    """
+    DRAIN_TIMEOUT = float(os.environ.get("HOT_RESTART_DRAIN_TIMEOUT", 120))
+    FREEZE_TIMEOUT = 5.0
+    POLL_INTERVAL = 0.05
+    SNAPSHOT_FILE = os.environ.get("HOT_RESTART_FILE", '/tmp/poker-tcp-resume.snapshot')
+
+    def __init__(self, server, broker, snapshot_file: Optional[str] = None):
+        """
+        :param server: socketserver.TCPServer of threaded mode
+        :param broker: TCPBrokerConnections
+        :param snapshot_file:
+        """
+        self.server = server
+        self.broker = broker
+        self.snapshot_file = snapshot_file or self.SNAPSHOT_FILE
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    def install(self, signum: int = signal.SIGUSR2):
+        """
+        Restart on signal, readers start to wait for data in poll()
+        :param signum:
+        :return:
+        """
+        self.broker.reader_gate.enable()
+        signal.signal(signum, lambda *args: self.start())
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name='hot-restart', daemon=True)
+            self.thread.start()
+
+    def join(self):
+        """
+        Wait for restart in progress, it ends with exec
+        :return:
+        """
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        handler = self.broker.game_handler
+        started = time.monotonic()
+        logger.info("Hot restart: draining")
+        handler.draining = True
+        if not self._wait(handler.is_idle, self.DRAIN_TIMEOUT):
+            logger.info("Hot restart: drain timeout, running hands continue in the new process")
+
+        self.server.shutdown()
+        self.broker.reader_gate.freeze()
+        self._wait(self._readers_parked, self.FREEZE_TIMEOUT)
+        self._wait(handler.table_actors.is_idle, self.FREEZE_TIMEOUT)
+        self._wait(self._outbound_flushed, self.FREEZE_TIMEOUT)
+
+        listener = self.server.socket
+        state = {
+            'v': SNAPSHOT_VERSION,
+            'listener': listener.fileno(),
+            **handler.dump_state(),
+            'connections': self.broker.dump_connections(),
+        }
+        listener.set_inheritable(True)
+        for connection in state['connections']:
+            os.set_inheritable(connection['fd'], True)
+        write_snapshot(self.snapshot_file, state)
+        logger.info(f"Hot restart: {len(state['tables'])} tables, {len(state['connections'])} connections, "
+                    f"drained in {time.monotonic() - started:.1f}s")
+        os.environ[RESUME_FILE_ENV] = self.snapshot_file
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    def resume(self, state: dict):
+        """
+        Continue snapshot of previous process
+        :param state:
+        :return:
+        """
+        self.broker.game_handler.restore_state(state)
+        self.broker.resume_connections(state['connections'])
+        self.broker.game_handler.resume_tables()
+        try:
+            os.unlink(self.snapshot_file)
+        except FileNotFoundError:
+            pass
+        logger.info(f"Resumed {len(state['tables'])} tables, {len(state['connections'])} connections")
+
+    def _readers_parked(self) -> bool:
+        return all(
+            connection.parked
+            for connection in self.broker.game_handler.registry.connections()
+        )
+
+    def _outbound_flushed(self) -> bool:
+        return all(
+            connection.outbound is None or connection.outbound.is_flushed
+            for connection in self.broker.game_handler.registry.connections()
+        )
+
+    def _wait(self, condition: Callable[[], bool], timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(self.POLL_INTERVAL)
+        return True
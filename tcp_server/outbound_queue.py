@@ -0,0 +1,239 @@
+import selectors
+import socket
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from tcp_server.logger import logger
+
+# what to do with a client which does not read fast enough
+OVERFLOW_SNAPSHOT = 'snapshot'
+OVERFLOW_DISCONNECT = 'disconnect'
+
+
+class OutboundQueue:
+    """
+    Bounded outbound buffer of one connection.
+    Table actors only append encoded messages, the writer drains the queue on its own,
+    so a slow or stalled socket never blocks a table broadcast.
+    """
+    MAX_BYTES = 256 * 1024
+    # small messages are joined into one write up to this size
+    COALESCE_BYTES = 64 * 1024
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes or self.MAX_BYTES
+        self.messages: Deque[bytes] = deque()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.closed = False
+        self.overflows = 0
+        # taken buffer is not completely written yet
+        self.in_flight = False
+        # called by producer when queue becomes not empty or is closed
+        self.notify: Optional[Callable[["OutboundQueue"], None]] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self.messages)
+
+    @property
+    def is_flushed(self) -> bool:
+        with self.lock:
+            return not self.messages and not self.in_flight
+
+    def put(self, data: bytes) -> bool:
+        """
+        Append message without blocking
+        :param data: encoded message
+        :return: False if queue is full, message is not added
+        """
+        with self.lock:
+            if self.closed:
+                return True
+            if self.messages and self.size + len(data) > self.max_bytes:
+                self.overflows += 1
+                return False
+            was_empty = not self.messages
+            self.messages.append(data)
+            self.size += len(data)
+        if was_empty and self.notify:
+            self.notify(self)
+        return True
+
+    def take(self) -> bytes:
+        """
+        Pop queued messages coalesced into one buffer
+        :return: empty bytes if nothing is queued
+        """
+        with self.lock:
+            if not self.messages:
+                return b''
+            chunks = [self.messages.popleft()]
+            taken = len(chunks[0])
+            while self.messages and taken + len(self.messages[0]) <= self.COALESCE_BYTES:
+                chunk = self.messages.popleft()
+                chunks.append(chunk)
+                taken += len(chunk)
+            self.size -= taken
+            self.in_flight = True
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+    def written(self):
+        """
+        Writer finished buffer returned by take()
+        :return:
+        """
+        with self.lock:
+            self.in_flight = False
+
+    def clear(self) -> int:
+        """
+        Drop queued messages, message which is already being written is not affected
+        :return: count of dropped messages
+        """
+        with self.lock:
+            dropped = len(self.messages)
+            self.messages.clear()
+            self.size = 0
+        return dropped
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.messages.clear()
+            self.size = 0
+        if self.notify:
+            self.notify(self)
+
+
+class SocketWriteState:
+    __slots__ = ('queue', 'sock', 'pending', 'waiting')
+
+    def __init__(self, queue: OutboundQueue, sock: socket.socket):
+        self.queue = queue
+        self.sock = sock
+        # part of coalesced buffer which is not written yet
+        self.pending: Optional[memoryview] = None
+        # socket is registered in selector and waits to become writable
+        self.waiting = False
+
+
+class SocketOutboundWriter:
+    """
+    One thread which drains outbound queues of threaded server sockets.
+    Writes are non-blocking (MSG_DONTWAIT), partial writes are kept and continued
+    when selector reports that socket is writable again.
+    """
+    SELECT_TIMEOUT = 1.0
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.states: Dict[OutboundQueue, SocketWriteState] = {}
+        self.ready: List[OutboundQueue] = []
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.wakeup_reader: Optional[socket.socket] = None
+        self.wakeup_writer: Optional[socket.socket] = None
+
+    def register(self, queue: OutboundQueue, sock: socket.socket):
+        """
+        Drain queue into socket
+        :param queue:
+        :param sock:
+        :return:
+        """
+        with self.lock:
+            self._ensure_thread()
+            self.states[queue] = SocketWriteState(queue=queue, sock=sock)
+        queue.notify = self.wake
+
+    def wake(self, queue: OutboundQueue):
+        with self.lock:
+            self.ready.append(queue)
+            wakeup = self.wakeup_writer
+        try:
+            wakeup.send(b'\0', socket.MSG_DONTWAIT)
+        except (BlockingIOError, OSError):
+            # wakeup buffer is full, writer thread is going to run anyway
+            pass
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            if self.wakeup_reader is None:
+                self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+                self.wakeup_reader.setblocking(False)
+                self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+            self.thread = threading.Thread(target=self._run, name='outbound-writer', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            for key, _ in self.selector.select(self.SELECT_TIMEOUT):
+                if key.fileobj is self.wakeup_reader:
+                    self._drain_wakeup()
+                    continue
+                state: SocketWriteState = key.data
+                self.selector.unregister(state.sock)
+                state.waiting = False
+                self._flush(state)
+            with self.lock:
+                ready, self.ready = self.ready, []
+            for queue in ready:
+                state = self.states.get(queue)
+                if state is not None and (queue.closed or not state.waiting):
+                    self._flush(state)
+
+    def _drain_wakeup(self):
+        try:
+            while self.wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _flush(self, state: SocketWriteState):
+        """
+        Write as much as socket accepts without blocking
+        :param state:
+        :return:
+        """
+        queue = state.queue
+        while not queue.closed:
+            if not state.pending:
+                data = queue.take()
+                if not data:
+                    return
+                state.pending = memoryview(data)
+            try:
+                sent = state.sock.send(state.pending, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                if self._wait_writable(state):
+                    return
+                queue.close()
+                break
+            except OSError as e:
+                logger.debug(f"Outbound write failed: {e}")
+                queue.close()
+                break
+            state.pending = state.pending[sent:]
+            if not state.pending:
+                queue.written()
+        self._remove(state)
+
+    def _wait_writable(self, state: SocketWriteState) -> bool:
+        try:
+            self.selector.register(state.sock, selectors.EVENT_WRITE, state)
+        except (ValueError, OSError):
+            # socket was closed by reader thread
+            return False
+        state.waiting = True
+        return True
+
+    def _remove(self, state: SocketWriteState):
+        if state.waiting:
+            self.selector.unregister(state.sock)
+            state.waiting = False
+        with self.lock:
+            self.states.pop(state.queue, None)
@@ -0,0 +1,251 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, TYPE_CHECKING
+
+from tcp_server.logger import logger
+
+if TYPE_CHECKING:
+    from poker_game.poker.game_protocol import TableStatusBroadcast
+    from tcp_server.tcp_broker import TCPGameConnection
+
+# `SP|<table_key>` starts watching the table, `SS|<table_key>` stops it
+SPECTATE_COMMAND = 'SP'
+STOP_SPECTATE_COMMAND = 'SS'
+# table has the max count of spectators or connection watches the max count of tables
+SPECTATORS_FULL_ERROR_CODE = 'SF'
+# spectate commands are sent too often
+SPECTATE_RATE_ERROR_CODE = 'SR'
+# sharded mode: table is owned by another worker and its status does not reach this one
+SPECTATE_NOT_OWNED_ERROR_CODE = 'SO'
+
+
+class SpectatorFanout:
+    """
+    Table status for connections which watch tables without seats.
+    Spectators get the public payload only (no hand cards), rendered once per encoding
+    and queued to every spectator as the same bytes object.
+    Fan-out runs in its own thread: table actors only store the latest broadcast of the table,
+    so the count of spectators never adds to the latency of players.
+    Limits, so spectators can not slow down players:
+    - one update of a table per MIN_INTERVAL, versions in between are skipped
+    - spectator with MAX_QUEUED messages waiting in its outbound queue skips updates until it reads them
+    - MAX_SPECTATORS_PER_TABLE, MAX_TABLES_PER_CONNECTION and one spectate command per COMMAND_INTERVAL
+    """
+    MIN_INTERVAL = 0.5
+    MAX_QUEUED = 2
+    MAX_SPECTATORS_PER_TABLE = 1000
+    MAX_TABLES_PER_CONNECTION = 4
+    COMMAND_INTERVAL = 0.2
+
+    def __init__(
+            self,
+            encode: Callable[["TableStatusBroadcast", "TCPGameConnection"], bytes],
+            load: Callable[[str], Optional["TableStatusBroadcast"]],
+            min_interval: Optional[float] = None,
+            max_spectators_per_table: Optional[int] = None
+    ):
+        """
+        :param encode: public table status in wire format of connection
+        :param load: current table status for the first spectator of the table
+        :param min_interval: seconds between updates of one table
+        :param max_spectators_per_table:
+        """
+        self.encode = encode
+        self.load = load
+        self.min_interval = self.MIN_INTERVAL if min_interval is None else min_interval
+        self.max_spectators_per_table = max_spectators_per_table or self.MAX_SPECTATORS_PER_TABLE
+        self.condition = threading.Condition()
+        # table_key -> user_id -> connection, dict is used as insertion ordered set
+        self.tables: Dict[str, Dict[int, "TCPGameConnection"]] = {}
+        self.user_tables: Dict[int, Dict[str, None]] = {}
+        # the latest broadcast of watched table and tables where it was not delivered yet
+        self.latest: Dict[str, "TableStatusBroadcast"] = {}
+        self.changed: Dict[str, None] = {}
+        self.sent_at: Dict[str, float] = {}
+        # new spectators waiting for the first snapshot by table
+        self.joining: Dict[str, List["TCPGameConnection"]] = {}
+        self.last_command: Dict[int, float] = {}
+        self.thread: Optional[threading.Thread] = None
+        self.updates = 0
+        self.skipped = 0
+
+    def has_table(self, table_key: str) -> bool:
+        return table_key in self.tables
+
+    def subscribe(self, connection: "TCPGameConnection", table_key: str, limited: bool = True) -> Optional[str]:
+        """
+        Start watching the table, snapshot is sent by fan-out thread
+        :param connection:
+        :param table_key:
+        :param limited: apply command rate limit, False for tables restored after hot restart
+        :return: error code if spectator is not added
+        """
+        user_id = connection.user.id
+        with self.condition:
+            if limited and not self._allow_command(user_id):
+                return SPECTATE_RATE_ERROR_CODE
+            spectators = self.tables.get(table_key, {})
+            tables = self.user_tables.get(user_id, {})
+            if user_id not in spectators and (
+                    len(spectators) >= self.max_spectators_per_table
+                    or len(tables) >= self.MAX_TABLES_PER_CONNECTION
+            ):
+                return SPECTATORS_FULL_ERROR_CODE
+            self.tables.setdefault(table_key, {})[user_id] = connection
+            self.user_tables.setdefault(user_id, {})[table_key] = None
+            self.joining.setdefault(table_key, []).append(connection)
+            self._start()
+            self.condition.notify()
+        return None
+
+    def unsubscribe(self, user_id: int, table_key: str) -> Optional[str]:
+        """
+        :param user_id:
+        :param table_key:
+        :return: error code if command is rate limited
+        """
+        with self.condition:
+            if not self._allow_command(user_id):
+                return SPECTATE_RATE_ERROR_CODE
+            self._remove(user_id, table_key)
+        return None
+
+    def remove(self, user_id: int, connection: Optional["TCPGameConnection"] = None):
+        """
+        Stop all tables of closed connection
+        :param user_id:
+        :param connection: remove only this connection, not a newer one of the same user
+        :return:
+        """
+        with self.condition:
+            for table_key in list(self.user_tables.get(user_id, ())):
+                registered = self.tables[table_key].get(user_id)
+                if connection is None or registered is connection:
+                    self._remove(user_id, table_key)
+            if user_id not in self.user_tables:
+                self.last_command.pop(user_id, None)
+
+    def watched_tables(self, user_id: int) -> List[str]:
+        return list(self.user_tables.get(user_id, ()))
+
+    def publish(self, table_key: str, broadcast: "TableStatusBroadcast"):
+        """
+        New table status, called by table actor: O(1) and never blocks on spectators
+        :param table_key:
+        :param broadcast:
+        :return:
+        """
+        if table_key not in self.tables:
+            return
+        with self.condition:
+            if table_key not in self.tables:
+                return
+            self.latest[table_key] = broadcast
+            self.changed[table_key] = None
+            self._start()
+            self.condition.notify()
+
+    def stats(self) -> dict:
+        return {
+            'tables': len(self.tables),
+            'spectators': sum(len(spectators) for spectators in list(self.tables.values())),
+            'updates': self.updates,
+            'skipped': self.skipped,
+        }
+
+    def _allow_command(self, user_id: int) -> bool:
+        now = time.monotonic()
+        if now - self.last_command.get(user_id, 0.0) < self.COMMAND_INTERVAL:
+            return False
+        self.last_command[user_id] = now
+        return True
+
+    def _remove(self, user_id: int, table_key: str):
+        spectators = self.tables.get(table_key)
+        if spectators is not None:
+            spectators.pop(user_id, None)
+            if not spectators:
+                del self.tables[table_key]
+                self.latest.pop(table_key, None)
+                self.changed.pop(table_key, None)
+                self.sent_at.pop(table_key, None)
+        tables = self.user_tables.get(user_id)
+        if tables is not None:
+            tables.pop(table_key, None)
+            if not tables:
+                del self.user_tables[user_id]
+
+    def _start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name='spectator-fanout', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                joining, due = self._wait_work()
+            try:
+                for table_key, connections in joining.items():
+                    self._send_snapshot(table_key, connections)
+                for table_key, broadcast, spectators in due:
+                    self._fan_out(broadcast, spectators)
+            except Exception as e:
+                logger.exception(f"Spectator fan-out failed: {e}")
+
+    def _wait_work(self):
+        """
+        Wait under condition for new spectators or tables with changed status and elapsed interval
+        :return: joining spectators by table, (table_key, broadcast, spectators) to update
+        """
+        while True:
+            now = time.monotonic()
+            due = []
+            wait = None
+            for table_key in list(self.changed):
+                next_at = self.sent_at.get(table_key, 0.0) + self.min_interval
+                if next_at > now:
+                    wait = next_at - now if wait is None else min(wait, next_at - now)
+                    continue
+                del self.changed[table_key]
+                self.sent_at[table_key] = now
+                due.append((table_key, self.latest[table_key], list(self.tables[table_key].values())))
+            if due or self.joining:
+                joining, self.joining = self.joining, {}
+                return joining, due
+            self.condition.wait(wait)
+
+    def _send_snapshot(self, table_key: str, connections: List["TCPGameConnection"]):
+        """
+        First message of new spectators: the latest broadcast or status loaded outside of the table actor
+        :param table_key:
+        :param connections:
+        :return:
+        """
+        broadcast = self.latest.get(table_key)
+        if broadcast is None:
+            broadcast = self.load(table_key)
+            with self.condition:
+                if broadcast is None:
+                    # there is no such table
+                    for connection in connections:
+                        self._remove(connection.user.id, table_key)
+                    return
+                if table_key not in self.tables:
+                    return
+                broadcast = self.latest.setdefault(table_key, broadcast)
+        self._fan_out(broadcast, connections)
+
+    def _fan_out(self, broadcast: "TableStatusBroadcast", spectators: List["TCPGameConnection"]):
+        encoded: Dict[str, bytes] = {}
+        for connection in spectators:
+            outbound = connection.outbound
+            if outbound is None or outbound.depth >= self.MAX_QUEUED:
+                self.skipped += 1
+                continue
+            data = encoded.get(connection.encoding.name)
+            if data is None:
+                data = encoded[connection.encoding.name] = self.encode(broadcast, connection)
+            # full queue drops the update, the next one is a full snapshot as well
+            if not outbound.put(data):
+                self.skipped += 1
+        self.updates += 1
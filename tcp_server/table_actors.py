@@ -0,0 +1,187 @@
+import contextlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, ContextManager, Deque, Dict, List, Optional, Tuple
+
+from tcp_server.logger import logger
+
+
+class TableActor:
+    """
+    Ordered command mailbox of one table.
+    Commands of the same table are executed strictly one by one in the order they were submitted,
+    mailboxes of different tables are drained in parallel by the shared worker pool.
+    Commands queued together are drained as one batch inside batch context
+    """
+    MAX_COMMANDS_PER_DRAIN = 32
+
+    def __init__(
+            self,
+            table_key: str,
+            executor: ThreadPoolExecutor,
+            command_context: Optional[Callable[[], ContextManager]] = None,
+            batch_context: Optional[Callable[[], ContextManager]] = None
+    ):
+        self.table_key = table_key
+        self.executor = executor
+        self.command_context = command_context
+        self.batch_context = batch_context
+        self.mailbox: Deque[Tuple[Callable, tuple]] = deque()
+        self.lock = threading.Lock()
+        self.scheduled = False
+
+    @property
+    def depth(self) -> int:
+        return len(self.mailbox)
+
+    @property
+    def busy(self) -> bool:
+        return self.scheduled or bool(self.mailbox)
+
+    def submit(self, method: Callable, *args):
+        """
+        Put command into table mailbox and schedule drain if table is idle
+        :param method:
+        :param args:
+        :return:
+        """
+        self.enqueue(method, *args)
+        self.schedule()
+
+    def enqueue(self, method: Callable, *args):
+        """
+        Put command into table mailbox without scheduling drain
+        :param method:
+        :param args:
+        :return:
+        """
+        with self.lock:
+            self.mailbox.append((method, args))
+
+    def schedule(self):
+        with self.lock:
+            if self.scheduled or not self.mailbox:
+                return
+            self.scheduled = True
+        self.executor.submit(self._drain)
+
+    def _drain(self):
+        """
+        Run queued commands as one batch, give worker back to the pool after MAX_COMMANDS_PER_DRAIN
+        so one busy table can not starve others
+        :return:
+        """
+        with self.lock:
+            batch = [self.mailbox.popleft() for _ in range(min(len(self.mailbox), self.MAX_COMMANDS_PER_DRAIN))]
+        self._run_batch(batch)
+        with self.lock:
+            if not self.mailbox:
+                self.scheduled = False
+                return
+        self.executor.submit(self._drain)
+
+    def _run_batch(self, batch: List[Tuple[Callable, tuple]]):
+        if self.batch_context is None or len(batch) == 1:
+            for method, args in batch:
+                self._run(method, args)
+            return
+        try:
+            with self.batch_context():
+                for method, args in batch:
+                    self._run(method, args)
+        except Exception as e:
+            logger.exception(f"Table {self.table_key} batch of {len(batch)} commands failed: {e}")
+
+    def _run(self, method: Callable, args: tuple):
+        try:
+            if self.command_context is None:
+                method(*args)
+            else:
+                with self.command_context():
+                    method(*args)
+        except Exception as e:
+            logger.exception(f"Table {self.table_key} command {getattr(method, '__name__', method)} failed: {e}")
+
+
+class TableActorPool:
+    """
+    table_key -> TableActor registry with shared worker pool
+    """
+    WORKERS = 16
+
+    def __init__(self, workers: Optional[int] = None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or self.WORKERS,
+            thread_name_prefix='table-actor'
+        )
+        self.actors: Dict[str, TableActor] = {}
+        self.lock = threading.Lock()
+        # wraps every command, e.g. to publish table changes once after the command
+        self.command_context: Optional[Callable[[], ContextManager]] = None
+        # wraps commands drained together, e.g. to commit and publish them once
+        self.batch_context: Optional[Callable[[], ContextManager]] = None
+        # tables with commands held by hold_drains() of current thread
+        self.held = threading.local()
+
+    def get_actor(self, table_key: str) -> TableActor:
+        actor = self.actors.get(table_key)
+        if actor:
+            return actor
+        with self.lock:
+            actor = self.actors.get(table_key)
+            if not actor:
+                actor = TableActor(
+                    table_key=table_key,
+                    executor=self.executor,
+                    command_context=self.command_context,
+                    batch_context=self.batch_context
+                )
+                self.actors[table_key] = actor
+        return actor
+
+    def submit(self, table_key: str, method: Callable, *args):
+        """
+        Run command in table actor
+        :param table_key:
+        :param method:
+        :param args:
+        :return:
+        """
+        actor = self.get_actor(table_key)
+        held = getattr(self.held, 'actors', None)
+        if held is None:
+            return actor.submit(method, *args)
+        actor.enqueue(method, *args)
+        held[table_key] = actor
+
+    @contextlib.contextmanager
+    def hold_drains(self):
+        """
+        Commands submitted by current thread inside the context are drained after it,
+        so commands received together are run as one batch
+        :return:
+        """
+        if getattr(self.held, 'actors', None) is not None:
+            yield
+            return
+        self.held.actors = {}
+        try:
+            yield
+        finally:
+            actors, self.held.actors = self.held.actors, None
+            for actor in actors.values():
+                actor.schedule()
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {table_key: actor.depth for table_key, actor in self.actors.items()}
+
+    def is_idle(self) -> bool:
+        """
+        No table has queued or running commands
+        :return:
+        """
+        return not any(actor.busy for actor in list(self.actors.values()))
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,222 @@
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from tcp_server.logger import logger
+
+TABLE_EVENT_BUS_MEMORY = 'memory'
+TABLE_EVENT_BUS_LOCAL_SOCKET = 'local_socket'
+
+
+class TableEvent:
+    __slots__ = ('table_key', 'message', 'origin')
+
+    def __init__(self, table_key: str, message: Any, origin: str):
+        self.table_key = table_key
+        self.message = message
+        # node id of publisher
+        self.origin = origin
+
+
+class TableEventBus:
+    """
+    Pub/sub of table events between broker nodes.
+    Every subscriber gets every published event, events of this node included,
+    so a node delivers local and remote table events to its own connections the same way
+    """
+    # events leave this process
+    distributed = False
+
+    def __init__(self, node_id: Optional[str] = None):
+        self.node_id = node_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.handlers: List[Callable[[TableEvent], None]] = []
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, handler: Callable[[TableEvent], None]):
+        self.handlers.append(handler)
+
+    def publish(self, table_key: str, message: Any):
+        """
+        Publish one table event, it is delivered to local subscribers right away
+        :param table_key:
+        :param message:
+        :return:
+        """
+        event = TableEvent(table_key=table_key, message=message, origin=self.node_id)
+        self.published += 1
+        self._send(event)
+        self._dispatch(event)
+
+    def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {'node_id': self.node_id, 'published': self.published, 'received': self.received}
+
+    def _send(self, event: TableEvent):
+        raise NotImplementedError
+
+    def _dispatch(self, event: TableEvent):
+        for handler in self.handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.exception(f"Table event handler failed, table: {event.table_key}: {e}")
+
+
+class InMemoryTableEventBus(TableEventBus):
+    """
+    One process, events go to local subscribers only
+    """
+
+    def _send(self, event: TableEvent):
+        pass
+
+
+class LocalSocketTableEventBus(TableEventBus):
+    """
+    Nodes on one machine: every node binds Unix datagram socket `<directory>/<node_id>.sock`,
+    event is sent once to every other socket of the directory.
+    Messages are serialized by `dumps`/`loads` of the publisher
+    """
+    distributed = True
+    DIRECTORY = '/tmp/poker-table-events'
+    SUFFIX = '.sock'
+    MAX_EVENT_SIZE = 256 * 1024
+    # how long list of peer sockets is cached
+    PEERS_TTL = 1.0
+
+    def __init__(
+            self,
+            dumps: Callable[[Any], bytes],
+            loads: Callable[[bytes], Any],
+            directory: Optional[str] = None,
+            node_id: Optional[str] = None
+    ):
+        super().__init__(node_id=node_id)
+        self.dumps = dumps
+        self.loads = loads
+        self.directory = directory or self.DIRECTORY
+        self.path = os.path.join(self.directory, f'{self.node_id}{self.SUFFIX}')
+        self.lock = threading.Lock()
+        self.sock: Optional[socket.socket] = None
+        self.sender: Optional[socket.socket] = None
+        self.thread: Optional[threading.Thread] = None
+        self.peers: List[str] = []
+        self.peers_updated_at = 0.0
+        self.dropped = 0
+
+    def subscribe(self, handler: Callable[[TableEvent], None]):
+        super().subscribe(handler)
+        self._ensure_socket()
+
+    def close(self):
+        with self.lock:
+            if self.sock is None:
+                return
+            self.sock.close()
+            self.sender.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {**super().stats(), 'peers': len(self.peers), 'dropped': self.dropped}
+
+    def _ensure_socket(self):
+        """
+        Socket is bound on first use, so forked workers get their own node socket
+        :return:
+        """
+        with self.lock:
+            if self.sock is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.MAX_EVENT_SIZE * 8)
+            self.sock.bind(self.path)
+            self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.MAX_EVENT_SIZE * 2)
+            self.thread = threading.Thread(target=self._run, name='table-event-bus', daemon=True)
+            self.thread.start()
+
+    def _peers(self) -> List[str]:
+        now = time.monotonic()
+        if now - self.peers_updated_at > self.PEERS_TTL:
+            self.peers = [
+                os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if name.endswith(self.SUFFIX) and os.path.join(self.directory, name) != self.path
+            ]
+            self.peers_updated_at = now
+        return self.peers
+
+    def _send(self, event: TableEvent):
+        """
+        One datagram per peer node, peer which does not read is skipped,
+        its delta clients resync with snapshot by version mismatch
+        :param event:
+        :return:
+        """
+        self._ensure_socket()
+        header = json.dumps({'t': event.table_key, 'o': event.origin}).encode('utf-8')
+        data = header + b'\n' + self.dumps(event.message)
+        for peer in self._peers():
+            try:
+                self.sender.sendto(data, socket.MSG_DONTWAIT, peer)
+            except (BlockingIOError, ConnectionRefusedError, FileNotFoundError) as e:
+                self.dropped += 1
+                logger.debug(f"Table event was not sent to {peer}: {e}")
+            except OSError as e:
+                self.dropped += 1
+                logger.exception(f"Table event was not sent to {peer}: {e}")
+
+    def _run(self):
+        sock = self.sock
+        while True:
+            try:
+                data = sock.recv(self.MAX_EVENT_SIZE)
+            except OSError:
+                return
+            header, _, payload = data.partition(b'\n')
+            try:
+                header = json.loads(header)
+                event = TableEvent(table_key=header['t'], message=self.loads(payload), origin=header['o'])
+            except (ValueError, KeyError) as e:
+                logger.exception(f"Table event is not valid: {e}")
+                continue
+            if event.origin == self.node_id:
+                continue
+            self.received += 1
+            self._dispatch(event)
+
+
+def get_table_event_bus(
+        name: str,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+        directory: Optional[str] = None
+) -> TableEventBus:
+    """
+    Create table event bus backend by name
+    :param name: memory or local_socket
+    :param dumps: message serializer for backends between processes
+    :param loads:
+    :param directory: directory of node sockets for local_socket backend
+    :return:
+    """
+    if name == TABLE_EVENT_BUS_LOCAL_SOCKET:
+        return LocalSocketTableEventBus(dumps=dumps, loads=loads, directory=directory)
+    if name != TABLE_EVENT_BUS_MEMORY:
+        raise ValueError(f'Unknown table event bus: {name}')
+    return InMemoryTableEventBus()
@@ -0,0 +1,225 @@
+import itertools
+import json
+import os
+import selectors
+import signal
+import socket
+import threading
+import zlib
+from typing import Callable, List, Optional
+
+from tcp_server.logger import logger
+
+# one handoff message: json header with connection state and exactly one socket fd
+MAX_HANDOFF_SIZE = 128 * 1024
+
+
+def table_worker_index(table_key: str, workers: int) -> int:
+    """
+    Worker which owns the table, stable across processes (builtin hash is randomized per process)
+    :param table_key:
+    :param workers:
+    :return:
+    """
+    return zlib.crc32(table_key.encode('utf-8')) % workers
+
+
+class ConnectionHandoff:
+    """
+    State of connection moved to another worker:
+    authenticated user, negotiated options, frames which are not handled yet and framer tail
+    """
+    __slots__ = ('user_id', 'options', 'table_key', 'frames', 'pending')
+
+    def __init__(
+            self,
+            user_id: Optional[int] = None,
+            options: Optional[List[str]] = None,
+            table_key: Optional[str] = None,
+            frames: Optional[List[bytes]] = None,
+            pending: bytes = b''
+    ):
+        self.user_id = user_id
+        self.options = options or []
+        self.table_key = table_key
+        self.frames = frames or []
+        self.pending = pending
+
+    @property
+    def is_new_connection(self) -> bool:
+        return self.user_id is None
+
+    def dumps(self) -> bytes:
+        return json.dumps({
+            'u': self.user_id,
+            'o': self.options,
+            't': self.table_key,
+            'f': [frame.decode('latin-1') for frame in self.frames],
+            'p': self.pending.decode('latin-1'),
+        }).encode('utf-8')
+
+    @classmethod
+    def loads(cls, data: bytes) -> "ConnectionHandoff":
+        header = json.loads(data)
+        return cls(
+            user_id=header.get('u'),
+            options=header.get('o'),
+            table_key=header.get('t'),
+            frames=[frame.encode('latin-1') for frame in header.get('f', [])],
+            pending=header.get('p', '').encode('latin-1'),
+        )
+
+
+def send_connection(channel: socket.socket, sock: socket.socket, handoff: ConnectionHandoff):
+    socket.send_fds(channel, [handoff.dumps()], [sock.fileno()])
+
+
+def receive_connection(channel: socket.socket):
+    """
+    :param channel:
+    :return: socket, handoff or None when channel was closed
+    """
+    data, fds, _, _ = socket.recv_fds(channel, MAX_HANDOFF_SIZE, 1)
+    if not fds:
+        return None
+    return socket.socket(fileno=fds[0]), ConnectionHandoff.loads(data)
+
+
+class TableShardWorker:
+    """
+    Worker side of sharded mode: receives sockets from master and runs every connection in its own thread,
+    hands connection back to master when it joins a table of another worker
+    """
+
+    def __init__(self, index: int, workers: int, channel: socket.socket):
+        self.index = index
+        self.workers = workers
+        self.channel = channel
+        self.send_lock = threading.Lock()
+
+    def owns(self, table_key: str) -> bool:
+        return table_worker_index(table_key, self.workers) == self.index
+
+    def hand_off(self, sock: socket.socket, handoff: ConnectionHandoff):
+        """
+        Move socket to owner of handoff.table_key through master, local socket object is closed,
+        connection itself stays open in the owner worker
+        :param sock:
+        :param handoff:
+        :return:
+        """
+        with self.send_lock:
+            send_connection(self.channel, sock, handoff)
+        sock.close()
+
+    def serve(self, handle_connection: Callable[[socket.socket, ConnectionHandoff], None]):
+        """
+        Receive connections until master closes channel
+        :param handle_connection: called in a new thread for every received socket
+        :return:
+        """
+        while True:
+            try:
+                received = receive_connection(self.channel)
+            except (ConnectionResetError, OSError):
+                received = None
+            if received is None:
+                logger.info(f"Worker {self.index}: master channel closed")
+                return
+            sock, handoff = received
+            threading.Thread(target=handle_connection, args=(sock, handoff), daemon=True).start()
+
+
+class TableShardMaster:
+    """
+    Pre-forked sharded mode: master owns the listening port, accepts connections and passes them to workers
+    round robin over Unix sockets. Worker hands connection back after JOIN_GAME of a table
+    it does not own, master forwards it to the owner: table_worker_index(table_key).
+    All players of a table end up in one worker process with its own PokerGame.
+    """
+    BACKLOG = 1024
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.channels: List[socket.socket] = []
+        self.pids: List[int] = []
+        self.listener: Optional[socket.socket] = None
+        self.selector = selectors.DefaultSelector()
+        self.next_worker = itertools.cycle(range(workers))
+
+    def start(self, worker_main: Callable[[TableShardWorker], None]):
+        """
+        Bind port and fork workers, worker_main runs in every child and must not return while serving
+        :param worker_main:
+        :return:
+        """
+        self.listener = socket.create_server((self.host, self.port), backlog=self.BACKLOG)
+        for index in range(self.workers):
+            master_end, worker_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            pid = os.fork()
+            if pid == 0:
+                self.listener.close()
+                master_end.close()
+                for channel in self.channels:
+                    channel.close()
+                try:
+                    worker_main(TableShardWorker(index=index, workers=self.workers, channel=worker_end))
+                finally:
+                    os._exit(0)
+            worker_end.close()
+            self.channels.append(master_end)
+            self.pids.append(pid)
+
+    def serve_forever(self):
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        for channel in self.channels:
+            self.selector.register(channel, selectors.EVENT_READ)
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.listener:
+                    self._accept()
+                else:
+                    self._forward(key.fileobj)
+
+    def _accept(self):
+        sock, address = self.listener.accept()
+        try:
+            send_connection(self.channels[next(self.next_worker)], sock, ConnectionHandoff())
+        except OSError as e:
+            logger.exception(f"Connection {address} was not passed to worker: {e}")
+        sock.close()
+
+    def _forward(self, channel: socket.socket):
+        """
+        Connection handed off by worker goes to table owner
+        :param channel:
+        :return:
+        """
+        received = receive_connection(channel)
+        if received is None:
+            self.selector.unregister(channel)
+            logger.info("Worker channel closed")
+            return
+        sock, handoff = received
+        owner = table_worker_index(handoff.table_key, self.workers)
+        try:
+            send_connection(self.channels[owner], sock, handoff)
+        except OSError as e:
+            logger.exception(f"Connection of user {handoff.user_id} was not passed to worker {owner}: {e}")
+        sock.close()
+
+    def stop(self):
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        if self.listener:
+            self.listener.close()
@@ -0,0 +1,258 @@
+import asyncio
+import contextlib
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from tcp_server.heartbeat import enable_keepalive
+from tcp_server.logger import logger
+from tcp_server.outbound_queue import OutboundQueue
+from tcp_server.tcp_broker import TCPBrokerConnections
+from tcp_server.tcp_message_framing import MessageFramer, FrameTooLargeError, split_auth_message
+
+
+def debug(message: str):
+    return logger.debug(message)
+
+
+class AsyncSocketWriter:
+    """
+    Socket-like adapter around asyncio.StreamWriter.
+    Game handlers run in worker threads and call `connection.request.send()`,
+    so every write is moved into the event loop thread.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter):
+        self.loop = loop
+        self.writer = writer
+
+    def send(self, data: bytes) -> int:
+        self.loop.call_soon_threadsafe(self._write, data)
+        return len(data)
+
+    def sendall(self, data: bytes):
+        self.send(data)
+
+    def shutdown(self, how: int = socket.SHUT_RDWR):
+        self.loop.call_soon_threadsafe(self._close)
+
+    def _write(self, data: bytes):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def _close(self):
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+class AsyncRequestHandler:
+    """
+    Mimics socketserver.BaseRequestHandler interface used by TCPBrokerConnections and TCPGameHandler:
+    `request.send()`, `client_address` and `finish()`
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter):
+        self.loop = loop
+        self.writer = writer
+        self.request = AsyncSocketWriter(loop=loop, writer=writer)
+        self.client_address: Tuple = writer.get_extra_info('peername')
+
+        self.outbound_ready: Optional[asyncio.Event] = None
+
+    def finish(self):
+        """
+        Close connection, safe to call from any thread
+        :return:
+        """
+        self.request.shutdown()
+
+    def start_outbound_writer(self, queue: OutboundQueue):
+        """
+        Drain connection outbound queue by a task in the event loop, safe to call from any thread
+        :param queue:
+        :return:
+        """
+        queue.notify = self._notify_outbound
+        asyncio.run_coroutine_threadsafe(self.write_outbound(queue), self.loop)
+
+    def _notify_outbound(self, queue: OutboundQueue):
+        self.loop.call_soon_threadsafe(self._set_outbound_ready)
+
+    def _set_outbound_ready(self):
+        if self.outbound_ready is not None:
+            self.outbound_ready.set()
+
+    async def write_outbound(self, queue: OutboundQueue):
+        """
+        `drain()` waits while client does not read, so messages stay in the bounded queue
+        instead of growing transport buffer
+        :param queue:
+        :return:
+        """
+        self.outbound_ready = asyncio.Event()
+        try:
+            while not queue.closed and not self.writer.is_closing():
+                data = queue.take()
+                if not data:
+                    self.outbound_ready.clear()
+                    await self.outbound_ready.wait()
+                    continue
+                self.writer.write(data)
+                await self.writer.drain()
+                queue.written()
+        except (ConnectionResetError, BrokenPipeError):
+            debug("Outbound write failed, connection closed")
+        finally:
+            queue.close()
+
+
+class AsyncTCPBrokerConnections:
+    """
+    asyncio server mode.
+    Idle connections are held by the event loop only: no thread per socket and no polling.
+    Commands are dispatched into the same `proxy_methods` handlers through a thread pool,
+    because handlers use the blocking Django ORM.
+    """
+    broker = TCPBrokerConnections
+    READ_SIZE = 1024
+    # wait for the rest of auth message without newline, legacy clients send it in one chunk
+    AUTH_CONTINUE_TIMEOUT = 0.05
+    BACKLOG = 1024
+    HANDLER_WORKERS = 32
+
+    def __init__(self, handler_workers: Optional[int] = None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=handler_workers or self.HANDLER_WORKERS,
+            thread_name_prefix='tcp-handler'
+        )
+
+    async def run_in_handler(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, method, *args)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Per connection coroutine: auth, listen messages, cleanup
+        :param reader:
+        :param writer:
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        connection = AsyncRequestHandler(loop=loop, writer=writer)
+        user_id = None
+        game_connection = None
+        try:
+            data = await self.read_auth_message(reader)
+            if not data:
+                return
+            debug(f"Auth message from {connection.client_address[0]}")
+            auth_data, pending = split_auth_message(data)
+            game_connection = await self.run_in_handler(self.broker.authenticate_connection, connection, auth_data)
+            if not game_connection:
+                return
+            user_id = game_connection.user.id
+            if not game_connection.heartbeat:
+                enable_keepalive(writer.get_extra_info('socket'))
+            await self.listen_messages(user_id, reader, game_connection.framer, pending, game_connection)
+        except (ConnectionResetError, BrokenPipeError, TimeoutError):
+            debug(f"Connection closed for user_id: {user_id}")
+        except FrameTooLargeError as e:
+            debug(f"Connection closed for user_id: {user_id}, {e}")
+        finally:
+            if user_id is not None:
+                await self.run_in_handler(self.broker.disconnect_user, user_id, game_connection)
+            connection.finish()
+
+    async def read_auth_message(self, reader: asyncio.StreamReader) -> bytes:
+        """
+        Read up to the newline which ends auth message, it can be split between TCP segments.
+        Legacy raw clients send auth message without delimiter and wait for the answer,
+        so the first chunk is the whole message when nothing follows it in AUTH_CONTINUE_TIMEOUT
+        :param reader:
+        :return: auth message with bytes received after it, empty if connection was closed
+        """
+        data = await reader.read(self.READ_SIZE)
+        while data and b'\n' not in data:
+            if len(data) > MessageFramer.MAX_FRAME_SIZE:
+                raise FrameTooLargeError(f'Auth message exceeded {MessageFramer.MAX_FRAME_SIZE} bytes')
+            try:
+                chunk = await asyncio.wait_for(reader.read(self.READ_SIZE), self.AUTH_CONTINUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    async def listen_messages(
+            self,
+            user_id: int,
+            reader: asyncio.StreamReader,
+            framer: MessageFramer,
+            pending: bytes = b'',
+            game_connection=None
+    ):
+        """
+        Wait for data without polling, EOF means that connection was closed
+        :param user_id:
+        :param reader:
+        :param framer: negotiated connection framer
+        :param pending: bytes received together with auth message
+        :param game_connection: its last seen time is updated on every received chunk
+        :return:
+        """
+        frames = framer.feed(pending) if pending else []
+        while self.broker.receive_listener_active:
+            if frames:
+                await self.run_in_handler(self.handle_frames, user_id, frames)
+            data = await reader.read(framer.READ_SIZE)
+            if not data:
+                debug(f"Connection closed for user_id: {user_id}")
+                break
+            if game_connection:
+                game_connection.touch()
+            frames = framer.feed(data)
+
+    def handle_frames(self, user_id: int, frames: List[bytes]):
+        """
+        Frames of one read in one handler call, commands of one table are run by its actor as one batch
+        :param user_id:
+        :param frames:
+        :return:
+        """
+        table_actors = self.broker.game_handler.table_actors
+        with table_actors.hold_drains() if len(frames) > 1 else contextlib.nullcontext():
+            for frame in frames:
+                self.broker.handle_command(user_id, frame)
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(
+            self.handle_client,
+            host=host,
+            port=port,
+            backlog=self.BACKLOG,
+            family=socket.AF_INET,
+            reuse_address=True,
+        )
+        ip, port = server.sockets[0].getsockname()[:2]
+        print(f'Asyncio server IP: {ip}; port: {port}')
+        async with server:
+            await server.serve_forever()
+
+
+def run_async_server(host: str, port: int, handler_workers: Optional[int] = None):
+    """
+    Entry point for asyncio server mode
+    :param host:
+    :param port:
+    :param handler_workers: size of thread pool for game handlers
+    :return:
+    """
+    broker = AsyncTCPBrokerConnections(handler_workers=handler_workers)
+    try:
+        asyncio.run(broker.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.executor.shutdown(wait=False)
+        print('\nAsyncio TCP server close')
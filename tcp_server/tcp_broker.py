@@ -1,11 +1,24 @@
+import contextlib
 import datetime
+import os
 import socket
 import socketserver
+import threading
 import time
-from typing import Optional, Tuple, List, TypedDict
+from typing import Optional, Tuple, List, TypedDict, Set, Dict
+
+from django.db import connection as db_connection, transaction
+from django.db.models.signals import post_delete, post_save
 
 from poker_game.poker import game_protocol
-from poker_game.poker.game_protocol import out_game_protocol
+from poker_game.poker import binary_protocol
+from poker_game.poker.game_protocol import (
+    out_game_protocol,
+    TableStatusBroadcast,
+    MessageEncoding,
+    JSON_ENCODING,
+    BINARY_ENCODING,
+)
 from tcp_server.enums.errors import GameErrorsCode
 from tcp_server.logger import logger
 from user import models
@@ -14,7 +27,30 @@ from poker_game.models import UserTransaction, Game, Round, Table, PlayerGame
 from poker_game.textchoices import TransactionTypeChoice
 from tcp_server.enums import commands
 from poker_game.poker.game import PokerGame
+from poker_game.poker.table_status_delta import TableStateVersions
+from tcp_server.auth_cache import TokenAuthCache
+from tcp_server.command_metrics import CommandMetrics, MetricsAdminServer, PHASE_PARSE, PHASE_SEND, PHASE_SERIALIZE
+from tcp_server.connection_registry import ConnectionRegistry
+from tcp_server.game_scheduler import GameScheduler, ScheduledJob
+from tcp_server.heartbeat import HeartbeatSweeper, HEARTBEAT_OPTION, PING_COMMAND, PONG_COMMAND, enable_keepalive
+from tcp_server.hot_restart import ReaderGate
+from tcp_server.outbound_queue import OutboundQueue, SocketOutboundWriter, OVERFLOW_DISCONNECT, OVERFLOW_SNAPSHOT
+from tcp_server.spectators import (
+    SpectatorFanout, SPECTATE_COMMAND, STOP_SPECTATE_COMMAND, SPECTATE_NOT_OWNED_ERROR_CODE
+)
+from tcp_server.table_actors import TableActorPool
+from tcp_server.table_event_bus import TableEvent, TableEventBus, get_table_event_bus, TABLE_EVENT_BUS_MEMORY
+from tcp_server.table_sharding import ConnectionHandoff, TableShardWorker
 from tcp_server.tcp_game_connection_protocol import GameConnectionProtocol
+from tcp_server.turn_timer import HashedTimingWheel
+from tcp_server.tcp_message_framing import (
+    MessageFramer,
+    FrameTooLargeError,
+    RawFramer,
+    get_framer,
+    parse_connection_options,
+    split_auth_message,
+)
 
 import sys
 
@@ -27,23 +63,160 @@ def info(message):
     return logger.info(message)
 
 
+def load_users_by_tokens(tokens: List[str]) -> Dict[str, User]:
+    """
+    One query for a batch of connection auths
+    :param tokens:
+    :return: token -> user
+    """
+    return {user.socket_access_token: user for user in User.objects.filter(socket_access_token__in=tokens)}
+
+
+def create_poker_game() -> PokerGame:
+    """
+    Game engine of broker process, every server mode builds it here with the same settings
+    :return:
+    """
+    return PokerGame(in_memory_hands=os.environ.get("IN_MEMORY_HANDS") == '1')
+
+
+# connection option to receive table status patches instead of full snapshots: `AU|token|nl,delta`
+DELTA_OPTION = 'delta'
+# connection option for compact binary outbound messages: `AU|token|nl,bin`
+BINARY_OPTION = 'bin'
+# JOIN_GAME error while server is draining before restart
+DRAINING_ERROR_CODE = 'DR'
+# metrics name of table status published after a batch of commands
+TABLE_STATUS_METRIC = 'table_status'
+
+
+class SocketRequestHandler:
+    """
+    Mimics socketserver.BaseRequestHandler interface for sockets which were not accepted by socketserver
+    (received from sharded master, inherited after hot restart): `request`, `client_address` and `finish()`
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.request = sock
+        try:
+            self.client_address = sock.getpeername()
+        except OSError:
+            self.client_address = None
+
+    def finish(self):
+        """
+        Shutdown wakes up reader thread, socket is closed by the thread itself
+        :return:
+        """
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
 class TCPGameConnection:
-    def __init__(self, user: User, connection: socketserver.BaseRequestHandler):
+    def __init__(
+            self,
+            user: User,
+            connection: socketserver.BaseRequestHandler,
+            options: Optional[Set[str]] = None
+    ):
         self.connection = connection
         self.user = user
-
-
-class TableConnections(TypedDict):
-    table_key: str
-    connections: List[TCPGameConnection]
+        self.options: Set[str] = options or set()
+        self.framer: MessageFramer = get_framer(self.options)
+        # table_key -> last table state version sent to this connection
+        self.table_versions: Dict[str, int] = {}
+        self.encoding: MessageEncoding = BINARY_ENCODING if BINARY_OPTION in self.options else JSON_ENCODING
+        self.outbound: Optional[OutboundQueue] = None
+        # monotonic time of the last received data and of the last PING
+        self.last_seen = time.monotonic()
+        self.last_ping = 0.0
+        # reader is parked before hot restart
+        self.parked = False
+
+    @property
+    def accepts_delta(self) -> bool:
+        return DELTA_OPTION in self.options
+
+    @property
+    def heartbeat(self) -> bool:
+        return HEARTBEAT_OPTION in self.options
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    @property
+    def queue_depth(self) -> int:
+        return self.outbound.depth if self.outbound else 0
+
+    def dump_state(self, table_keys: List[str], route: Optional[str]) -> dict:
+        """
+        Connection state for the next process of hot restart, bytes are stored as latin-1 strings
+        :param table_keys: tables of the connection
+        :param route: table of user commands
+        :return:
+        """
+        return {
+            'fd': self.connection.request.fileno(),
+            'user_id': self.user.id,
+            'options': sorted(self.options),
+            'table_versions': self.table_versions,
+            'tables': table_keys,
+            'route': route,
+            'pending': bytes(self.framer.buffer).decode('latin-1'),
+        }
 
 
 class TCPGameHandler:
-    connections: List[TCPGameConnection] = []
-    table_connections: List[TableConnections] = []
+    registry = ConnectionRegistry()
+    table_versions = TableStateVersions()
     protocol = GameConnectionProtocol
-    game = PokerGame()
+    # IN_MEMORY_HANDS=1: running hands are kept in memory and written behind, DB driven game otherwise
+    game = create_poker_game()
+    table_actors = TableActorPool()
+    scheduler = GameScheduler()
+    new_game_jobs: Dict[str, ScheduledJob] = {}
+    turn_timers = HashedTimingWheel()
+    outbound_writer = SocketOutboundWriter()
+    # memory: one broker node, local_socket: broker nodes on one machine
+    TABLE_EVENT_BUS = os.environ.get("TABLE_EVENT_BUS", TABLE_EVENT_BUS_MEMORY)
+    TABLE_EVENT_BUS_DIR = os.environ.get("TABLE_EVENT_BUS_DIR")
+    event_bus: Optional[TableEventBus] = None
+    event_bus_lock = threading.Lock()
+    # table keys with changed status in the running table command
+    status_batch = threading.local()
+    # `hb` connections get PING after idle interval and are disconnected after timeout without any data
+    heartbeat = HeartbeatSweeper(
+        ping_interval=float(os.environ.get("HEARTBEAT_PING_INTERVAL", HeartbeatSweeper.PING_INTERVAL)),
+        timeout=float(os.environ.get("HEARTBEAT_TIMEOUT", HeartbeatSweeper.TIMEOUT)),
+    )
+    # bytes queued for one client before overflow policy is applied
+    OUTBOUND_QUEUE_MAX_BYTES = int(os.environ.get("TCP_OUTBOUND_QUEUE_BYTES", OutboundQueue.MAX_BYTES))
+    # snapshot: drop queued messages and resend table snapshot, disconnect: close slow client
+    OUTBOUND_OVERFLOW_POLICY = os.environ.get("TCP_OUTBOUND_OVERFLOW", OVERFLOW_SNAPSHOT)
+    # before hot restart: new joins are rejected and new hands are not started
+    draining = False
+    # latency histograms of commands by phase, queries are timed in the thread of the command
+    metrics = CommandMetrics(execute_wrapper=lambda wrapper: db_connection.execute_wrapper(wrapper))
+    # local port which dumps metrics, disabled by default
+    METRICS_ADMIN_PORT = int(os.environ.get("METRICS_ADMIN_PORT", 0))
+    # connections which watch tables without seats, public status is sent by the fan-out thread
+    spectators = SpectatorFanout(
+        encode=lambda broadcast, connection: TCPGameHandler.encode_table_status(
+            broadcast.public(connection.encoding), connection
+        ),
+        load=lambda table_key: TCPGameHandler.load_table_status(table_key),
+        min_interval=float(os.environ.get("SPECTATOR_UPDATE_INTERVAL", SpectatorFanout.MIN_INTERVAL)),
+        max_spectators_per_table=int(os.environ.get("SPECTATORS_PER_TABLE", SpectatorFanout.MAX_SPECTATORS_PER_TABLE))
+    )
+    # worker side of sharded server mode, spectators of tables owned by other workers need a distributed event bus
+    table_shard: Optional[TableShardWorker] = None
     START_NEW_GAME_DELAY = 7
+    LEAVE_STATUS_DELAY = 1
+    # turn deadline for connected player
+    TURN_TIME_OUT = float(os.environ.get("TURN_TIME_OUT", 30))
+    # turn deadline for folded or disconnected player
     AUTO_FOLD_TIME_OUT = 1
 
     @classmethod
@@ -64,6 +237,8 @@ class TCPGameHandler:
         :return:
         """
         user_id, command_name = args
+        if cls.draining:
+            return cls._send_error(user_id=user_id, error_code=DRAINING_ERROR_CODE)
         data = cls.protocol(command_name).parse_join_game_data()
         table_key = data.get('table_key')
         user = User.objects.get(id=user_id)
@@ -93,6 +268,47 @@ class TCPGameHandler:
             cls.game.setup_start_game_bets(round_model=current_round)
 
         cls._send_table_status(table_key=table_key)
+        if start_game:
+            cls._check_auto_fold(round_model=current_round)
+
+    @classmethod
+    def on_spectate(cls, *args):
+        """
+        SP: watch table without seat, public table status is sent on every change
+        :param args:
+        :return:
+        """
+        user_id = args[0]
+        table_key = cls.protocol(args[1]).parse_join_game_data().get('table_key')
+        connection = cls.get_connection_by_user(user_id)
+        if not table_key or not connection:
+            return
+        if (
+                cls.table_shard is not None
+                and not cls.table_shard.owns(table_key)
+                and not cls.get_event_bus().distributed
+        ):
+            # only the owner worker publishes status of the table
+            cls._send_error(user_id=user_id, error_code=SPECTATE_NOT_OWNED_ERROR_CODE)
+            return
+        error_code = cls.spectators.subscribe(connection=connection, table_key=table_key)
+        if error_code:
+            cls._send_error(user_id=user_id, error_code=error_code)
+
+    @classmethod
+    def on_stop_spectate(cls, *args):
+        """
+        SS: stop watching table
+        :param args:
+        :return:
+        """
+        user_id = args[0]
+        table_key = cls.protocol(args[1]).parse_join_game_data().get('table_key')
+        if not table_key:
+            return
+        error_code = cls.spectators.unsubscribe(user_id=user_id, table_key=table_key)
+        if error_code:
+            cls._send_error(user_id=user_id, error_code=error_code)
 
     @classmethod
     def on_table_status(cls, *args):
@@ -167,15 +383,13 @@ class TCPGameHandler:
         if not success:
             return cls._send_error(user_id=user_id, error_code=error)
 
-        players_count = round_model.game.get_active_players().count()
+        players_count = cls.game.active_players_count(round_model)
 
         if players_count <= 1:
+            table_key = round_model.game.table.key
             cls.game.stop_game(game=round_model.game, round=round_model)
-            cls._send_table_status(table_key=round_model.game.table.key)
-            time.sleep(cls.START_NEW_GAME_DELAY)
-            current_round = cls.game.start_game(table_key=round_model.game.table.key)
-            cls.game.setup_start_game_bets(round_model=current_round)
-            return cls._send_table_status(table_key=round_model.game.table.key)
+            cls._send_table_status(table_key=table_key)
+            return cls._schedule_new_game(table_key=table_key)
 
         cls.after_user_turn(round_model=round_model)
 
@@ -188,51 +402,201 @@ class TCPGameHandler:
         """
         game_finished = False
         table_key = round_model.game.table.key
-        if round_model.bidding_closed(True):
-            new_round = cls.game.run_next_round(game_round=round_model)
-            if new_round.is_end_round:
-                cls.game.end_game(new_round)
+        current_round = round_model
+        if cls.game.bidding_closed(round_model):
+            current_round = cls.game.run_next_round(game_round=round_model)
+            if current_round.is_end_round:
+                cls.game.end_game(current_round)
                 cls._send_table_status(table_key=table_key)
                 game_finished = True
 
         if game_finished:
-            time.sleep(cls.START_NEW_GAME_DELAY)
-            current_round = cls.game.start_game(table_key=table_key)
-            cls.game.setup_start_game_bets(round_model=current_round)
+            return cls._schedule_new_game(table_key=table_key)
 
         cls._send_table_status(table_key=table_key)
-        cls._check_auto_fold(round_model=round_model)
+        cls._check_auto_fold(round_model=current_round)
+
+    @classmethod
+    def _defer(cls, table_key: str, delay: float, method, *args) -> ScheduledJob:
+        """
+        Run method in table actor after delay, without blocking current thread
+        :param table_key:
+        :param delay: seconds
+        :param method:
+        :param args:
+        :return:
+        """
+        return cls.scheduler.call_later(
+            delay,
+            cls.table_actors.submit,
+            table_key,
+            method,
+            *args,
+            name=f'{getattr(method, "__name__", method)}:{table_key}'
+        )
+
+    @classmethod
+    def _schedule_new_game(cls, table_key: str):
+        """
+        Start next hand on table after START_NEW_GAME_DELAY
+        :param table_key:
+        :return:
+        """
+        cls.turn_timers.cancel(table_key)
+        if job := cls.new_game_jobs.get(table_key):
+            job.cancel()
+        if cls.draining:
+            return
+        cls.new_game_jobs[table_key] = cls._defer(table_key, cls.START_NEW_GAME_DELAY, cls._start_new_game, table_key)
+
+    @classmethod
+    def _start_new_game(cls, table_key: str):
+        """
+        Deferred job: start new game on table, if players are still there
+        :param table_key:
+        :return:
+        """
+        cls.new_game_jobs.pop(table_key, None)
+        if cls.draining:
+            return
+        table = cls.game.get_table_from_db(table_key=table_key)
+        if table.players.count() < 2:
+            return cls._send_table_status(table_key=table_key)
+        current_round = cls.game.start_game(table_key=table_key)
+        cls.game.setup_start_game_bets(round_model=current_round)
+        cls._send_table_status(table_key=table_key)
+        cls._check_auto_fold(round_model=current_round)
 
     @classmethod
     def _check_auto_fold(cls, round_model: Round):
-        current_player = round_model.get_current_player()
-        if not current_player:
+        """
+        Arm turn deadline for current player of the table.
+        Folded or disconnected player is auto folded after AUTO_FOLD_TIME_OUT,
+        connected one after TURN_TIME_OUT
+        :param round_model:
+        :return:
+        """
+        table_key = round_model.game.table.key
+        current_player = cls.game.get_current_player(round_model)
+        if not current_player or round_model.is_end_round:
+            cls.turn_timers.cancel(table_key)
             return
 
         user_id = int(current_player.user_id)
         connection = cls.get_connection_by_user(user_id=user_id)
+        time_out = cls.AUTO_FOLD_TIME_OUT if current_player.is_fold or not connection else cls.TURN_TIME_OUT
+        cls.turn_timers.arm(
+            table_key,
+            time_out,
+            cls.table_actors.submit,
+            table_key,
+            cls._on_turn_time_out,
+            round_model.id,
+            round_model.turn_index,
+            user_id
+        )
+
+    @classmethod
+    def _check_turn_after_leave(cls, table_key: str):
+        """
+        Leaving player could have the turn or end the hand:
+        arm turn deadline of the next player or cancel it
+        :param table_key:
+        :return:
+        """
+        round_model = cls.game.get_current_round(table_key)
+        if not round_model or round_model.is_end_round or cls.game.active_players_count(round_model) <= 1:
+            cls.turn_timers.cancel(table_key)
+            return
+        cls._check_auto_fold(round_model=round_model)
+
+    @classmethod
+    def _on_turn_time_out(cls, round_id: int, turn_index: int, user_id: int):
+        """
+        Turn deadline expired, runs in table actor.
+        Skipped if the turn was already made
+        :param round_id:
+        :param turn_index:
+        :param user_id:
+        :return:
+        """
+        round_model = Round.objects.filter(id=round_id).first()
+        if not round_model or round_model.turn_index != turn_index or round_model.game.rounds.last() != round_model:
+            return
+
+        success, error, round_model, is_last_turn = cls.game.auto_fold(user_id)
+        debug("In auto fold")
+        debug(str(success))
+        debug(error)
+        debug(str(round_model))
+        debug(str(is_last_turn))
+        if not success:
+            return
+
+        players_count = cls.game.active_players_count(round_model)
+
+        if players_count <= 1:
+            table_key = round_model.game.table.key
+            cls.game.stop_game(game=round_model.game, round=round_model)
+            cls._send_table_status(table_key=table_key)
+            return cls._schedule_new_game(table_key=table_key)
 
-        if current_player.is_fold or not connection:
-            # time.sleep(cls.AUTO_FOLD_TIME_OUT)
-            success, error, round_model, is_last_turn = cls.game.auto_fold(user_id)
-            debug("In auto fold")
-            debug(str(success))
-            debug(error)
-            debug(str(round_model))
-            debug(str(is_last_turn))
+        cls.after_user_turn(round_model=round_model)
 
-            players_count = round_model.game.get_active_players().count()
+    @classmethod
+    def is_idle(cls) -> bool:
+        """
+        No running hand timers, deferred jobs or table commands
+        :return:
+        """
+        return (
+            not cls.turn_timers.pending_count
+            and not cls.scheduler.pending_count
+            and cls.table_actors.is_idle()
+        )
 
-            if players_count <= 1:
-                cls.game.stop_game(game=round_model.game)
-                cls._send_table_status(table_key=round_model.game.table.key)
-                time.sleep(cls.START_NEW_GAME_DELAY)
-                current_round = cls.game.start_game(table_key=round_model.game.table.key)
-                cls.game.setup_start_game_bets(round_model=current_round)
-                return cls._send_table_status(table_key=round_model.game.table.key)
+    @classmethod
+    def dump_state(cls) -> dict:
+        """
+        Local game state for hot restart
+        :return:
+        """
+        return {
+            'tables': cls.game.dump_tables(),
+            'table_versions': cls.table_versions.versions(),
+        }
 
-            cls.after_user_turn(round_model=round_model)
+    @classmethod
+    def restore_state(cls, state: dict):
+        """
+        Local game state of previous process
+        :param state: dump_state() result
+        :return:
+        """
+        cls.game.restore_tables(state['tables'])
+        cls.table_versions.restore(state['table_versions'])
+
+    @classmethod
+    def resume_tables(cls):
+        """
+        Timers were lost with previous process, every table arms them again in its actor
+        :return:
+        """
+        for table in cls.game.tables_list():
+            cls.table_actors.submit(table.table_key, cls._resume_table, table.table_key)
 
+    @classmethod
+    def _resume_table(cls, table_key: str):
+        """
+        Running hand gets turn deadline of current player, finished one schedules next hand
+        :param table_key:
+        :return:
+        """
+        if cls.game.get_current_game(table_key=table_key):
+            current_round = cls.game.get_current_round(table_key=table_key)
+            if current_round and not current_round.is_end_round:
+                return cls._check_auto_fold(round_model=current_round)
+        cls._schedule_new_game(table_key=table_key)
 
     @classmethod
     def add_connection_to_table(cls, user: User, table_key: str):
@@ -243,64 +607,67 @@ class TCPGameHandler:
         :return:
         """
         connection = cls.get_connection_by_user(user.id)
-        table: Optional[TableConnections] = cls.get_table_connections(table_key=table_key)
         debug(str(connection) + ": Connection for user")
-        if not table:
-            table = TableConnections(connections=[connection], table_key=table_key)
-            cls.table_connections.append(table)
-        if connection not in table['connections']:
-            table['connections'].append(connection)
+        if connection:
+            connection.table_versions.pop(table_key, None)
+            cls.registry.join_table(connection=connection, table_key=table_key)
 
     @classmethod
-    def remove_connection_from_list(cls, user_id: int):
+    def add_connection(cls, connection: TCPGameConnection):
         """
-        method removed connection from connections list
+        method adds authenticated connection to connections registry
+        :param connection:
+        :return:
+        """
+        cls.registry.add(connection)
+
+    @classmethod
+    def remove_connection_from_list(cls, user_id: int, connection: Optional[TCPGameConnection] = None):
+        """
+        method removed connection from connections registry
         :param user_id:
+        :param connection: remove only this connection, not a newer one of the same user
         :return:
         """
-        return [cls.connections.remove(connection) for connection in cls.connections if connection.user.id == user_id]
+        cls.spectators.remove(user_id=user_id, connection=connection)
+        return cls.registry.remove(user_id=user_id, connection=connection)
 
     @classmethod
-    def get_connection_by_user(cls, user_id: int):
+    def get_connection_by_user(cls, user_id: int) -> Optional[TCPGameConnection]:
         """
-        method removed connection from connections list
+        method returns user connection
         :param user_id:
         :return:
         """
-        try:
-            return next(connection for connection in cls.connections if connection.user.id == user_id)
-        except StopIteration:
-            return None
+        return cls.registry.get(user_id)
+
+    @classmethod
+    def get_user_table_key(cls, user_id: int) -> Optional[str]:
+        """
+        Return key of the table where user connection is
+        :param user_id:
+        :return:
+        """
+        return cls.registry.user_table_key(user_id=user_id)
 
     @classmethod
     def remove_connection_through_user(cls, user_id: int, table_key: str):
         """
-        Method removed connection from table connections dict
+        Method removed connection from table connections
         :param table_key:
         :param user_id:
         :return:
         """
-        connections = cls.get_table_connections(table_key=table_key)
-        [
-            connections['connections'].remove(connection)
-            for connection in connections['connections']
-            if connection.user.id == user_id
-        ]
+        cls.registry.leave_table(user_id=user_id, table_key=table_key)
 
     @classmethod
     def remove_user_from_tables_connections(cls, user_id: int):
         """
-        Method removed connection from table connections dict
-        :param table_key:
+        Method removed connection from all table connections
         :param user_id:
         :return:
         """
-        for table in cls.table_connections:
-            [
-                table["connections"].remove(connection)
-                for connection in table["connections"]
-                if connection.user and connection.user.id == user_id
-            ]
+        cls.registry.remove_from_tables(user_id=user_id)
 
     @classmethod
     def send_message_through_user(cls, user_id: int, message: str):
@@ -313,20 +680,135 @@ class TCPGameHandler:
         connection = cls.get_connection_by_user(user_id)
         if not connection:
             return
-        cls.send_to_connection(connection.connection, message)
+        cls.send_data_to_connection(connection, cls.encode_message(message, connection=connection))
 
     @classmethod
     def send_to_connection(cls, connection: socketserver.BaseRequestHandler, message: str):
-        logger.debug(f"Debug: {str(message).encode('utf-8')}")
-        connection.request.send(str(message).encode('utf-8'))
+        """
+        Direct write for connections without outbound queue (auth failures)
+        :param connection:
+        :param message:
+        :return:
+        """
+        connection.request.send(cls.encode_message(message))
 
     @classmethod
-    def get_table_connections(cls, table_key) -> Optional[TableConnections]:
-        connections = (table for table in cls.table_connections if table['table_key'] == table_key)
+    def send_data_to_connection(cls, connection: TCPGameConnection, data: bytes):
+        """
+        Queue already encoded message, the same buffer can be sent to many connections.
+        Never blocks on the socket, slow clients get overflow policy instead
+        :param connection:
+        :param data:
+        :return:
+        """
+        logger.debug(f"Debug: {data}")
+        with cls.metrics.phase(PHASE_SEND):
+            if connection.outbound is None:
+                connection.connection.request.send(data)
+                return
+            if not connection.outbound.put(data):
+                cls._on_outbound_overflow(connection)
+
+    @classmethod
+    def open_outbound_queue(cls, connection: socketserver.BaseRequestHandler) -> OutboundQueue:
+        """
+        Bounded outbound queue drained by the writer of the server mode:
+        asyncio connections drain it in event loop task, threaded sockets in the shared writer thread
+        :param connection:
+        :return:
+        """
+        queue = OutboundQueue(max_bytes=cls.OUTBOUND_QUEUE_MAX_BYTES)
+        start_writer = getattr(connection, 'start_outbound_writer', None)
+        if start_writer:
+            start_writer(queue)
+        else:
+            cls.outbound_writer.register(queue, connection.request)
+        return queue
+
+    @classmethod
+    def _on_outbound_overflow(cls, connection: TCPGameConnection):
+        """
+        Client does not read fast enough, other players of the table do not wait for it.
+        snapshot: queued messages are dropped and every table of connection gets a fresh snapshot,
+        disconnect: connection is closed, reader loop does the cleanup
+        :param connection:
+        :return:
+        """
+        user_id = connection.user.id
+        dropped = connection.outbound.clear()
+        info(f"Outbound queue overflow, user_id: {user_id}, dropped: {dropped}, "
+             f"policy: {cls.OUTBOUND_OVERFLOW_POLICY}")
+        if cls.OUTBOUND_OVERFLOW_POLICY == OVERFLOW_DISCONNECT:
+            return cls.close_connection(connection)
+        table_keys = list(connection.table_versions)
+        connection.table_versions.clear()
+        for table_key in table_keys:
+            cls.table_actors.submit(table_key, cls._send_table_status_to_user, table_key, user_id)
+
+    @classmethod
+    def close_connection(cls, connection: TCPGameConnection):
+        """
+        Close socket from any thread, reader loop wakes up and stops
+        :param connection:
+        :return:
+        """
+        if connection.outbound:
+            connection.outbound.close()
         try:
-            return next(connections)
-        except StopIteration:
-            return None
+            connection.connection.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    @classmethod
+    def send_ping(cls, connection: TCPGameConnection):
+        message = cls.protocol().format_response(PING_COMMAND, int(time.time()))
+        cls.send_data_to_connection(connection, cls.encode_message(message, connection=connection))
+
+    @classmethod
+    def on_ping(cls, user_id: int):
+        """
+        Client side heartbeat, answered with PONG
+        :param user_id:
+        :return:
+        """
+        cls.send_message_through_user(user_id, cls.protocol().format_response(PONG_COMMAND, int(time.time())))
+
+    @classmethod
+    def outbound_queue_depths(cls) -> Dict[int, int]:
+        """
+        user_id -> messages waiting in outbound queue
+        :return:
+        """
+        return {user_id: connection.queue_depth for user_id, connection in list(cls.registry.by_user.items())}
+
+    @staticmethod
+    def encode_message(message, connection: Optional[TCPGameConnection] = None) -> bytes:
+        """
+        Wire format of outbound messages, binary connections get every message in a frame
+        :param message:
+        :param connection:
+        :return:
+        """
+        if connection and connection.encoding is BINARY_ENCODING:
+            payload = message if isinstance(message, bytes) else str(message).encode('utf-8')
+            return binary_protocol.frame(binary_protocol.FRAME_TEXT, payload)
+        return str(message).encode('utf-8')
+
+    @staticmethod
+    def encode_table_status(payload: bytes, connection: TCPGameConnection) -> bytes:
+        """
+        Wire format of table status payload rendered in connection encoding
+        :param payload:
+        :param connection:
+        :return:
+        """
+        if connection.encoding is BINARY_ENCODING:
+            return binary_protocol.frame(binary_protocol.FRAME_TABLE_STATUS, payload)
+        return str(payload).encode('utf-8')
+
+    @classmethod
+    def get_table_connections(cls, table_key) -> List[TCPGameConnection]:
+        return cls.registry.table_connections(table_key=table_key)
 
     @classmethod
     def _send_error(cls, user_id: int, error_code: str):
@@ -353,64 +835,303 @@ class TCPGameHandler:
 
         return True, None
 
+    @classmethod
+    def get_event_bus(cls) -> TableEventBus:
+        """
+        Table event bus of this node, created on first use, so forked workers are separate nodes
+        :return:
+        """
+        if cls.event_bus is None:
+            with cls.event_bus_lock:
+                if cls.event_bus is None:
+                    event_bus = get_table_event_bus(
+                        cls.TABLE_EVENT_BUS,
+                        dumps=TableStatusBroadcast.dumps,
+                        loads=TableStatusBroadcast.loads,
+                        directory=cls.TABLE_EVENT_BUS_DIR
+                    )
+                    cls.event_bus = event_bus
+                    event_bus.subscribe(cls.on_table_event)
+        return cls.event_bus
+
+    @classmethod
+    def start_metrics_admin(cls, port_offset: int = 0) -> Optional[MetricsAdminServer]:
+        """
+        Dump metrics on local admin port: `nc 127.0.0.1 <port>`, `echo json | nc 127.0.0.1 <port>`
+        :param port_offset: sharded workers listen on the next ports
+        :return:
+        """
+        if not cls.METRICS_ADMIN_PORT:
+            return None
+        server = MetricsAdminServer(
+            cls.metrics,
+            port=cls.METRICS_ADMIN_PORT + port_offset,
+            stats={'scheduler': cls.scheduler.stats}
+        )
+        server.start()
+        return server
+
+    @classmethod
+    @contextlib.contextmanager
+    def command_context(cls):
+        """
+        Context of every table actor command: metrics sample around the command and its status publishing,
+        one transaction per command, savepoint when the command is part of a batch.
+        Writes of in-memory hands are flushed before the end of the transaction
+        :return:
+        """
+        with cls.metrics.sample():
+            with cls.table_status_batch():
+                with transaction.atomic():
+                    with cls.game.hand_context():
+                        yield
+
+    @classmethod
+    @contextlib.contextmanager
+    def batch_context(cls):
+        """
+        Commands of one table drained together: one commit and one status publishing per changed table
+        after the commit.
+        If the commit fails, changed tables are reset to the committed state and their players get a snapshot
+        :return:
+        """
+        with cls.table_status_batch():
+            try:
+                with transaction.atomic():
+                    yield
+            except Exception:
+                for table_key in cls.status_batch.tables:
+                    cls._reset_table_state(table_key)
+                raise
+
+    @classmethod
+    def _reset_table_state(cls, table_key: str):
+        """
+        In-memory hand is loaded again from DB, connections get snapshot instead of delta on the next status
+        :param table_key:
+        :return:
+        """
+        cls.game.drop_hand(table_key)
+        for connection in cls.get_table_connections(table_key=table_key):
+            connection.table_versions[table_key] = None
+
+    @classmethod
+    @contextlib.contextmanager
+    def table_status_batch(cls):
+        """
+        Table command context: status of every changed table is published once after the command,
+        however many times the command changed it
+        :return:
+        """
+        if getattr(cls.status_batch, 'tables', None) is not None:
+            yield
+            return
+        cls.status_batch.tables = {}
+        try:
+            yield
+        finally:
+            tables, cls.status_batch.tables = cls.status_batch.tables, None
+            if tables:
+                with cls.metrics.measure(TABLE_STATUS_METRIC):
+                    for table_key in tables:
+                        cls._publish_table_status(table_key)
+
     @classmethod
     def _send_table_status(cls, table_key: str):
         """
-        Send table status for all players
+        Send table status for all players, batched inside table command
         :param table_key:
         :return:
         """
-        table = cls.game.get_table_from_db(table_key=table_key)
-        table_connections: TableConnections = cls.get_table_connections(table_key=table_key)
-        for connection in table_connections['connections']:
-            message = out_game_protocol.table_status(
-                current_user=connection.user,
-                table_model=table
+        tables = getattr(cls.status_batch, 'tables', None)
+        if tables is not None:
+            tables[table_key] = None
+            return
+        cls._publish_table_status(table_key)
+
+    @classmethod
+    def _publish_table_status(cls, table_key: str):
+        """
+        Serialize table status once and publish it to broker nodes of the table
+        :param table_key:
+        :return:
+        """
+        event_bus = cls.get_event_bus()
+        if (
+                not event_bus.distributed
+                and not cls.registry.by_table.get(table_key)
+                and not cls.spectators.has_table(table_key)
+        ):
+            return
+        with cls.metrics.phase(PHASE_SERIALIZE):
+            table = cls.game.get_table_from_db(table_key=table_key)
+            broadcast = out_game_protocol.table_status_broadcast(
+                table_model=table,
+                state_versions=cls.table_versions
             )
-            cls.send_to_connection(connection=connection.connection, message=message)
+        event_bus.publish(table_key, broadcast)
 
     @classmethod
-    def _send_table_status_to_user(cls, table_key: str, user_id: str):
-        table = cls.game.get_table_from_db(table_key=table_key)
-        table_connections: TableConnections = cls.get_table_connections(table_key=table_key)
-        connections = (connection for connection in table_connections['connections'] if connection.user.id == user_id)
+    def on_table_event(cls, event: TableEvent):
+        """
+        Table event of this or another broker node.
+        Local event is already in the table actor, remote one is moved there
+        :param event:
+        :return:
+        """
+        if event.origin == cls.event_bus.node_id:
+            return cls._deliver_table_status(event.table_key, event.message)
+        cls.table_actors.submit(event.table_key, cls._deliver_table_status, event.table_key, event.message, True)
+
+    @classmethod
+    def _deliver_table_status(cls, table_key: str, broadcast: TableStatusBroadcast, remote: bool = False):
+        """
+        Send table status to connections of this node.
+        Connections with `delta` option get only changes from the version they already have,
+        spectators get the latest public status from the fan-out thread.
+        Versions are counted by every node on its own, so status of another node is always a snapshot
+        and the next status of this node is a snapshot above its version
+        :param table_key:
+        :param broadcast:
+        :param remote: broadcast of another broker node
+        :return:
+        """
+        if remote:
+            cls.table_versions.reset_base(table_key, broadcast.version)
+        cls.spectators.publish(table_key, broadcast)
+        connections = cls.get_table_connections(table_key=table_key)
+        encoded = {}
+        for connection in connections:
+            message = cls._table_status_message(connection, table_key, broadcast, remote)
+            if message is None:
+                continue
+            user_id = connection.user.id
+            encoding = connection.encoding
+            key = (id(message), encoding.name, user_id if message.has_private_cards(user_id, encoding) else None)
+            if key not in encoded:
+                with cls.metrics.phase(PHASE_SERIALIZE):
+                    encoded[key] = cls.encode_table_status(message.for_user(user_id, encoding), connection)
+            cls.send_data_to_connection(connection=connection, data=encoded[key])
+
+    @classmethod
+    def _table_status_message(
+            cls,
+            connection: TCPGameConnection,
+            table_key: str,
+            broadcast: TableStatusBroadcast,
+            remote: bool = False
+    ) -> Optional[TableStatusBroadcast]:
+        """
+        Choose snapshot or delta for connection
+        :param connection:
+        :param table_key:
+        :param broadcast:
+        :param remote: broadcast of another broker node, its version is not comparable with versions of this node
+        :return: None if connection already has this version
+        """
+        if remote:
+            # connection has state which is not a version of this node, the next status is a snapshot
+            connection.table_versions[table_key] = None
+            return broadcast
+        sent_version = connection.table_versions.get(table_key)
+        connection.table_versions[table_key] = broadcast.version
+        if not connection.accepts_delta:
+            return broadcast
+        if sent_version == broadcast.version:
+            return None
+        if broadcast.delta is not None and sent_version == broadcast.version - 1:
+            return broadcast.delta
+        return broadcast
+
+    @classmethod
+    def load_table_status(cls, table_key: str) -> Optional[TableStatusBroadcast]:
+        """
+        Table status without version, for the first spectator of the table
+        :param table_key:
+        :return: None if there is no such table
+        """
         try:
-            connection = next(connections)
-            message = out_game_protocol.table_status(
-                current_user=connection.user,
-                table_model=table
+            table = cls.game.get_table_from_db(table_key=table_key)
+        except Table.DoesNotExist:
+            return None
+        return out_game_protocol.table_status_broadcast(table_model=table)
+
+    @classmethod
+    def _send_table_status_to_user(cls, table_key: str, user_id: str):
+        """
+        Full table snapshot for one user, used for joins and resync of delta clients
+        :param table_key:
+        :param user_id:
+        :return:
+        """
+        connection = cls.registry.table_connection(table_key=table_key, user_id=user_id)
+        if not connection:
+            return
+        with cls.metrics.phase(PHASE_SERIALIZE):
+            table = cls.game.get_table_from_db(table_key=table_key)
+            broadcast = out_game_protocol.table_status_broadcast(
+                table_model=table,
+                state_versions=cls.table_versions
             )
-            cls.send_to_connection(connection=connection.connection, message=message)
-        except StopIteration:
-            pass
+            data = cls.encode_table_status(broadcast.for_user(user_id, connection.encoding), connection)
+        connection.table_versions[table_key] = broadcast.version
+        cls.send_data_to_connection(connection=connection, data=data)
 
     @classmethod
     def remove_player_from_game(cls, user_id: int):
+        cls.game.sync_user_hand(user_id)
         player = PlayerGame.objects.filter(user_id=user_id).first()
         if player and player.game:
             table_key = player.game.table.key
-            return cls.game.leave_game(table_key, user_id)
+            cls.game.leave_game(table_key, user_id)
+            return cls._check_turn_after_leave(table_key=table_key)
 
         if player:
             player.delete()
 
     @classmethod
     def remove_not_active_user(cls, user_id: int):
+        cls.game.sync_user_hand(user_id)
         player = PlayerGame.objects.filter(user_id=user_id).first()
         if player and not player.game:
             table_key = player.table.key
-            return cls.game.leave_game(table_key, user_id)
+            cls.game.leave_game(table_key, user_id)
+            return cls._check_turn_after_leave(table_key=table_key)
 
         if player:
             player.delete()
 
+    @classmethod
+    def remove_not_active_users(cls, user_ids: List[int]):
+        """
+        remove_not_active_user for many users with one query
+        :param user_ids:
+        :return:
+        """
+        for user_id in user_ids:
+            cls.game.sync_user_hand(user_id)
+        players = {}
+        for player in PlayerGame.objects.filter(user_id__in=user_ids).select_related('table').order_by('pk'):
+            players.setdefault(player.user_id, player)
+        table_keys = set()
+        for user_id, player in players.items():
+            if not player.game_id:
+                cls.game.leave_game(player.table.key, user_id)
+                table_keys.add(player.table.key)
+            else:
+                player.delete()
+        for table_key in table_keys:
+            cls._check_turn_after_leave(table_key=table_key)
+
     @classmethod
     def user_reconnection(cls, user_id: int):
+        cls.game.sync_user_hand(user_id)
         player = PlayerGame.objects.filter(user_id=user_id).first()
         if player and player.game:
             table_key = player.game.table.key
             cls.game.leave_game(table_key, user_id)
             cls._send_table_status(table_key=table_key)
+            cls._check_turn_after_leave(table_key=table_key)
 
     @classmethod
     def on_leave_game(cls, *args):
@@ -426,9 +1147,12 @@ class TCPGameHandler:
         cls.game.leave_game(table_key, user_id)
         cls.remove_connection_through_user(user_id, table_key)
         cls.remove_not_active_user(user_id=user_id)
-        time.sleep(1)
-        print('sending _send_table_status')
-        cls._send_table_status(table_key=table_key)
+        cls._check_turn_after_leave(table_key=table_key)
+        cls._defer(table_key, cls.LEAVE_STATUS_DELAY, cls._send_table_status, table_key)
+
+
+TCPGameHandler.table_actors.command_context = TCPGameHandler.command_context
+TCPGameHandler.table_actors.batch_context = TCPGameHandler.batch_context
 
 
 class TCPBrokerConnections:
@@ -443,73 +1167,320 @@ class TCPBrokerConnections:
         commands.FOLD: 'on_fold',
         commands.AUTO_FOLD: 'on_auto_fold',
         commands.TABLE_STATUS: 'on_table_status',
+        SPECTATE_COMMAND: 'on_spectate',
+        STOP_SPECTATE_COMMAND: 'on_stop_spectate',
+    }
+
+    # commands with table_key in payload
+    table_key_commands = {
+        commands.JOIN_GAME,
+        commands.LEAVE_GAME,
+        commands.TABLE_STATUS,
     }
+    # commands for the table where user currently sits
+    user_table_commands = {
+        commands.BET,
+        commands.CHECK,
+        commands.FOLD,
+        commands.AUTO_FOLD,
+    }
+    # user_id -> table_key, updated when command is dispatched, so commands sent right after
+    # JOIN_GAME go to the same actor even before JOIN_GAME itself was processed
+    user_table_routes: Dict[int, str] = {}
+    # worker side of sharded server mode, None when one process serves all tables
+    table_shard: Optional[TableShardWorker] = None
+    # how long queued messages are written before connection is handed off to another worker
+    HANDOFF_FLUSH_TIMEOUT = 1
+    # parks readers between messages before hot restart
+    reader_gate = ReaderGate()
+    # socket token -> user, cached for AUTH_CACHE_TTL seconds and looked up in batches
+    token_auth = TokenAuthCache(
+        load=load_users_by_tokens,
+        ttl=float(os.environ.get("AUTH_CACHE_TTL", TokenAuthCache.TTL)),
+        max_jitter=float(os.environ.get("AUTH_ADMISSION_JITTER", TokenAuthCache.MAX_JITTER))
+    )
 
     SLEEP_TIME = 3
 
     @classmethod
-    def connect_user(cls, connection: socketserver.BaseRequestHandler, data: str):
+    def connect_user(cls, connection: socketserver.BaseRequestHandler, data: bytes):
         """
         establishes a connection with user by user unique token
         and appends connection to connections list, then listens new messages from user
         :param connection:
         :param data:
+        :return: True if connection was handed off to another worker
+        """
+        auth_data, pending = split_auth_message(data)
+        game_connection = cls.authenticate_connection(connection=connection, data=auth_data)
+        if not game_connection:
+            return False
+        return cls._serve_connection(game_connection, pending=pending)
+
+    @classmethod
+    def adopt_connection(cls, connection: socketserver.BaseRequestHandler, handoff: ConnectionHandoff) -> bool:
+        """
+        Sharded mode: continue connection authenticated by another worker,
+        not handled frames (JOIN_GAME of a table of this worker) are handled first
+        :param connection:
+        :param handoff:
+        :return: True if connection was handed off again
+        """
+        user = User.objects.filter(id=handoff.user_id).first()
+        if not user:
+            connection.finish()
+            return False
+        cls._close_active_connection(user)
+        game_connection = cls._connect(user=user, connection=connection, options=set(handoff.options))
+        info(f"User connection adopted: {user.id}, table: {handoff.table_key}")
+        return cls._serve_connection(game_connection, pending=handoff.pending, frames=handoff.frames)
+
+    @classmethod
+    def _serve_connection(
+            cls,
+            game_connection: TCPGameConnection,
+            pending: bytes = b'',
+            frames: Optional[List[bytes]] = None
+    ) -> bool:
+        """
+        Listen messages of authenticated connection and cleanup after it was closed
+        :param game_connection:
+        :param pending: received bytes which are not framed yet
+        :param frames: received frames which are not handled yet
+        :return: True if connection was handed off to another worker
+        """
+        user_id = game_connection.user.id
+        connection = game_connection.connection
+        if cls.listen_messages(
+                user_id,
+                connection,
+                framer=game_connection.framer,
+                pending=pending,
+                frames=frames,
+                game_connection=game_connection
+        ):
+            return True
+        cls.disconnect_user(user_id=user_id, game_connection=game_connection)
+        connection.finish()
+        return False
+
+    @classmethod
+    def dump_connections(cls) -> List[dict]:
+        """
+        Connections with parked readers and written outbound queues for hot restart,
+        other ones are closed by exec and their clients reconnect
         :return:
         """
+        states = []
+        for game_connection in cls.game_handler.registry.connections():
+            if not game_connection.parked:
+                continue
+            if game_connection.outbound is not None and not game_connection.outbound.is_flushed:
+                continue
+            user_id = game_connection.user.id
+            state = game_connection.dump_state(
+                table_keys=list(cls.game_handler.registry.user_tables.get(user_id, ())),
+                route=cls.user_table_routes.get(user_id)
+            )
+            state['spectating'] = cls.game_handler.spectators.watched_tables(user_id)
+            states.append(state)
+        return states
+
+    @classmethod
+    def resume_connections(cls, states: List[dict]):
+        """
+        Continue connections inherited from previous process, every one in its own reader thread
+        :param states: dump_connections() of previous process
+        :return:
+        """
+        for state in states:
+            connection = SocketRequestHandler(socket.socket(fileno=state['fd']))
+            connection.request.set_inheritable(False)
+            game_connection = cls.resume_connection(connection, state)
+            if game_connection is None:
+                connection.request.close()
+                continue
+            threading.Thread(
+                target=cls._serve_resumed_connection,
+                args=(game_connection, state['pending'].encode('latin-1')),
+                name=f'resumed-{game_connection.user.id}'
+            ).start()
+
+    @classmethod
+    def resume_connection(
+            cls,
+            connection: SocketRequestHandler,
+            state: dict
+    ) -> Optional[TCPGameConnection]:
+        """
+        Register inherited connection with its tables, table versions and command route
+        :param connection:
+        :param state:
+        :return:
+        """
+        user = User.objects.filter(id=state['user_id']).first()
+        if not user:
+            return None
+        game_connection = cls._connect(user=user, connection=connection, options=set(state['options']))
+        game_connection.table_versions.update(state['table_versions'])
+        for table_key in state['tables']:
+            cls.game_handler.registry.join_table(connection=game_connection, table_key=table_key)
+        if state['route']:
+            cls.user_table_routes[user.id] = state['route']
+        for table_key in state.get('spectating', ()):
+            cls.game_handler.spectators.subscribe(connection=game_connection, table_key=table_key, limited=False)
+        return game_connection
+
+    @classmethod
+    def _serve_resumed_connection(cls, game_connection: TCPGameConnection, pending: bytes):
+        sock = game_connection.connection.request
+        try:
+            cls._serve_connection(game_connection, pending=pending)
+        except Exception as e:
+            logger.exception(f"Resumed connection failed, user_id: {game_connection.user.id}: {e}")
+        finally:
+            sock.close()
+
+    @classmethod
+    def authenticate_connection(
+            cls,
+            connection: socketserver.BaseRequestHandler,
+            data: bytes
+    ) -> Optional[TCPGameConnection]:
+        """
+        Authenticate connection by the first message (AUTH_REQUEST) and run auth command.
+        Framing and other connection options are negotiated here: `AU|token|nl`.
+        Shared between threaded and asyncio servers
+        :param connection:
+        :param data: auth message
+        :return: authenticated connection or None
+        """
         protocol = cls.game_handler.protocol(data)
         parsed_data = protocol.auth_args()
         user_token = parsed_data.get('short_live_token')
-        user = cls._auth_user(user_token, connection=connection)
+        options = parse_connection_options(parsed_data.get('options'))
+        game_connection = cls._auth_user(user_token, connection=connection, options=options)
 
-        if not user:
+        if not game_connection:
             debug(f"Connection fail for token:{user_token}")
-            return cls._auth_fail(connection=connection)
-        info(f"User connected to server:{user.id}")
-        cls.handle_command(user_id=user.id, data=data)
-        cls.listen_messages(user.id, connection)
-        cls._remove_connections_by_user(user_id=user.id)
-        cls.game_handler.remove_not_active_user(user_id=user.id)
-        connection.finish()
+            cls._auth_fail(connection=connection)
+            return None
+        info(f"User connected to server:{game_connection.user.id}, options: {options}")
+        cls.handle_command(user_id=game_connection.user.id, data=data)
+        return game_connection
+
+    @classmethod
+    def disconnect_user(cls, user_id: int, game_connection: Optional[TCPGameConnection] = None):
+        """
+        Cleanup after user connection was closed.
+        Game cleanup runs in the table actor, so it is ordered with other table commands
+        :param user_id:
+        :param game_connection: closed connection, cleanup is skipped if user already reconnected
+        :return:
+        """
+        if game_connection and game_connection.outbound:
+            game_connection.outbound.close()
+        table_key = cls.game_handler.get_user_table_key(user_id=user_id)
+        if game_connection and not cls.game_handler.remove_connection_from_list(user_id, connection=game_connection):
+            return
+        route_table_key = cls.user_table_routes.pop(user_id, None)
+        table_key = table_key or route_table_key
+        cls._remove_connections_by_user(user_id=user_id)
+        if table_key:
+            return cls.game_handler.table_actors.submit(table_key, cls.game_handler.remove_not_active_user, user_id)
+        cls.game_handler.remove_not_active_user(user_id=user_id)
+
+    @classmethod
+    def expire_connections(cls, connections: List[TCPGameConnection]):
+        """
+        Heartbeat timeout: close stale connections and remove not active users in one batch per table
+        :param connections:
+        :return:
+        """
+        users_by_table: Dict[Optional[str], List[int]] = {}
+        for game_connection in connections:
+            user_id = game_connection.user.id
+            table_key = cls.game_handler.get_user_table_key(user_id=user_id)
+            if not cls.game_handler.remove_connection_from_list(user_id, connection=game_connection):
+                continue
+            route_table_key = cls.user_table_routes.pop(user_id, None)
+            cls.game_handler.remove_user_from_tables_connections(user_id=user_id)
+            cls.game_handler.close_connection(game_connection)
+            users_by_table.setdefault(table_key or route_table_key, []).append(user_id)
+        info(f"Heartbeat timeout, disconnected users: {users_by_table}")
+        for table_key, user_ids in users_by_table.items():
+            if table_key:
+                cls.game_handler.table_actors.submit(table_key, cls.game_handler.remove_not_active_users, user_ids)
+            else:
+                cls.game_handler.remove_not_active_users(user_ids)
 
     @classmethod
-    def _auth_user(cls, user_token: str, connection: socketserver.BaseRequestHandler) -> Optional["models.User"]:
+    def _auth_user(
+            cls,
+            user_token: str,
+            connection: socketserver.BaseRequestHandler,
+            options: Optional[Set[str]] = None
+    ) -> Optional[TCPGameConnection]:
         """
         Auth user|Reconnect to current table
         :param connection: tcp connection
         :param user_token: string user token
+        :param options: negotiated connection options
         :return:
         """
-        user = User.objects.filter(socket_access_token=user_token).first()
+        user = cls.token_auth.get(user_token)
         if not user:
             cls.game_handler.send_to_connection(connection=connection, message=commands.AUTH_FAILED)
             connection.finish()
             return
+        cls._close_active_connection(user)
+
+        return cls._connect(
+            user=user,
+            connection=connection,
+            options=options
+        )
+
+    @classmethod
+    def _close_active_connection(cls, user: "models.User"):
+        """
+        Close previous connection of reconnected user
+        :param user:
+        :return:
+        """
         active_connection = cls.game_handler.get_connection_by_user(user_id=user.id)
         if active_connection is not None:
             cls._remove_connections_by_user(user_id=user.id)
             active_connection.connection.finish()
             debug(f"Finished connected user prev: {user.email}")
 
-        print(cls.game_handler.connections, "connections")
-        return cls._connect(
-            user=user,
-            connection=connection
-        )
-
     @classmethod
-    def _connect(cls, user: "models.User", connection: socketserver.BaseRequestHandler):
+    def _connect(
+            cls,
+            user: "models.User",
+            connection: socketserver.BaseRequestHandler,
+            options: Optional[Set[str]] = None
+    ) -> TCPGameConnection:
         """
         When connection happens:
         1. Remove current connections from existing tables
         2. Add connection to new list
         :param user:
         :param connection:
+        :param options:
         :return:
         """
-        cls.game_handler.connections.append(
-            TCPGameConnection(connection=connection, user=user)
+        game_connection = TCPGameConnection(connection=connection, user=user, options=options)
+        game_connection.outbound = cls.game_handler.open_outbound_queue(connection)
+        if not game_connection.heartbeat and isinstance(connection.request, socket.socket):
+            enable_keepalive(connection.request)
+        cls.game_handler.add_connection(game_connection)
+        cls.game_handler.heartbeat.start(
+            connections=cls.game_handler.registry.connections,
+            ping=cls.game_handler.send_ping,
+            expire=cls.expire_connections
         )
-        return user
+        return game_connection
 
     @classmethod
     def _auth_fail(cls, connection):
@@ -528,52 +1499,189 @@ class TCPBrokerConnections:
         cls.game_handler.remove_user_from_tables_connections(user_id=user_id)
 
     @classmethod
-    def listen_messages(cls, user_id: int, connection: socketserver.BaseRequestHandler):
+    def listen_messages(
+            cls,
+            user_id: int,
+            connection: socketserver.BaseRequestHandler,
+            framer: Optional[MessageFramer] = None,
+            pending: bytes = b'',
+            frames: Optional[List[bytes]] = None,
+            game_connection: Optional[TCPGameConnection] = None
+    ) -> bool:
         """
-        listen messages from players and move data to command handler
+        listen messages from players and move every complete frame to command handler.
+        Blocks in recv() without polling, dead peers are closed by heartbeat sweeper or TCP keepalive.
+        With enabled reader gate it waits in poll() and parks between messages before hot restart
         :param connection: socketserver.BaseRequestHandler instance
         :param user_id: int user pk
-        :return:
+        :param framer: negotiated connection framer, raw recv() per command by default
+        :param pending: bytes received together with auth message
+        :param frames: frames received before, handled first
+        :param game_connection: its last seen time is updated on every received chunk
+        :return: True if connection was handed off to another worker
         """
+        framer = framer or RawFramer()
         try:
+            frames = list(frames or []) + (framer.feed(pending) if pending else [])
             while cls.receive_listener_active:
-                if cls.is_socket_closed(connection):
+                if cls.handle_frames(user_id, connection, framer, frames):
+                    return True
+                if not cls.reader_gate.wait_readable(connection.request):
+                    cls.reader_gate.park(game_connection)
+                frames = framer.recv_frames(connection.request)
+                if frames is None:
                     debug(f"Connection closed for user_id: {user_id}")
                     break
-                if data := connection.request.recv(1024):
-                    debug(f"Receive message at {datetime.datetime.now()}")
-                    cls.handle_command(user_id, data)
-        except ConnectionResetError as e:
+                if game_connection:
+                    game_connection.touch()
+                debug(f"Receive {len(frames)} messages at {datetime.datetime.now()}")
+        except (ConnectionResetError, TimeoutError) as e:
             debug(f"Connection closed for user_id: {user_id}")
+        except FrameTooLargeError as e:
+            debug(f"Connection closed for user_id: {user_id}, {e}")
+        return False
+
+    @classmethod
+    def handle_frames(
+            cls,
+            user_id: int,
+            connection: socketserver.BaseRequestHandler,
+            framer: MessageFramer,
+            frames: List[bytes]
+    ) -> bool:
+        """
+        Handle frames received together, commands of one table are run by its actor as one batch
+        :param user_id:
+        :param connection:
+        :param framer:
+        :param frames:
+        :return: True if connection was handed off to another worker
+        """
+        if not frames:
+            return False
+        with cls.game_handler.table_actors.hold_drains() if len(frames) > 1 else contextlib.nullcontext():
+            for index, frame in enumerate(frames):
+                if cls.hand_off_connection(user_id, connection, framer, frames[index:]):
+                    return True
+                cls.handle_command(user_id, frame)
+        return False
 
     @classmethod
-    def handle_command(cls, user_id: int, data: str):
+    def hand_off_connection(
+            cls,
+            user_id: int,
+            connection: socketserver.BaseRequestHandler,
+            framer: MessageFramer,
+            frames: List[bytes]
+    ) -> bool:
         """
-        commands handler for handling player commands like JG, CG and other
+        Sharded mode: JOIN_GAME of a table owned by another worker moves connection to that worker,
+        the frame itself and everything received after it are handled there
+        :param user_id:
+        :param connection:
+        :param framer:
+        :param frames: current frame and not handled frames after it
+        :return: True if connection was handed off
+        """
+        if cls.table_shard is None:
+            return False
+        protocol = cls.game_handler.protocol(frames[0])
+        if protocol.parse_command() != commands.JOIN_GAME:
+            return False
+        table_key = protocol.parse_join_game_data().get('table_key')
+        game_connection = cls.game_handler.get_connection_by_user(user_id)
+        if not table_key or cls.table_shard.owns(table_key) or game_connection is None:
+            return False
+        cls._flush_outbound(game_connection)
+        game_connection.outbound.close()
+        cls.game_handler.remove_connection_from_list(user_id, connection=game_connection)
+        cls.user_table_routes.pop(user_id, None)
+        handoff = ConnectionHandoff(
+            user_id=user_id,
+            options=sorted(game_connection.options),
+            table_key=table_key,
+            frames=frames,
+            pending=bytes(framer.buffer)
+        )
+        cls.table_shard.hand_off(connection.request, handoff)
+        info(f"User connection handed off: {user_id}, table: {table_key}")
+        return True
+
+    @classmethod
+    def _flush_outbound(cls, game_connection: TCPGameConnection):
+        """
+        Wait until queued messages are written, so the next worker continues the stream
+        from the message boundary. Stalled client gets its messages dropped
+        :param game_connection:
+        :return:
+        """
+        deadline = time.monotonic() + cls.HANDOFF_FLUSH_TIMEOUT
+        while not game_connection.outbound.is_flushed:
+            if time.monotonic() > deadline:
+                info(f"Outbound queue is not flushed before handoff, user_id: {game_connection.user.id}")
+                return
+            time.sleep(0.005)
+
+    @classmethod
+    def handle_command(cls, user_id: int, data: bytes):
+        """
+        commands handler for handling player commands like JG, CG and other.
+        Frame is parsed once, handlers get ParsedCommand
         :param data:
         :param user_id: user id
         :return:
         """
+        started = time.perf_counter()
         protocol = cls.game_handler.protocol(data)
         command = protocol.parse_command()
+        if command == PONG_COMMAND:
+            return
+        if command == PING_COMMAND:
+            return cls.game_handler.on_ping(user_id)
         method = cls.proxy_methods.get(command)
         if method:
             info(f"Receive data from tcp_client, user_id: {user_id}, data: {data},method: "
                  f"{method}, time: {datetime.datetime.now()}")
 
-            getattr(cls.game_handler, method)(user_id, data)
+            handler = getattr(cls.game_handler, method)
+            metrics = cls.game_handler.metrics
+            table_key = cls.get_command_table_key(user_id=user_id, command=command, protocol=protocol)
+            metrics.record(method, PHASE_PARSE, time.perf_counter() - started)
+            parsed = protocol.parsed
+            if table_key:
+                return cls.game_handler.table_actors.submit(table_key, metrics.label, method, handler, user_id, parsed)
+            with metrics.sample(method):
+                handler(user_id, parsed)
 
     @classmethod
-    def is_socket_closed(cls, connection: socketserver.BaseRequestHandler) -> bool:
-        try:
-            # this will try to read bytes without blocking and also without removing them from buffer (peek only)
-            data = connection.request.recv(16, socket.MSG_DONTWAIT | socket.MSG_PEEK)
-            if len(data) == 0:
-                return True
-        except BlockingIOError:
-            return False  # socket is open and reading from it would block
-        except ConnectionResetError:
-            return True  # socket was closed for some other reason
-        except Exception as e:
-            return False
-        return False
+    def get_command_table_key(cls, user_id: int, command: str, protocol: GameConnectionProtocol) -> Optional[str]:
+        """
+        Table which actor has to run the command, None for commands without table
+        :param user_id:
+        :param command:
+        :param protocol:
+        :return:
+        """
+        if command in cls.table_key_commands:
+            table_key = protocol.parse_join_game_data().get('table_key')
+            if command == commands.JOIN_GAME and table_key:
+                cls.user_table_routes[user_id] = table_key
+            return table_key
+        if command in cls.user_table_commands:
+            return cls.user_table_routes.get(user_id) or cls.game_handler.get_user_table_key(user_id=user_id)
+        return None
+
+
+def invalidate_user_auth(sender, instance: User, **kwargs):
+    """
+    Changed or deleted user is loaded again on the next auth
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    TCPBrokerConnections.token_auth.invalidate(user_id=instance.id)
+
+
+post_save.connect(invalidate_user_auth, sender=User, dispatch_uid='tcp_broker_invalidate_user_auth')
+post_delete.connect(invalidate_user_auth, sender=User, dispatch_uid='tcp_broker_invalidate_user_auth')
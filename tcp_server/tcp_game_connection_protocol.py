@@ -1,4 +1,4 @@
-from typing import Tuple, TypedDict
+from typing import List, Tuple, TypedDict
 from poker_game.textchoices import UserRoleTypeChoice
 
 from tcp_server.enums import commands
@@ -8,6 +8,7 @@ from tcp_server.enums.errors import GameErrors
 class AuthArgs(TypedDict):
     command_type: str
     short_live_token: str
+    options: str
 
 
 class JGArgs(TypedDict):
@@ -30,6 +31,28 @@ class BTArgs(TypedDict):
     amount: str
 
 
+class ParsedCommand:
+    """
+    Inbound frame parsed once: command and `|` separated arguments, passed to handlers instead of raw bytes
+    """
+    DM = '|'
+    __slots__ = ('values',)
+
+    def __init__(self, values: List[str]):
+        self.values = values
+
+    @classmethod
+    def parse(cls, frame: bytes) -> "ParsedCommand":
+        return cls(frame.decode('utf-8').split(cls.DM))
+
+    @property
+    def command(self) -> str:
+        return self.values[0]
+
+    def __repr__(self):
+        return self.DM.join(self.values)
+
+
 class GameConnectionProtocolMessages:
     BET = "{user_id}:{username}:{amount}|{next_player_id}|{can_check}:{can_bet}"
     CHECK = "{user_id}:{next_player_turn}|{can_check}:{can_bet}"
@@ -40,9 +63,22 @@ class GameConnectionProtocol:
     DM = '|'
     FORMAT_MESSAGE = '\n<PokerGame>{0}</PokerGame>'
 
+    messages = GameConnectionProtocolMessages
+
     def __init__(self, data=None):
         self.data = data
-        self.messages = GameConnectionProtocolMessages
+        self._parsed = data if data.__class__ is ParsedCommand else None
+
+    @property
+    def parsed(self) -> ParsedCommand:
+        """
+        Frame is parsed on first use, handlers get already parsed command
+        :return:
+        """
+        parsed = self._parsed
+        if parsed is None:
+            parsed = self._parsed = ParsedCommand.parse(self.data)
+        return parsed
 
     def join_game(self, user_id, username, cash, table_slot):
         """
@@ -79,7 +115,7 @@ class GameConnectionProtocol:
         Arguments from user auth
         :return:
         """
-        return self._parse_data(('command_type', 'short_live_token'))
+        return self._parse_data(('command_type', 'short_live_token', 'options'))
 
     def parse_join_game_data(self) -> JGArgs:
         """
@@ -114,8 +150,7 @@ class GameConnectionProtocol:
         Parse command type from data
         :return:
         """
-        data = self.data.decode('utf-8').split(self.DM)
-        return data[0]
+        return self.parsed.command
 
     @staticmethod
     def parse_cards(cards_list: dict):
@@ -331,5 +366,4 @@ class GameConnectionProtocol:
         :param keys_list: dict with parsed data
         :return:
         """
-        data = self.data.decode('utf-8').split(self.DM)
-        return dict(zip(keys_list, data))
+        return dict(zip(keys_list, self.parsed.values))
@@ -0,0 +1,168 @@
+import struct
+from typing import List, Optional, Set, Tuple, Union
+
+ReadableBuffer = Union[bytes, bytearray, memoryview]
+
+OPTIONS_DM = ','
+
+FRAMING_RAW = 'raw'
+FRAMING_NEWLINE = 'nl'
+FRAMING_LENGTH_PREFIXED = 'lp'
+
+
+class FrameTooLargeError(Exception):
+    pass
+
+
+class MessageFramer:
+    """
+    Base framer with per-connection reusable receive buffer.
+    `feed` accepts any chunk from socket and returns all complete frames from it in a single pass,
+    incomplete tail stays in the buffer until the next chunk.
+    """
+    name: str = None
+    MAX_FRAME_SIZE = 64 * 1024
+    READ_SIZE = 4096
+
+    def __init__(self, max_frame_size: Optional[int] = None):
+        self.max_frame_size = max_frame_size or self.MAX_FRAME_SIZE
+        self.buffer = bytearray()
+        self.read_buffer = bytearray(self.READ_SIZE)
+        self.read_view = memoryview(self.read_buffer)
+
+    def feed(self, data: ReadableBuffer) -> List[bytes]:
+        """
+        Append received chunk and return complete frames
+        :param data:
+        :return:
+        """
+        self.buffer += data
+        frames, consumed = self._split(self.buffer)
+        if consumed:
+            del self.buffer[:consumed]
+        if len(self.buffer) > self.max_frame_size:
+            raise FrameTooLargeError(f'Frame exceeded {self.max_frame_size} bytes')
+        return frames
+
+    def recv_frames(self, sock) -> Optional[List[bytes]]:
+        """
+        Read from blocking socket into reusable buffer.
+        :param sock: socket
+        :return: list of frames or None if connection closed
+        """
+        size = sock.recv_into(self.read_buffer)
+        if not size:
+            return None
+        return self.feed(self.read_view[:size])
+
+    def encode(self, payload: bytes) -> bytes:
+        """
+        Wrap outbound payload into frame
+        :param payload:
+        :return:
+        """
+        return payload
+
+    def _split(self, buffer: bytearray) -> Tuple[List[bytes], int]:
+        raise NotImplementedError
+
+
+class RawFramer(MessageFramer):
+    """
+    Legacy mode: every recv() is treated as exactly one command
+    """
+    name = FRAMING_RAW
+
+    def _split(self, buffer: bytearray) -> Tuple[List[bytes], int]:
+        if not buffer:
+            return [], 0
+        return [bytes(buffer)], len(buffer)
+
+
+class NewlineFramer(MessageFramer):
+    """
+    Newline-delimited commands: `BT|100\n`
+    """
+    name = FRAMING_NEWLINE
+    DELIMITER = b'\n'
+
+    def _split(self, buffer: bytearray) -> Tuple[List[bytes], int]:
+        frames = []
+        start = 0
+        while (end := buffer.find(self.DELIMITER, start)) != -1:
+            frame = bytes(buffer[start:end]).rstrip(b'\r')
+            if frame:
+                frames.append(frame)
+            start = end + 1
+        return frames, start
+
+    def encode(self, payload: bytes) -> bytes:
+        return payload + self.DELIMITER
+
+
+class LengthPrefixedFramer(MessageFramer):
+    """
+    Every command is prefixed with 4 bytes big-endian payload length
+    """
+    name = FRAMING_LENGTH_PREFIXED
+    HEADER = struct.Struct('!I')
+
+    def _split(self, buffer: bytearray) -> Tuple[List[bytes], int]:
+        frames = []
+        start = 0
+        header_size = self.HEADER.size
+        buffer_size = len(buffer)
+        while buffer_size - start >= header_size:
+            (length,) = self.HEADER.unpack_from(buffer, start)
+            if length > self.max_frame_size:
+                raise FrameTooLargeError(f'Frame {length} exceeded {self.max_frame_size} bytes')
+            end = start + header_size + length
+            if end > buffer_size:
+                break
+            frames.append(bytes(buffer[start + header_size:end]))
+            start = end
+        return frames, start
+
+    def encode(self, payload: bytes) -> bytes:
+        return self.HEADER.pack(len(payload)) + payload
+
+
+FRAMERS = {
+    FRAMING_RAW: RawFramer,
+    FRAMING_NEWLINE: NewlineFramer,
+    FRAMING_LENGTH_PREFIXED: LengthPrefixedFramer,
+}
+
+
+def parse_connection_options(options: Optional[str]) -> Set[str]:
+    """
+    Options negotiated with AUTH_REQUEST: `AU|token|nl` or `AU|token|lp`
+    :param options:
+    :return:
+    """
+    if not options:
+        return set()
+    return {option.strip().lower() for option in options.split(OPTIONS_DM) if option.strip()}
+
+
+def get_framer(options: Set[str]) -> MessageFramer:
+    """
+    Create framer for negotiated connection options, legacy raw mode by default
+    :param options:
+    :return:
+    """
+    for name in (FRAMING_LENGTH_PREFIXED, FRAMING_NEWLINE):
+        if name in options:
+            return FRAMERS[name]()
+    return RawFramer()
+
+
+def split_auth_message(data: bytes) -> Tuple[bytes, bytes]:
+    """
+    Auth message is always terminated by newline or by the end of the first chunk,
+    all bytes after it belong to the negotiated framing
+    :param data:
+    :return: auth message, pending bytes
+    """
+    auth_data, _, pending = data.partition(b'\n')
+    return auth_data.rstrip(b'\r'), pending
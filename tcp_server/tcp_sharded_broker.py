@@ -0,0 +1,81 @@
+import os
+import signal
+import socket
+from typing import Optional
+
+from tcp_server.logger import logger
+from tcp_server.table_sharding import ConnectionHandoff, TableShardMaster, TableShardWorker
+from tcp_server.tcp_broker import SocketRequestHandler, TCPBrokerConnections, create_poker_game
+
+
+class ShardedTCPBrokerConnections:
+    """
+    Worker process of sharded server mode.
+    Runs the same broker in threaded mode for tables owned by this worker, with its own PokerGame
+    """
+    broker = TCPBrokerConnections
+    READ_SIZE = 1024
+
+    def __init__(self, worker: TableShardWorker):
+        self.worker = worker
+
+    def run(self):
+        self.broker.table_shard = self.worker
+        self.broker.game_handler.table_shard = self.worker
+        self.broker.game_handler.game = create_poker_game()
+        self.broker.game_handler.get_event_bus()
+        self.broker.game_handler.start_metrics_admin(port_offset=self.worker.index + 1)
+        print(f'Table shard worker {self.worker.index} started, pid: {os.getpid()}')
+        self.worker.serve(self.handle_connection)
+
+    def handle_connection(self, sock: socket.socket, handoff: ConnectionHandoff):
+        """
+        New connection: auth and listen, connection from another worker: continue it
+        :param sock:
+        :param handoff:
+        :return:
+        """
+        connection = SocketRequestHandler(sock)
+        handed_off = False
+        try:
+            if handoff.is_new_connection:
+                data = sock.recv(self.READ_SIZE)
+                if data:
+                    handed_off = self.broker.connect_user(connection, data)
+            else:
+                handed_off = self.broker.adopt_connection(connection, handoff)
+        except Exception as e:
+            logger.exception(f"Worker {self.worker.index} connection failed: {e}")
+        finally:
+            if not handed_off:
+                sock.close()
+
+
+def run_worker(worker: TableShardWorker):
+    # master handles ctrl+c and stops workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ShardedTCPBrokerConnections(worker).run()
+
+
+def run_sharded_server(host: str, port: int, workers: Optional[int] = None):
+    """
+    Entry point for sharded server mode
+    :param host:
+    :param port:
+    :param workers: count of worker processes, cpu count by default
+    :return:
+    """
+    from django.db import connections
+
+    # forked workers must open their own database connections
+    connections.close_all()
+    master = TableShardMaster(host=host, port=port, workers=workers or os.cpu_count() or 1)
+    master.start(run_worker)
+    print(f'Sharded server IP: {host}; port: {port}; workers: {master.workers}')
+    try:
+        master.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        master.stop()
+        print('\nSharded TCP server close')
@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+from tcp_server.logger import logger
+
+
+class TurnTimeout:
+    __slots__ = ('key', 'slot', 'rounds', 'callback', 'args')
+
+    def __init__(self, key: Hashable, slot: int, rounds: int, callback: Callable, args: tuple):
+        self.key = key
+        self.slot = slot
+        self.rounds = rounds
+        self.callback = callback
+        self.args = args
+
+
+class HashedTimingWheel:
+    """
+    Hashed timing wheel for turn clocks.
+    One timer per key (table_key), arm and cancel are O(1),
+    one thread advances the wheel every tick for any number of timers.
+    """
+    TICK = 0.1
+    SLOTS = 512
+
+    def __init__(self, tick: Optional[float] = None, slots: Optional[int] = None):
+        self.tick = tick or self.TICK
+        self.slots_count = slots or self.SLOTS
+        self.slots: List[Dict[Hashable, TurnTimeout]] = [{} for _ in range(self.slots_count)]
+        self.timers: Dict[Hashable, TurnTimeout] = {}
+        self.lock = threading.Lock()
+        self.current_tick = 0
+        self.started_at = time.monotonic()
+        self.thread: Optional[threading.Thread] = None
+        self.running = True
+        self.expired = 0
+
+    def arm(self, key: Hashable, delay: float, callback: Callable, *args) -> TurnTimeout:
+        """
+        Arm timer for key, previous timer for the same key is cancelled
+        :param key:
+        :param delay: seconds
+        :param callback: called from the wheel thread, has to be short
+        :param args:
+        :return:
+        """
+        ticks = max(1, math.ceil(delay / self.tick))
+        with self.lock:
+            self._ensure_thread()
+            self._cancel(key)
+            slot = (self.current_tick + ticks) % self.slots_count
+            timer = TurnTimeout(
+                key=key,
+                slot=slot,
+                rounds=(ticks - 1) // self.slots_count,
+                callback=callback,
+                args=args
+            )
+            self.slots[slot][key] = timer
+            self.timers[key] = timer
+        return timer
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Cancel timer by key
+        :param key:
+        :return: True if timer was armed
+        """
+        with self.lock:
+            return self._cancel(key)
+
+    def is_armed(self, key: Hashable) -> bool:
+        return key in self.timers
+
+    @property
+    def pending_count(self) -> int:
+        return len(self.timers)
+
+    def stop(self):
+        self.running = False
+
+    def _cancel(self, key: Hashable) -> bool:
+        timer = self.timers.pop(key, None)
+        if not timer:
+            return False
+        self.slots[timer.slot].pop(key, None)
+        return True
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name='turn-timer', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while self.running:
+            target_tick = int((time.monotonic() - self.started_at) / self.tick)
+            while self.current_tick < target_tick:
+                self._advance()
+            next_tick_at = self.started_at + (self.current_tick + 1) * self.tick
+            time.sleep(max(0.0, next_tick_at - time.monotonic()))
+
+    def _advance(self):
+        expired = []
+        with self.lock:
+            self.current_tick += 1
+            bucket = self.slots[self.current_tick % self.slots_count]
+            for key, timer in list(bucket.items()):
+                if timer.rounds > 0:
+                    timer.rounds -= 1
+                    continue
+                del bucket[key]
+                del self.timers[key]
+                expired.append(timer)
+        for timer in expired:
+            self.expired += 1
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                logger.exception(f"Turn timer {timer.key} failed: {e}")
@@ -0,0 +1,42 @@
+import logging
+import os
+import sys
+import threading
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import tcp_server.logger  # noqa: F401
+except ImportError:
+    # server logger is configured by deployment, tests only need its interface
+    logger_module = types.ModuleType('tcp_server.logger')
+    logger_module.logger = logging.getLogger('tcp_server')
+    sys.modules['tcp_server.logger'] = logger_module
+
+
+class FakeAuthLoad:
+    """
+    TokenAuthCache load: records batches, optionally blocks until released
+    """
+    users = {'token-1': types.SimpleNamespace(id=1), 'token-2': types.SimpleNamespace(id=2)}
+
+    def __init__(self, block: bool = False):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self, tokens):
+        self.calls.append(sorted(tokens))
+        self.started.set()
+        assert self.release.wait(5)
+        return {token: self.users[token] for token in tokens if token in self.users}
+
+
+@pytest.fixture
+def auth_load():
+    return FakeAuthLoad
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from tcp_server.auth_cache import TokenAuthCache
+
+
+def get_in_threads(cache: TokenAuthCache, tokens: list):
+    results = [None] * len(tokens)
+
+    def get(index, token):
+        results[index] = cache.get(token)
+
+    threads = [threading.Thread(target=get, args=(index, token)) for index, token in enumerate(tokens)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_pending_lookup_is_deduplicated(auth_load):
+    load = auth_load(block=True)
+    cache = TokenAuthCache(load, batch_window=0.1, max_jitter=0)
+
+    threads, results = get_in_threads(cache, ['token-1'] * 5 + ['token-2', 'unknown'])
+    assert load.started.wait(5)
+    load.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert load.calls == [['token-1', 'token-2', 'unknown']]
+    assert results == [load.users['token-1']] * 5 + [load.users['token-2'], None]
+    assert cache.stats()['batches'] == 1
+
+
+def test_same_token_shares_pending_future(auth_load):
+    load = auth_load(block=True)
+    cache = TokenAuthCache(load, batch_window=0.1, max_jitter=0)
+
+    future = cache._lookup('token-1')
+    assert cache._lookup('token-1') is future
+    load.release.set()
+    assert future.result(5) is load.users['token-1']
+
+
+def test_invalidate_user_during_load_is_not_cached(auth_load):
+    load = auth_load(block=True)
+    cache = TokenAuthCache(load, batch_window=0, max_jitter=0)
+
+    threads, results = get_in_threads(cache, ['token-1', 'token-2'])
+    assert load.started.wait(5)
+    cache.invalidate(user_id=1)
+    load.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    # waiting auths get the loaded users, only the cache skips the stale one
+    assert results == [load.users['token-1'], load.users['token-2']]
+    assert 'token-1' not in cache.cache
+    assert 'token-2' in cache.cache
+
+    assert cache.get('token-1') is load.users['token-1']
+    assert load.calls[-1] == ['token-1']
+
+
+def test_invalidate_token_during_load_is_not_cached(auth_load):
+    load = auth_load(block=True)
+    cache = TokenAuthCache(load, batch_window=0, max_jitter=0)
+
+    threads, _ = get_in_threads(cache, ['token-1'])
+    assert load.started.wait(5)
+    cache.invalidate(token='token-1')
+    load.release.set()
+    threads[0].join(5)
+
+    assert 'token-1' not in cache.cache
+
+
+def test_invalidate_before_load_does_not_skip_cache(auth_load):
+    load = auth_load()
+    cache = TokenAuthCache(load, batch_window=0, max_jitter=0)
+    cache.invalidate(user_id=1)
+
+    assert cache.get('token-1') is load.users['token-1']
+    assert 'token-1' in cache.cache
+
+
+def test_cached_until_ttl_expires(auth_load):
+    load = auth_load()
+    cache = TokenAuthCache(load, ttl=0.2, batch_window=0, max_jitter=0)
+
+    assert cache.get('token-1') is load.users['token-1']
+    assert cache.get('token-1') is load.users['token-1']
+    assert len(load.calls) == 1
+    assert cache.stats()['hits'] == 1
+
+    time.sleep(0.3)
+    assert cache.get('token-1') is load.users['token-1']
+    assert len(load.calls) == 2
+
+
+def test_zero_ttl_disables_cache(auth_load):
+    load = auth_load()
+    cache = TokenAuthCache(load, ttl=0, batch_window=0, max_jitter=0)
+
+    cache.get('token-1')
+    cache.get('token-1')
+    assert len(load.calls) == 2
+    assert not cache.cache
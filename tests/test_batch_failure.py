@@ -0,0 +1,38 @@
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+
+# broker module needs configured Django project
+tcp_broker = pytest.importorskip('tcp_server.tcp_broker')
+
+TCPGameHandler = tcp_broker.TCPGameHandler
+
+
+class FailingCommit:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            raise RuntimeError('commit failed')
+
+
+def test_failed_batch_commit_resets_changed_tables(monkeypatch):
+    dropped = []
+    published = []
+    connection = SimpleNamespace(table_versions={'table-1': 5})
+    monkeypatch.setattr(tcp_broker, 'transaction', SimpleNamespace(atomic=FailingCommit))
+    monkeypatch.setattr(TCPGameHandler, 'game', SimpleNamespace(drop_hand=dropped.append))
+    monkeypatch.setattr(TCPGameHandler, 'get_table_connections', lambda table_key: [connection])
+    monkeypatch.setattr(TCPGameHandler, '_publish_table_status', published.append)
+    monkeypatch.setattr(TCPGameHandler, 'metrics', SimpleNamespace(measure=lambda name: contextlib.nullcontext()))
+
+    with pytest.raises(RuntimeError):
+        with TCPGameHandler.batch_context():
+            TCPGameHandler._send_table_status('table-1')
+
+    assert dropped == ['table-1']
+    # the next status is a snapshot of the committed state
+    assert connection.table_versions['table-1'] is None
+    assert published == ['table-1']
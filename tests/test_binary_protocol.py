@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+import pytest
+
+from poker_game.poker import binary_protocol
+
+
+def round_trip(value):
+    return binary_protocol.decode(binary_protocol.encode(value))
+
+
+@pytest.mark.parametrize('value', [
+    0, 1, -1, 63, -64, 64, -65, 127, 128, -128, 300, -300,
+    2 ** 31, -2 ** 31, 2 ** 62, -2 ** 62, 2 ** 63 - 1, -2 ** 63,
+    2 ** 63, -2 ** 63 - 1, 2 ** 64, -2 ** 64, 10 ** 30, -10 ** 30,
+])
+def test_int_round_trip(value):
+    decoded = round_trip(value)
+    assert decoded == value
+    assert type(decoded) is int
+
+
+def test_small_int_is_two_bytes():
+    assert binary_protocol.encode(-64) == bytes([binary_protocol.T_INT, 127])
+    assert binary_protocol.encode(63) == bytes([binary_protocol.T_INT, 126])
+
+
+@pytest.mark.parametrize('value', [None, True, False, '', 'text', 'ünïcode ♠', 1.5, -0.25])
+def test_scalar_round_trip(value):
+    decoded = round_trip(value)
+    assert decoded == value
+    assert type(decoded) is type(value)
+
+
+def test_whole_decimal_is_int():
+    assert round_trip(Decimal('10.00')) == 10
+    assert round_trip(Decimal('2.5')) == 2.5
+
+
+def test_nested_round_trip():
+    value = {
+        'g_tk': 'table',
+        'g_pl': [
+            {'u_id': 1, 'u_n': 'first', 'u_bl': -5, 'u_h': ['SA', 'H10'], 'u_f': False},
+            {'u_id': 2, 'u_n': 'second', 'u_bl': 2 ** 40, 'u_h': [], 'u_r': ['dealer', ['nested', None]]},
+        ],
+        'rg_c': {'table': ['D2', 'CK', 'HQ']},
+        'g_w': [[1, 100, 'Flush']],
+        'custom': {'deep': {'deeper': [1, [2, [3]]]}},
+    }
+    assert round_trip(value) == value
+
+
+def test_tuple_is_list():
+    assert round_trip((1, 'a', None)) == [1, 'a', None]
+
+
+def test_every_card_round_trip():
+    cards = list(binary_protocol.CARD_BYTES)
+    assert len(cards) == 52
+    data = binary_protocol.encode({'u_h': cards})
+    # map header, field tag, cards header and one byte per card
+    assert len(data) == 1 + 1 + 1 + 1 + 1 + len(cards)
+    assert binary_protocol.decode(data) == {'u_h': cards}
+
+
+def test_cards_field_with_unknown_card_is_list():
+    value = {'u_h': ['SA', 'X1']}
+    data = binary_protocol.encode(value)
+    assert data[3] == binary_protocol.T_LIST
+    assert binary_protocol.decode(data) == value
+
+
+def test_unknown_key_round_trip():
+    value = {'not_a_field': 1, 7: 'int key'}
+    assert round_trip(value) == {'not_a_field': 1, '7': 'int key'}
+
+
+def test_unknown_value_type():
+    with pytest.raises(ValueError):
+        binary_protocol.decode(bytes([0xFF]))
+
+
+def test_unknown_field_tag():
+    data = bytes([binary_protocol.T_MAP, 1, 0xFF, binary_protocol.T_NULL])
+    with pytest.raises(ValueError):
+        binary_protocol.decode(data)
+
+
+def test_frame_header():
+    payload = binary_protocol.encode({'g_v': 3})
+    data = binary_protocol.frame(binary_protocol.FRAME_TABLE_STATUS, payload)
+    length, kind = binary_protocol.FRAME_HEADER.unpack_from(data)
+    assert length == len(payload) + 1
+    assert kind == binary_protocol.FRAME_TABLE_STATUS
+    assert binary_protocol.decode(data[binary_protocol.FRAME_HEADER.size:]) == {'g_v': 3}
@@ -0,0 +1,106 @@
+import struct
+
+import pytest
+
+from tcp_server.tcp_message_framing import (
+    FrameTooLargeError,
+    LengthPrefixedFramer,
+    NewlineFramer,
+    RawFramer,
+    get_framer,
+    parse_connection_options,
+    split_auth_message,
+)
+
+
+def length_prefixed(payload: bytes) -> bytes:
+    return struct.pack('!I', len(payload)) + payload
+
+
+class TestNewlineFramer:
+    def test_partial_frame_waits_for_delimiter(self):
+        framer = NewlineFramer()
+        assert framer.feed(b'BT|1') == []
+        assert framer.feed(b'00') == []
+        assert framer.feed(b'\n') == [b'BT|100']
+        assert framer.buffer == bytearray()
+
+    def test_many_frames_in_one_chunk(self):
+        framer = NewlineFramer()
+        assert framer.feed(b'TS|abc\nBT|100\r\nCK\nFD') == [b'TS|abc', b'BT|100', b'CK']
+        assert framer.feed(b'\n') == [b'FD']
+
+    def test_empty_lines_are_skipped(self):
+        assert NewlineFramer().feed(b'\n\nCK\n\r\n') == [b'CK']
+
+    def test_memoryview_chunk(self):
+        data = bytearray(b'CK\nFD\n')
+        assert NewlineFramer().feed(memoryview(data)[:3]) == [b'CK']
+
+    def test_frame_too_large(self):
+        framer = NewlineFramer(max_frame_size=8)
+        assert framer.feed(b'12345678') == []
+        with pytest.raises(FrameTooLargeError):
+            framer.feed(b'9')
+
+    def test_encode(self):
+        assert NewlineFramer().encode(b'PI|1') == b'PI|1\n'
+
+
+class TestLengthPrefixedFramer:
+    def test_partial_header_and_payload(self):
+        framer = LengthPrefixedFramer()
+        frame = length_prefixed(b'BT|100')
+        assert framer.feed(frame[:2]) == []
+        assert framer.feed(frame[2:7]) == []
+        assert framer.feed(frame[7:]) == [b'BT|100']
+        assert framer.buffer == bytearray()
+
+    def test_many_frames_in_one_chunk(self):
+        framer = LengthPrefixedFramer()
+        data = length_prefixed(b'TS|abc') + length_prefixed(b'BT|100') + length_prefixed(b'CK')[:3]
+        assert framer.feed(data) == [b'TS|abc', b'BT|100']
+        assert framer.feed(length_prefixed(b'CK')[3:]) == [b'CK']
+
+    def test_payload_may_contain_newline(self):
+        assert LengthPrefixedFramer().feed(length_prefixed(b'a\nb')) == [b'a\nb']
+
+    def test_frame_too_large_by_header(self):
+        framer = LengthPrefixedFramer(max_frame_size=16)
+        with pytest.raises(FrameTooLargeError):
+            framer.feed(struct.pack('!I', 17))
+
+    def test_encode_round_trip(self):
+        framer = LengthPrefixedFramer()
+        assert framer.feed(framer.encode(b'PO')) == [b'PO']
+
+
+class TestRawFramer:
+    def test_every_chunk_is_one_frame(self):
+        framer = RawFramer()
+        assert framer.feed(b'BT|100') == [b'BT|100']
+        assert framer.feed(b'') == []
+
+
+class TestConnectionOptions:
+    def test_parse_options(self):
+        assert parse_connection_options(' NL, delta ,,') == {'nl', 'delta'}
+        assert parse_connection_options(None) == set()
+
+    def test_get_framer(self):
+        assert isinstance(get_framer({'lp', 'nl'}), LengthPrefixedFramer)
+        assert isinstance(get_framer({'nl'}), NewlineFramer)
+        assert isinstance(get_framer(set()), RawFramer)
+
+
+class TestSplitAuthMessage:
+    def test_trailing_bytes_are_pending(self):
+        assert split_auth_message(b'AU|token|nl\r\nBT|100\nCK') == (b'AU|token|nl', b'BT|100\nCK')
+
+    def test_legacy_auth_without_delimiter(self):
+        assert split_auth_message(b'AU|token') == (b'AU|token', b'')
+
+    def test_pending_bytes_are_framed_by_negotiated_framer(self):
+        auth_data, pending = split_auth_message(b'AU|token|lp\n' + length_prefixed(b'JG|abc'))
+        options = parse_connection_options(auth_data.split(b'|')[2].decode())
+        assert get_framer(options).feed(pending) == [b'JG|abc']
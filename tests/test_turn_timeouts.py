@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+
+import pytest
+
+# broker module needs configured Django project
+tcp_broker = pytest.importorskip('tcp_server.tcp_broker')
+
+TCPGameHandler = tcp_broker.TCPGameHandler
+TABLE_KEY = 'table-1'
+
+
+class FakeTimers:
+    def __init__(self):
+        self.timers = {}
+
+    def arm(self, key, delay, callback, *args):
+        self.timers[key] = (delay, callback, args)
+
+    def cancel(self, key):
+        return self.timers.pop(key, None) is not None
+
+    def fire(self, key):
+        _, callback, args = self.timers.pop(key)
+        callback(*args)
+
+
+class FakeActors:
+    @staticmethod
+    def submit(table_key, method, *args):
+        return method(*args)
+
+
+class FakeGame:
+    """
+    Hand of seated players in seat order, turn moves to the next not folded seat
+    """
+
+    def __init__(self, user_ids):
+        self.seats = [SimpleNamespace(user_id=user_id, is_fold=False) for user_id in user_ids]
+        self.round = SimpleNamespace(id=1, turn_index=0, is_end_round=False)
+        self.round.game = SimpleNamespace(
+            table=SimpleNamespace(key=TABLE_KEY),
+            rounds=SimpleNamespace(last=lambda: self.round),
+        )
+        self.auto_folded = []
+        self.stopped = False
+
+    def _fold(self, user_id):
+        seat_index = next(index for index, seat in enumerate(self.seats) if seat.user_id == user_id)
+        self.seats[seat_index].is_fold = True
+        if self.round.turn_index == seat_index and self.active_players_count(self.round) > 1:
+            turn_index = seat_index
+            while self.seats[turn_index].is_fold:
+                turn_index = (turn_index + 1) % len(self.seats)
+            self.round.turn_index = turn_index
+
+    def leave_game(self, table_key, user_id):
+        self._fold(user_id)
+        if self.active_players_count(self.round) <= 1:
+            self.stopped = True
+
+    def auto_fold(self, user_id):
+        self.auto_folded.append(user_id)
+        self._fold(user_id)
+        return True, None, self.round, False
+
+    def get_current_round(self, table_key):
+        return self.round
+
+    def get_current_player(self, round_model):
+        return self.seats[round_model.turn_index]
+
+    def active_players_count(self, round_model):
+        return sum(not seat.is_fold for seat in self.seats)
+
+    def stop_game(self, game, round):
+        self.stopped = True
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    def setup(user_ids):
+        game = FakeGame(user_ids)
+        rounds = SimpleNamespace(filter=lambda id: SimpleNamespace(first=lambda: game.round))
+        monkeypatch.setattr(tcp_broker, 'Round', SimpleNamespace(objects=rounds))
+        monkeypatch.setattr(TCPGameHandler, 'game', game)
+        monkeypatch.setattr(TCPGameHandler, 'turn_timers', FakeTimers())
+        monkeypatch.setattr(TCPGameHandler, 'table_actors', FakeActors())
+        monkeypatch.setattr(TCPGameHandler, 'get_connection_by_user', lambda user_id: object())
+        for name in (
+            'remove_connection_through_user',
+            'remove_not_active_user',
+            '_defer',
+            '_send_table_status',
+            '_schedule_new_game',
+        ):
+            monkeypatch.setattr(TCPGameHandler, name, lambda *args, **kwargs: None)
+        return game
+
+    return setup
+
+
+def test_leave_on_own_turn_arms_clock_of_next_player(handler):
+    game = handler([1, 2, 3])
+
+    TCPGameHandler.on_leave_game(1, f'LG|{TABLE_KEY}'.encode())
+
+    delay, _, args = TCPGameHandler.turn_timers.timers[TABLE_KEY]
+    assert delay == TCPGameHandler.TURN_TIME_OUT
+    assert args[-1] == 2
+
+    TCPGameHandler.turn_timers.fire(TABLE_KEY)
+
+    assert game.auto_folded == [2]
+    assert game.stopped
+
+
+def test_leave_ending_hand_cancels_clock(handler):
+    game = handler([1, 2])
+    TCPGameHandler.turn_timers.arm(TABLE_KEY, 1, lambda: None)
+
+    TCPGameHandler.on_leave_game(1, f'LG|{TABLE_KEY}'.encode())
+
+    assert game.stopped
+    assert TABLE_KEY not in TCPGameHandler.turn_timers.timers